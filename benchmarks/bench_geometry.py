@@ -0,0 +1,38 @@
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from util import geometry
+from benchmarks import synthetic
+from benchmarks.common import measure, summarize, argumentParser, emit
+
+# latency of single calls (what happens on every click) and throughput of batched calls (batch jobs)
+# for the geometry core, over synthetic rigs of different sizes.
+#   python benchmarks/bench_geometry.py [--quick] [--json results.json]
+
+def run(quick=False):
+	viewCounts = [2, 6, 16] if quick else [2, 6, 16, 32, 64]
+	batchSizes = [1, 1000] if quick else [1, 1000, 100000]
+	results = []
+	for numViews in viewCounts:
+		mats = synthetic.rig(numViews)
+		for batch in batchSizes:
+			X, points = synthetic.observations(mats, batch)
+			cases = [
+				('project', lambda: geometry.project(mats, X)),
+				('triangulate', lambda: geometry.triangulate(mats, points)),
+				('triangulateConsistent', lambda: geometry.triangulateConsistent(mats, points, 0)),
+			]
+			for name, fn in cases:
+				s = summarize(measure(fn, minTime=0.05 if quick else 0.3))
+				s.update({
+					'op': name,
+					'views': numViews,
+					'batch': batch,
+					'points_per_s': batch / (s['median_ms'] / 1e3),
+				})
+				results.append(s)
+	return results
+
+if __name__ == '__main__':
+	args = argumentParser('Benchmark the geometry core.').parse_args()
+	emit('geometry', run(args.quick), args.json)
@@ -0,0 +1,114 @@
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+import numpy as np
+from PySide2.QtWidgets import QApplication, QGraphicsItem
+from PySide2.QtCore import QPointF, QRectF, QSize
+from PySide2.QtGui import QColor, QPixmap, QImage, QPainter
+from windows.imageviews import ImageView
+from benchmarks.common import measure, summarize, argumentParser, emit
+
+# frame-switch and view-switch cost of the annotation overlays (with and without a skeleton), compared against
+# creating one scene item per annotation (the way annotations used to be drawn). every case also renders the
+# scene, so painting is included.
+#   python benchmarks/bench_overlay.py [--quick] [--json results.json]
+
+class ItemPerAnnotation(QGraphicsItem):
+	def __init__(self, point, color, radius):
+		super(ItemPerAnnotation, self).__init__()
+		self.point = point
+		self.color = color
+		self.radius = radius
+		self.rect = QRectF(point - QPointF(radius, radius), 2*QSize(radius, radius))
+
+	def boundingRect(self):
+		return self.rect
+
+	def paint(self, painter, option, widget=None):
+		painter.setPen(self.color)
+		painter.setBrush(self.color)
+		painter.drawEllipse(self.point, self.radius, self.radius)
+
+def render(view, target):
+	target.fill(0)
+	p = QPainter(target)
+	view.scene().render(p)
+	p.end()
+
+def run(quick=False):
+	app = QApplication.instance() or QApplication(sys.argv)
+	jointCounts = [10, 100] if quick else [10, 100, 400]
+	viewCounts = [2, 8] if quick else [2, 8, 32]
+	size = 640
+	rng = np.random.default_rng(0)
+	target = QImage(size, size, QImage.Format_RGB32)
+	results = []
+	for numViews in viewCounts:
+		for numJoints in jointCounts:
+			keys = ['joint%d'%j for j in range(numJoints)]
+			colors = [QColor(*rng.integers(0, 255, 3).tolist()) for _ in keys]
+			frames = [rng.random([numViews, numJoints, 2]) * size for _ in range(8)]
+			views = [ImageView(None) for _ in range(numViews)]
+			for v in views:
+				v.setPhoto(QPixmap(size, size))
+			# the same, with a skeleton of a bone between every pair of consecutive joints
+			skeletonViews = [ImageView(None) for _ in range(numViews)]
+			for v in skeletonViews:
+				v.setPhoto(QPixmap(size, size))
+				v.setSkeleton(list(zip(keys[:-1], keys[1:])))
+			state = {'frame': 0, 'items': [dict() for _ in views]}
+
+			def overlayFrame():
+				pts = frames[state['frame'] % len(frames)]
+				state['frame'] += 1
+				for v, p in zip(views, pts):
+					v.setAnnotationArray(keys, p, colors, 5)
+				render(views[0], target)
+
+			def skeletonFrame():
+				pts = frames[state['frame'] % len(frames)]
+				state['frame'] += 1
+				for v, p in zip(skeletonViews, pts):
+					v.setAnnotationArray(keys, p, colors, 5)
+				render(skeletonViews[0], target)
+
+			def itemFrame():
+				pts = frames[state['frame'] % len(frames)]
+				state['frame'] += 1
+				for v, items, p in zip(views, state['items'], pts):
+					for item in items.values():
+						v.scene().removeItem(item)
+					items.clear()
+					for key, c, (x, y) in zip(keys, colors, p):
+						items[key] = ItemPerAnnotation(QPointF(x, y), c, 5)
+						v.scene().addItem(items[key])
+				render(views[0], target)
+
+			def overlayViewSwitch():
+				views[0].copyAnnotationsFrom(views[state['frame'] % numViews])
+				state['frame'] += 1
+				render(views[0], target)
+
+			def stateViewSwitch():
+				views[0].setAnnotations(views[state['frame'] % numViews].getAnnotations())
+				state['frame'] += 1
+				render(views[0], target)
+
+			cases = [
+				('frame_switch', 'overlay', overlayFrame),
+				('frame_switch', 'overlay_skeleton', skeletonFrame),
+				('frame_switch', 'item_per_annotation', itemFrame),
+				('view_switch', 'overlay_copy', overlayViewSwitch),
+				('view_switch', 'state_copy', stateViewSwitch),
+			]
+			for op, impl, fn in cases:
+				s = summarize(measure(fn, minTime=0.05 if quick else 0.3))
+				s.update({'op': op, 'impl': impl, 'views': numViews, 'joints': numJoints})
+				results.append(s)
+				app.processEvents()
+	return results
+
+if __name__ == '__main__':
+	args = argumentParser('Benchmark annotation overlay updates.').parse_args()
+	emit('overlay', run(args.quick), args.json)
@@ -0,0 +1,110 @@
+import os
+import io
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+import tempfile
+import numpy as np
+from PySide2.QtWidgets import QApplication
+from PySide2.QtCore import QPointF
+from windows.mainwindow import loadProject
+from util import batch
+from benchmarks import synthetic
+from benchmarks.common import measure, summarize, argumentParser, emit
+
+# end-to-end latency of what an annotator waits on, in real project windows opened on synthetic projects:
+# opening a project, switching frames, clicking to place (and triangulate) a joint, skipping to the next frame
+# with missing joints, saving, and exporting from the command line.
+#   python benchmarks/bench_project.py [--quick] [--json results.json]
+#   python benchmarks/bench_project.py --frames 5000 --views 8 --joints 40 --width 1920 --height 1080
+
+# (frames, views, joints, width, height), where views=None is a single view project
+cases = [
+	(100, None, 20, 640, 480),
+	(100, 4, 20, 640, 480),
+	(1000, 8, 40, 1280, 720),
+	(5000, 16, 60, 1280, 720),
+]
+quickCases = cases[:2]
+
+def openWindow(app, cfg):
+	windowClass, data = loadProject(cfg)
+	w = windowClass(cfg, data)
+	w.show()
+	app.processEvents()
+	return w
+
+def discard(app, w):
+	# deleted without closing, since closing saves
+	w.hide()
+	w.deleteLater()
+	app.processEvents()
+
+def run(quick=False, sizes=None):
+	app = QApplication.instance() or QApplication(sys.argv)
+	rng = np.random.default_rng(0)
+	minTime = 0.05 if quick else 0.3
+	results = []
+	for numFrames, numViews, numJoints, width, height in sizes or (quickCases if quick else cases):
+		with tempfile.TemporaryDirectory() as folder:
+			cfg = synthetic.project(folder, numFrames, numViews, numJoints, width, height)
+			info = {
+				'mode': 'multi' if numViews else 'single',
+				'frames': numFrames,
+				'views': numViews or 1,
+				'joints': numJoints,
+				'size': '%dx%d'%(width, height)
+			}
+
+			def openProject():
+				discard(app, openWindow(app, cfg))
+
+			w = openWindow(app, cfg)
+			state = {'frame': 0}
+
+			def frameSwitch():
+				state['frame'] = (state['frame'] + 1) % numFrames
+				w.ui.spinBox.setValue(state['frame'])
+				app.processEvents()
+
+			def click():
+				w.setJoint(int(rng.integers(numJoints)))
+				r = w.mainView.getPixmap().rect()
+				w.mainImageClicked(QPointF(rng.uniform(0, r.width()), rng.uniform(0, r.height())))
+				app.processEvents()
+
+			def skipToMissing():
+				w.skipMissingAny()
+				app.processEvents()
+
+			def export():
+				batch.export(cfg, io.StringIO())
+
+			ops = [
+				('open', openProject, 3),
+				('frame_switch', frameSwitch, 5),
+				('click_to_triangulate' if numViews else 'click', click, 5),
+				('skip_to_missing', skipToMissing, 5),
+				('save', w.save, 3),
+				('export', export, 3),
+			]
+			for op, fn, minCalls in ops:
+				s = summarize(measure(fn, minTime=minTime, minCalls=minCalls))
+				s.update(info)
+				s['op'] = op
+				results.append(s)
+			discard(app, w)
+	return results
+
+if __name__ == '__main__':
+	parser = argumentParser('Benchmark project windows on synthetic projects.')
+	parser.add_argument('--frames', type=int, help='run a single project of this size instead of the default ones')
+	parser.add_argument('--views', type=int, default=4, help='0 for a single view project')
+	parser.add_argument('--joints', type=int, default=20)
+	parser.add_argument('--width', type=int, default=640)
+	parser.add_argument('--height', type=int, default=480)
+	args = parser.parse_args()
+	sizes = None
+	if args.frames is not None:
+		sizes = [(args.frames, args.views or None, args.joints, args.width, args.height)]
+	emit('project', run(args.quick, sizes), args.json)
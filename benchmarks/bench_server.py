@@ -0,0 +1,91 @@
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import time
+import tempfile
+import threading
+import multiprocessing
+import numpy as np
+from util import annotationserver
+from benchmarks import synthetic
+from benchmarks.common import argumentParser, emit
+
+# write throughput of the annotation server with several clients at once (each in its own process), each writing
+# batches of frames it has leased, and how long it takes until another client is told about a change. everything
+# runs on this machine.
+#   python benchmarks/bench_server.py [--quick] [--json results.json]
+
+# (clients, frames per write)
+cases = [(1, 1), (1, 50), (4, 1), (4, 50), (16, 50)]
+quickCases = [(1, 1), (4, 50)]
+
+# a client in its own process, like an annotator's window. returns when it started and stopped writing, and
+# when every write was sent by its sequence number (in time.time(), which every process shares)
+def writer(address, frames, batch, rounds, numViews, numJoints, seed):
+	rng = np.random.default_rng(seed)
+	client = annotationserver.Client(address, 'writer%d'%seed)
+	client.lease(frames)
+	sources = np.full([batch, numViews, numJoints], 'labeled', dtype=object)
+	sent = {}
+	start = time.time()
+	for _ in range(rounds):
+		for i in range(0, len(frames), batch):
+			images = frames[i:i+batch]
+			records = annotationserver.toRecords(images, rng.random([len(images), numViews, numJoints, 2]), sources, rng.normal(size=[len(images), numJoints, 3]))
+			t = time.time()
+			response = client.write(records)
+			sent[response['seq']] = t
+			assert len(response['rejected']) == 0
+	end = time.time()
+	client.close()
+	return start, end, sent
+
+def run(quick=False):
+	numFrames, numViews, numJoints = (400, 4, 20) if quick else (2000, 8, 20)
+	rounds = 1 if quick else 3
+	results = []
+	with tempfile.TemporaryDirectory() as folder:
+		cfg = synthetic.project(folder, numFrames, numViews, numJoints, 32, 24, distinctImages=1)
+		server = annotationserver.Server(cfg, ('127.0.0.1', 0))
+		threading.Thread(target=server.serve_forever, daemon=True).start()
+		images = list(server.store.read()[0])
+		for numClients, batch in (quickCases if quick else cases):
+			# a client that only listens, to time the change notifications
+			listener = annotationserver.Client(server.server_address, 'listener')
+			received = {}
+			stop = threading.Event()
+			def listen():
+				while not stop.is_set():
+					for event in listener.events():
+						received[event['seq']] = time.time()
+					time.sleep(0.0005)
+			listening = threading.Thread(target=listen)
+			listening.start()
+			with multiprocessing.get_context('spawn').Pool(numClients) as pool:
+				out = pool.starmap(writer, [(server.server_address, images[c::numClients], batch, rounds, numViews, numJoints, c) for c in range(numClients)])
+			elapsed = max(end for _, end, _ in out) - min(start for start, _, _ in out)
+			sent = {seq: t for _, _, s in out for seq, t in s.items()}
+			time.sleep(0.05)
+			stop.set()
+			listening.join()
+			listener.close()
+			latency = sorted(received[seq] - sent[seq] for seq in sent if seq in received)
+			frames = rounds * numFrames
+			results.append({
+				'clients': numClients,
+				'batch': batch,
+				'frames': frames,
+				'writes': len(sent),
+				'frames_per_s': frames / elapsed,
+				'annotations_per_s': frames * numViews * numJoints / elapsed,
+				'notify_median_ms': 1e3*latency[len(latency)//2] if latency else float('nan'),
+				'notify_p90_ms': 1e3*latency[min(len(latency)-1, int(0.9*len(latency)))] if latency else float('nan'),
+			})
+		server.shutdown()
+		server.server_close()
+		server.store.close()
+	return results
+
+if __name__ == '__main__':
+	args = argumentParser('Benchmark the annotation server.').parse_args()
+	emit('server', run(args.quick), args.json)
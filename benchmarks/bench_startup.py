@@ -0,0 +1,66 @@
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import json
+import time
+import tempfile
+import subprocess
+from benchmarks.common import argumentParser, emit
+
+# time from launching a fresh interpreter until the launcher window has been shown, on the offscreen platform.
+# cold runs don't have any bytecode cache (it's redirected to an empty folder), warm runs reuse it. the OS file
+# cache can't be dropped from here, so cold runs still read the source files from memory.
+#   python benchmarks/bench_startup.py [--quick] [--json results.json]
+
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+child = '''
+import os, sys, time, json
+t = time.perf_counter()
+sys.path.insert(0, %r)
+from PySide2.QtWidgets import QApplication
+from windows.mainwindow import MainWindow
+app = QApplication(sys.argv)
+w = MainWindow()
+w.show()
+app.processEvents()
+print(json.dumps({'in_process_s': time.perf_counter() - t, 'heavy_modules': sorted(m for m in ['pandas', 'numpy'] if m in sys.modules)}))
+'''%root
+
+def launch(pycache):
+	env = dict(os.environ, QT_QPA_PLATFORM='offscreen', PYTHONPYCACHEPREFIX=pycache)
+	t = time.perf_counter()
+	out = subprocess.run([sys.executable, '-c', child], env=env, capture_output=True, text=True, check=True)
+	total = time.perf_counter() - t
+	r = json.loads(out.stdout.strip().splitlines()[-1])
+	return total, r
+
+def run(quick=False):
+	repeats = 2 if quick else 5
+	results = []
+	for case in ['cold', 'warm']:
+		totals, inside = [], []
+		with tempfile.TemporaryDirectory() as warmCache:
+			if case == 'warm':
+				launch(warmCache)
+			for _ in range(repeats):
+				if case == 'cold':
+					with tempfile.TemporaryDirectory() as coldCache:
+						total, r = launch(coldCache)
+				else:
+					total, r = launch(warmCache)
+				totals.append(total)
+				inside.append(r['in_process_s'])
+		results.append({
+			'case': case,
+			'runs': repeats,
+			'median_ms': 1e3*sorted(totals)[len(totals)//2],
+			'min_ms': 1e3*min(totals),
+			'in_process_median_ms': 1e3*sorted(inside)[len(inside)//2],
+			'heavy_modules_loaded': ','.join(r['heavy_modules']) or 'none'
+		})
+	return results
+
+if __name__ == '__main__':
+	args = argumentParser('Benchmark time to the first window.').parse_args()
+	emit('startup', run(args.quick), args.json)
@@ -0,0 +1,57 @@
+import sys
+import json
+import time
+import platform
+import argparse
+
+# helpers shared by the benchmark scripts
+
+# run fn repeatedly for at least minTime seconds and return per-call latencies in seconds
+def measure(fn, minTime=0.2, minCalls=5, maxCalls=100000):
+	fn() # warm up
+	times = []
+	start = time.perf_counter()
+	while len(times) < maxCalls and (len(times) < minCalls or time.perf_counter() - start < minTime):
+		t = time.perf_counter()
+		fn()
+		times.append(time.perf_counter() - t)
+	return times
+
+def summarize(times):
+	times = sorted(times)
+	return {
+		'calls': len(times),
+		'min_ms': 1e3*times[0],
+		'median_ms': 1e3*times[len(times)//2],
+		'p90_ms': 1e3*times[min(len(times)-1, int(0.9*len(times)))],
+	}
+
+def argumentParser(description):
+	parser = argparse.ArgumentParser(description=description)
+	parser.add_argument('--json', help='also write the results to this file as json')
+	parser.add_argument('--quick', action='store_true', help='run fewer, smaller cases')
+	return parser
+
+# print results as a table, and optionally write them as json for regression tracking
+def emit(name, results, jsonPath=None):
+	keys = []
+	for r in results:
+		keys += [k for k in r if k not in keys]
+	widths = [max(len(k), *[len(_fmt(r.get(k, ''))) for r in results]) for k in keys]
+	print('  '.join(k.rjust(w) for k, w in zip(keys, widths)))
+	for r in results:
+		print('  '.join(_fmt(r.get(k, '')).rjust(w) for k, w in zip(keys, widths)))
+	if jsonPath is not None:
+		with open(jsonPath, 'w') as f:
+			json.dump({
+				'benchmark': name,
+				'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+				'python': sys.version.split()[0],
+				'platform': platform.platform(),
+				'results': results
+			}, f, indent=1)
+
+def _fmt(v):
+	if isinstance(v, float):
+		return '%.4g'%v
+	return str(v)
@@ -0,0 +1,115 @@
+import numpy as np
+
+# synthetic camera rigs for benchmarking, with projection matrices in the project's (0,0)-(1,1) convention
+
+# cameras spread around the origin at the given distance, all looking at it
+def rig(numViews, distance=5.0, focal=1.0, seed=0):
+	rng = np.random.default_rng(seed)
+	mats = []
+	for i in range(numViews):
+		angle = 2*np.pi*i/numViews
+		C = np.array([distance*np.cos(angle), distance*np.sin(angle), rng.uniform(-1, 1)])
+		z = -C / np.linalg.norm(C)
+		x = np.cross([0, 0, 1], z)
+		x /= np.linalg.norm(x)
+		y = np.cross(z, x)
+		R = np.stack([x, y, z])
+		K = np.array([[focal, 0, 0.5], [0, focal, 0.5], [0, 0, 1]])
+		mats.append(K.dot(np.concatenate([R, -R.dot(C)[:, None]], axis=1)))
+	return np.array(mats)
+
+# random points near the origin, their (noisy) observations in every view, and a fraction of them missing
+def observations(mats, numPoints, noise=1e-3, missing=0.3, seed=0):
+	from util.geometry import project
+	rng = np.random.default_rng(seed)
+	X = rng.normal(size=[numPoints, 3]) * 0.5
+	points = project(mats, X) + rng.normal(size=[numPoints, len(mats), 2]) * noise
+	drop = rng.random([numPoints, len(mats)]) < missing
+	# always keep the first two views so every point can be triangulated
+	drop[:, :2] = False
+	points[drop] = np.nan
+	return X, points
+
+# minimal RGB png encoder, so generating projects doesn't need an imaging library (or a display)
+def writePng(path, rgb):
+	import zlib
+	import struct
+	height, width, _ = rgb.shape
+	raw = np.concatenate([np.zeros([height, 1], dtype=np.uint8), rgb.astype(np.uint8).reshape([height, -1])], axis=1)
+	def chunk(kind, data):
+		return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data) & 0xffffffff)
+	with open(path, 'wb') as f:
+		f.write(b'\x89PNG\r\n\x1a\n')
+		f.write(chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0)))
+		f.write(chunk(b'IDAT', zlib.compress(raw.tobytes(), 1)))
+		f.write(chunk(b'IEND', b''))
+
+# writes a complete project into folder: images for every frame (and view), cfg.yaml in the layout the new
+# project dialog writes, and annotation files where a fraction of the joints are labeled. multi view projects use
+# rig() for their projection matrices and their annotations are projections of random 3d points, so they agree
+# with each other; numViews=None makes a single view project. returns the cfg as a namedtuple, like the app loads it
+def project(folder, numFrames=100, numViews=4, numJoints=20, width=640, height=480, labeled=0.5, distinctImages=8, seed=0):
+	import os
+	import shutil
+	from collections import namedtuple
+	import yaml
+	import pandas as pd
+	from util.geometry import project as projectPoints
+	rng = np.random.default_rng(seed)
+	multi = numViews is not None
+	views = ['view%d'%i for i in range(numViews)] if multi else None
+	joints = ['joint%d'%j for j in range(numJoints)]
+	images = ['frame%06d.png'%i for i in range(numFrames)]
+	imageFolder = os.path.join(folder, 'images')
+	projectFolder = os.path.join(folder, 'project')
+	os.makedirs(projectFolder, exist_ok=True)
+
+	# encoding is slow, so only a few distinct images are made and the rest are copies of them
+	y, x = np.mgrid[0:height, 0:width]
+	for viewFolder in ([os.path.join(imageFolder, view) for view in views] if multi else [imageFolder]):
+		os.makedirs(viewFolder, exist_ok=True)
+		for i, name in enumerate(images):
+			path = os.path.join(viewFolder, name)
+			if i < distinctImages:
+				phase = rng.uniform(0, 2*np.pi, 3)
+				rgb = 127.5 + 127.5*np.sin(np.stack([x/37 + phase[0], y/23 + phase[1], (x+y)/53 + phase[2]], axis=-1))
+				rgb += rng.normal(size=rgb.shape) * 8
+				writePng(path, np.clip(rgb, 0, 255))
+			else:
+				shutil.copyfile(os.path.join(viewFolder, images[i % distinctImages]), path)
+
+	cfg = {
+		'projectFolder': projectFolder,
+		'imageFolder': imageFolder,
+		'imageExtension': '.png',
+		'mode': 'RGB Multi View' if multi else 'RGB Single View',
+		'joints': joints
+	}
+	cols = pd.MultiIndex.from_product([joints, ['u', 'v']], names=['joint', 'coordinate'])
+	mask = rng.random([numFrames, numJoints]) < labeled
+	if multi:
+		mats = rig(numViews)
+		cfg['views'] = views
+		cfg['projectionMatrices'] = mats.tolist()
+		X = rng.normal(size=[numFrames, numJoints, 3]) * 0.5
+		X[~mask] = np.nan
+		uv = projectPoints(mats, X) # frames x joints x views x 2
+		index = pd.MultiIndex.from_product([views, images], names=['view', 'image'])
+		pixel = uv.transpose([2, 0, 1, 3]).reshape([numViews*numFrames, -1])
+		source = np.where(np.tile(mask, [numViews, 1]), 'projected', None).astype(object)
+		# the first view is where they were placed by hand
+		source[:numFrames][mask] = 'labeled'
+		pd.DataFrame(X.reshape([numFrames, -1]), index=pd.Index(images, name='image'),
+			columns=pd.MultiIndex.from_product([joints, ['x', 'y', 'z']], names=['joint', 'coordinate'])
+		).to_csv(os.path.join(projectFolder, '3d-annotation-data.csv'))
+	else:
+		index = pd.Index(images, name='image')
+		uv = rng.uniform(0, 1, [numFrames, numJoints, 2])
+		uv[~mask] = np.nan
+		pixel = uv.reshape([numFrames, -1])
+		source = np.where(mask, 'labeled', None).astype(object)
+	pd.DataFrame(pixel, index=index, columns=cols).to_csv(os.path.join(projectFolder, 'pixel-annotation-data.csv'))
+	pd.DataFrame(source, index=index, columns=joints).to_csv(os.path.join(projectFolder, 'annotation-source.csv'))
+	with open(os.path.join(projectFolder, 'cfg.yaml'), 'w') as f:
+		yaml.dump(cfg, f)
+	return namedtuple('cfg', cfg.keys())(*cfg.values())
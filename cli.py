@@ -0,0 +1,96 @@
+import os
+import sys
+import argparse
+from util import config, batch, annotationserver
+
+# batch operations on a project without opening a window, e.g.
+#   python cli.py validate path/to/project
+#   python cli.py export path/to/project -o annotations.csv --jobs 8
+#   python cli.py serve path/to/project --port 8765
+
+def main(argv=None):
+	parser = argparse.ArgumentParser(description='Batch operations on annotation projects')
+	parser.add_argument('--jobs', '-j', type=int, default=os.cpu_count() or 1, help='worker processes (default: one per core)')
+	parser.add_argument('--chunk-size', type=int, default=100000, help='annotation rows read at a time')
+	commands = parser.add_subparsers(dest='command')
+	commands.required = True
+
+	p = commands.add_parser('validate', help='check the project\'s configuration and annotations')
+	p.add_argument('project')
+	p.add_argument('--max-error', type=float, default=0.01, help='largest allowed distance between an annotation and its reprojected 3d point')
+
+	p = commands.add_parser('stats', help='count the annotations of every view and joint')
+	p.add_argument('project')
+
+	p = commands.add_parser('export', help='write every annotation as one row per image, view and joint')
+	p.add_argument('project')
+	p.add_argument('--format', choices=['csv', 'jsonl'], default='csv')
+	p.add_argument('--output', '-o', help='output file (default: standard output)')
+
+	p = commands.add_parser('retriangulate', help='recompute the 3d points of a multi view project from its hand-placed annotations')
+	p.add_argument('project')
+	p.add_argument('--reproject', action='store_true', help='also replace the annotations that weren\'t placed by hand with the reprojected points')
+
+	p = commands.add_parser('merge', help='add the annotations of another project with the same joints and views')
+	p.add_argument('project')
+	p.add_argument('other')
+	p.add_argument('--prefer', choices=['ours', 'theirs'], default='ours', help='which annotation to keep where both projects have one')
+
+	p = commands.add_parser('serve', help='share the project\'s annotations with the windows of several annotators (see util/annotationserver.py)')
+	p.add_argument('project')
+	p.add_argument('--host', default='127.0.0.1', help='address to listen on (default: only this machine)')
+	p.add_argument('--port', type=int, default=annotationserver.defaultPort)
+
+	args = parser.parse_args(argv)
+	try:
+		cfg = config.loadConfig(args.project)
+		if args.command == 'validate':
+			problems = batch.validate(cfg, args.chunk_size, args.max_error)
+			for level, message in problems:
+				print('%s: %s'%(level, message))
+			if len(problems) == 0:
+				print('ok')
+			return 1 if any(level == 'error' for level, _ in problems) else 0
+		if args.command == 'stats':
+			print(batch.formatStats(batch.stats(cfg, args.jobs, args.chunk_size)))
+		elif args.command == 'export':
+			if args.output is None:
+				batch.export(cfg, sys.stdout, args.format, args.jobs, args.chunk_size)
+			else:
+				with open(args.output, 'w', newline='') as f:
+					batch.export(cfg, f, args.format, args.jobs, args.chunk_size)
+		elif args.command == 'retriangulate':
+			numPoints, backups = batch.retriangulate(cfg, args.jobs, args.reproject, args.chunk_size)
+			print('Triangulated %d points'%numPoints)
+			for path in backups:
+				print('Backed up to %s'%path)
+		elif args.command == 'merge':
+			backups = batch.merge(cfg, config.loadConfig(args.other), args.prefer, args.jobs, args.chunk_size)
+			for path in backups:
+				print('Backed up to %s'%path)
+		elif args.command == 'serve':
+			try:
+				server = annotationserver.Server(cfg, (args.host, args.port))
+			except OSError as e:
+				raise ValueError('could not listen on %s:%d (%s)'%(args.host, args.port, e.strerror))
+			print('Serving %s on %s:%d, press Ctrl+C to stop'%(cfg.projectFolder, *server.server_address[:2]))
+			try:
+				server.serve_forever()
+			except KeyboardInterrupt:
+				pass
+			server.server_close()
+			# leave the CSV files up to date for everything that doesn't go through the server
+			for path in server.store.export():
+				print('Backed up to %s'%path)
+			server.store.close()
+	except (FileNotFoundError, ValueError) as e:
+		print('error: %s'%str(e), file=sys.stderr)
+		return 1
+	except BrokenPipeError:
+		# output piped into something like head, which stopped reading
+		os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+		return 1
+	return 0
+
+if __name__ == '__main__':
+	sys.exit(main())
@@ -2,7 +2,9 @@ import sys
 from PySide2.QtWidgets import QApplication
 from windows.mainwindow import MainWindow 
 
-app = QApplication(sys.argv)
-window = MainWindow()
-window.show()
-sys.exit(app.exec_())
\ No newline at end of file
+# guarded, since worker processes that are spawned (rather than forked) import this module again
+if __name__ == '__main__':
+	app = QApplication(sys.argv)
+	window = MainWindow()
+	window.show()
+	sys.exit(app.exec_())
@@ -0,0 +1,32 @@
+import numpy as np
+
+# display-side brightness/contrast/gamma and histogram equalization of 8-bit images. everything goes through
+# 256-entry lookup tables, so adjusting an image is a single indexing operation per pixel
+
+defaults = {'brightness': 0.0, 'contrast': 1.0, 'gamma': 1.0, 'equalize': False}
+
+def isIdentity(settings):
+	return settings == defaults
+
+# brightness is added after contrast, which stretches around mid-gray, and gamma is applied last
+def table(settings):
+	x = np.arange(256) / 255
+	y = np.clip((x - 0.5) * settings['contrast'] + 0.5 + settings['brightness'], 0, 1)
+	y = y ** (1 / settings['gamma'])
+	return np.round(y * 255).astype(np.uint8)
+
+# maps an image's intensities so their histogram is roughly flat. the same table is used for every channel, so
+# colors keep their hue, and the histogram is taken from a subsample of the pixels
+def equalizationTable(image, step=4):
+	hist = np.bincount(image[::step, ::step, :3].ravel(), minlength=256)
+	cdf = np.cumsum(hist)
+	lo = cdf[np.flatnonzero(hist)[0]]
+	return np.round(np.clip((cdf - lo) / max(cdf[-1] - lo, 1), 0, 1) * 255).astype(np.uint8)
+
+# image is height x width x 4 (BGRA) uint8, tab comes from table(settings)
+def apply(image, tab, settings):
+	if settings['equalize']:
+		tab = tab[equalizationTable(image)]
+	out = tab[image]
+	out[..., 3] = image[..., 3]
+	return out
@@ -0,0 +1,410 @@
+import os
+import json
+import time
+import queue
+import base64
+import socket
+import sqlite3
+import threading
+import collections
+import socketserver
+import numpy as np
+import pandas as pd
+from . import projectdata
+
+# a local service that several annotators' windows share a project through, instead of each one keeping its own
+# copy of the annotations and overwriting the CSV files when it closes. the annotations are kept in an sqlite
+# database (annotations.sqlite in the project folder, created from the CSV files the first time), and the windows
+# talk to the server over a socket with one json message per line:
+#   {"id": 1, "op": "read", "images": [...]}          -> {"id": 1, "records": [...], "seq": 12}
+# ops are hello, read, lease, release, write and export. a record is everything about one frame:
+#   {"image": name, "pixels": views x joints x 2, "sources": views x joints, "points": joints x 3 or null}
+# with NaN (and null sources) where there's no annotation. the coordinates are sent as base64 of little-endian
+# float64 arrays, since formatting them as json numbers takes several times longer than anything else. a client
+# can lease the frames it's working on, and then other clients' writes to them are rejected until the lease is
+# released or expires. every accepted write is sent on to the other clients as {"event": "changed", "records": [...]}.
+# single view projects have one view, "".
+# cfg.yaml entries (optional):
+#   annotationServer: host:port of the server that windows of this project should use
+
+fileName = 'annotations.sqlite'
+defaultPort = 8765
+leaseSeconds = 60
+
+def parseAddress(address):
+	host, _, port = str(address).rpartition(':')
+	if host == '':
+		return '127.0.0.1', int(port) if port else defaultPort
+	try:
+		return host, int(port)
+	except ValueError:
+		raise ValueError('annotationServer must be host:port, but was %s'%str(address))
+
+def _encode(a):
+	return base64.b64encode(np.ascontiguousarray(a, dtype='<f8').tobytes()).decode('ascii')
+
+def _decode(s):
+	return np.frombuffer(base64.b64decode(s), dtype='<f8')
+
+def _line(message):
+	return (json.dumps(message) + '\n').encode()
+
+# records for frames, from images (n), pixels (n x views x joints x 2), sources (n x views x joints) and points
+# (n x joints x 3, or None)
+def toRecords(images, pixels, sources, points=None):
+	return [{
+		'image': str(image),
+		'pixels': _encode(pixels[i]),
+		'sources': [[s if isinstance(s, str) else None for s in row] for row in sources[i]],
+		'points': None if points is None else _encode(points[i])
+	} for i, image in enumerate(images)]
+
+# the arrays of toRecords back from records
+def fromRecords(records, numViews, numJoints):
+	n = len(records)
+	pixels = np.full([n, numViews, numJoints, 2], np.nan)
+	sources = np.full([n, numViews, numJoints], None, dtype=object)
+	points = np.full([n, numJoints, 3], np.nan)
+	for i, r in enumerate(records):
+		pixels[i] = _decode(r['pixels']).reshape([numViews, numJoints, 2])
+		sources[i] = np.asarray(r['sources'], dtype=object).reshape([numViews, numJoints])
+		if r.get('points') is not None:
+			points[i] = _decode(r['points']).reshape([numJoints, 3])
+	return [r['image'] for r in records], pixels, sources, points
+
+# the annotations of a project in sqlite, one row per frame with its arrays as raw float64 bytes, since clients
+# always read and write whole frames and a row per annotation makes every write a lot of b-tree inserts
+class Store:
+	def __init__(self, cfg, path=None):
+		self.cfg = cfg
+		self.multi = cfg.mode == 'RGB Multi View'
+		self.views = [str(v) for v in cfg.views] if self.multi else ['']
+		self.joints = [str(j) for j in cfg.joints]
+		path = path or os.path.join(cfg.projectFolder, fileName)
+		new = not os.path.exists(path)
+		# one connection shared by the server's threads, one statement at a time
+		self.lock = threading.Lock()
+		self.db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+		# the write ahead log lets readers go on while a batch is written, and only syncs at checkpoints
+		self.db.execute('PRAGMA journal_mode=WAL')
+		self.db.execute('PRAGMA synchronous=NORMAL')
+		self.db.executescript('''
+			CREATE TABLE IF NOT EXISTS frames (image TEXT PRIMARY KEY, pixels BLOB, sources TEXT, points BLOB, seq INTEGER);
+			CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+		''')
+		meta = dict(self.db.execute('SELECT key, value FROM meta').fetchall())
+		# the arrays only make sense with the views and joints they were written with
+		layout = json.dumps([self.views, self.joints])
+		if new or 'layout' not in meta:
+			self.db.execute("INSERT OR REPLACE INTO meta VALUES ('layout', ?)", (layout,))
+		elif meta['layout'] != layout:
+			raise ValueError('%s was written for other views or joints than cfg.yaml has. Move it away to start over from the CSV files'%path)
+		self.seq = int(meta.get('seq', 0))
+		if new:
+			self.importProject()
+
+	# every frame of the project's CSV files
+	def importProject(self):
+		data = projectdata.read(self.cfg)
+		pixels, sources = data['data_pixel'], data['data_source']
+		cols = pd.MultiIndex.from_product([self.cfg.joints, ['u', 'v']])
+		if self.multi:
+			images = sorted(set(pixels.index.get_level_values(1)))
+			index = pd.MultiIndex.from_product([self.cfg.views, images])
+			shape = [len(self.views), len(images), len(self.joints)]
+			p = pixels.reindex(index=index, columns=cols).values.astype(np.float64).reshape(shape + [2]).transpose([1, 0, 2, 3])
+			s = sources.reindex(index=index, columns=self.cfg.joints).values.reshape(shape).transpose([1, 0, 2])
+			cols3d = pd.MultiIndex.from_product([self.cfg.joints, ['x', 'y', 'z']])
+			X = data['data_3d'].reindex(index=images, columns=cols3d).values.astype(np.float64).reshape([len(images), -1, 3])
+		else:
+			images = sorted(set(pixels.index))
+			p = pixels.reindex(index=images, columns=cols).values.astype(np.float64).reshape([len(images), 1, -1, 2])
+			s = sources.reindex(index=images, columns=self.cfg.joints).values.reshape([len(images), 1, -1])
+			X = None
+		self.write(images, p, s, X)
+
+	# replace the frames of images with the arrays of toRecords, in one transaction. returns the new sequence number
+	def write(self, images, pixels, sources, points=None):
+		pixels = np.ascontiguousarray(pixels, dtype=np.float64)
+		rows = [(str(image), pixels[i].tobytes(), json.dumps([s if isinstance(s, str) else None for s in sources[i].ravel()]),
+			None if points is None else np.ascontiguousarray(points[i], dtype=np.float64).tobytes()) for i, image in enumerate(images)]
+		with self.lock:
+			self.db.execute('BEGIN')
+			try:
+				self.seq += 1
+				self.db.executemany('INSERT OR REPLACE INTO frames VALUES (?, ?, ?, ?, %d)'%self.seq, rows)
+				self.db.execute("INSERT OR REPLACE INTO meta VALUES ('seq', ?)", (str(self.seq),))
+				self.db.execute('COMMIT')
+			except Exception:
+				self.seq -= 1
+				self.db.execute('ROLLBACK')
+				raise
+			return self.seq
+
+	# (images, pixels, sources, points) of images, or of every frame that was ever written when images is None.
+	# images that were never written come back empty
+	def read(self, images=None):
+		with self.lock:
+			if images is None:
+				rows = self.db.execute('SELECT image, pixels, sources, points FROM frames ORDER BY image').fetchall()
+				images = [r[0] for r in rows]
+			else:
+				images = [str(image) for image in images]
+				rows = []
+				# sqlite limits the number of parameters in a statement
+				for i in range(0, len(images), 500):
+					chunk = images[i:i+500]
+					rows += self.db.execute('SELECT image, pixels, sources, points FROM frames WHERE image IN (%s)'%','.join('?'*len(chunk)), chunk).fetchall()
+		numViews, numJoints = len(self.views), len(self.joints)
+		frameOf = {image: i for i, image in enumerate(images)}
+		pixels = np.full([len(images), numViews, numJoints, 2], np.nan)
+		sources = np.full([len(images), numViews, numJoints], None, dtype=object)
+		points = np.full([len(images), numJoints, 3], np.nan) if self.multi else None
+		for image, p, s, X in rows:
+			i = frameOf[image]
+			pixels[i] = np.frombuffer(p, dtype=np.float64).reshape([numViews, numJoints, 2])
+			sources[i] = np.array(json.loads(s), dtype=object).reshape([numViews, numJoints])
+			if self.multi and X is not None:
+				points[i] = np.frombuffer(X, dtype=np.float64).reshape([numJoints, 3])
+		return images, pixels, sources, points
+
+	# write the project's CSV files from the database, in the layout the windows save, so everything that reads
+	# them (like cli.py) sees the shared annotations. returns the backups of the files replaced
+	def export(self):
+		with self.lock:
+			written = {r[0] for r in self.db.execute('SELECT image FROM frames')}
+		images = sorted(projectdata.imageNames(self.cfg) | written)
+		_, pixels, sources, points = self.read(images)
+		numImages, numViews, numJoints = len(images), len(self.views), len(self.joints)
+		cols = pd.MultiIndex.from_product([self.cfg.joints, ['u', 'v']], names=['joint', 'coordinate'])
+		if self.multi:
+			index = pd.MultiIndex.from_product([self.cfg.views, images], names=['view', 'image'])
+			pixels = pixels.transpose([1, 0, 2, 3])
+			sources = sources.transpose([1, 0, 2])
+		else:
+			index = pd.Index(images, name='image')
+		frames = {
+			projectdata.pixelFile: pd.DataFrame(pixels.reshape([numViews*numImages, -1]), index=index, columns=cols),
+			projectdata.sourceFile: pd.DataFrame(sources.reshape([numViews*numImages, -1]), index=index, columns=self.cfg.joints)
+		}
+		if self.multi:
+			cols3d = pd.MultiIndex.from_product([self.cfg.joints, ['x', 'y', 'z']], names=['joint', 'coordinate'])
+			frames[projectdata.file3d] = pd.DataFrame(points.reshape([numImages, -1]), index=pd.Index(images, name='image'), columns=cols3d)
+		return projectdata.writeFrames(self.cfg, frames)
+
+	def close(self):
+		with self.lock:
+			self.db.close()
+
+# every client gets a thread reading its requests and one sending to it, so a client that's slow to read doesn't
+# hold up the others' writes and change events
+class _Connection(socketserver.StreamRequestHandler):
+	def setup(self):
+		# events and responses are small writes right after one another, which Nagle's algorithm would hold back
+		# until the client acknowledges the last one (which it delays, hoping to have something to send)
+		self.request.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+		super(_Connection, self).setup()
+		self.name = ''
+		self.outgoing = queue.Queue()
+		self.sender = threading.Thread(target=self.sendAll, daemon=True)
+		self.sender.start()
+
+	# data is a message already encoded with _line
+	def send(self, data):
+		self.outgoing.put(data)
+
+	def sendAll(self):
+		while True:
+			data = [self.outgoing.get()]
+			# whatever else is waiting goes out with it
+			while not self.outgoing.empty():
+				data.append(self.outgoing.get_nowait())
+			try:
+				self.wfile.write(b''.join(d for d in data if d is not None))
+			except OSError:
+				return
+			if None in data:
+				return
+
+	def handle(self):
+		self.server.connected(self)
+		try:
+			for line in self.rfile:
+				request = {}
+				try:
+					request = json.loads(line)
+					response = self.server.dispatch(self, request)
+				except Exception as e:
+					response = {'error': str(e)}
+				response['id'] = request.get('id') if isinstance(request, dict) else None
+				self.send(_line(response))
+		except OSError:
+			pass
+		finally:
+			self.server.disconnected(self)
+
+	def finish(self):
+		self.send(None)
+		self.sender.join()
+		super(_Connection, self).finish()
+
+# the server, which handles every client on its own thread. serve_forever() runs it, and shutdown() stops it
+class Server(socketserver.ThreadingTCPServer):
+	daemon_threads = True
+	allow_reuse_address = True
+
+	def __init__(self, cfg, address=('127.0.0.1', defaultPort), store=None):
+		self.store = store or Store(cfg)
+		self.lock = threading.Lock()
+		self.connections = set()
+		# image -> (connection, time the lease expires)
+		self.leases = {}
+		super(Server, self).__init__(address, _Connection)
+
+	def connected(self, connection):
+		with self.lock:
+			self.connections.add(connection)
+
+	def disconnected(self, connection):
+		with self.lock:
+			self.connections.discard(connection)
+			self.leases = {image: lease for image, lease in self.leases.items() if lease[0] is not connection}
+
+	# the name of whoever else holds a lease on image, or None
+	def holder(self, connection, image, now):
+		lease = self.leases.get(image)
+		if lease is None or lease[0] is connection or lease[1] < now:
+			return None
+		return lease[0].name or 'another client'
+
+	def dispatch(self, connection, request):
+		op = request.get('op')
+		numViews, numJoints = len(self.store.views), len(self.store.joints)
+		if op == 'hello':
+			connection.name = str(request.get('name', ''))
+			return {'mode': self.store.cfg.mode, 'views': self.store.views, 'joints': self.store.joints, 'seq': self.store.seq}
+		if op == 'read':
+			# no write can land between reading the frames and taking the sequence number they're up to date with
+			with self.lock:
+				images, pixels, sources, points = self.store.read(request.get('images'))
+				seq = self.store.seq
+			return {'records': toRecords(images, pixels, sources, points), 'seq': seq}
+		if op == 'lease':
+			now = time.time()
+			granted, held = [], {}
+			with self.lock:
+				for image in request['images']:
+					holder = self.holder(connection, image, now)
+					if holder is None:
+						self.leases[image] = (connection, now + float(request.get('seconds', leaseSeconds)))
+						granted.append(image)
+					else:
+						held[image] = holder
+			return {'granted': granted, 'held': held}
+		if op == 'release':
+			with self.lock:
+				for image in request['images']:
+					if image in self.leases and self.leases[image][0] is connection:
+						del self.leases[image]
+			return {}
+		if op == 'write':
+			images, pixels, sources, points = fromRecords(request['records'], numViews, numJoints)
+			# checking the leases, writing and queueing the change events happen under one lock, so no lease is granted
+			# in between and every client gets the events in the order of their sequence numbers
+			with self.lock:
+				now = time.time()
+				accepted = [i for i, image in enumerate(images) if self.holder(connection, image, now) is None]
+				rejected = sorted(set(images) - {images[i] for i in accepted})
+				if len(accepted) == 0:
+					return {'seq': self.store.seq, 'rejected': rejected}
+				seq = self.store.write([images[i] for i in accepted], pixels[accepted], sources[accepted], points[accepted] if self.store.multi else None)
+				# encoded once for every client
+				event = _line({'event': 'changed', 'seq': seq, 'client': connection.name, 'records': [request['records'][i] for i in accepted]})
+				for other in self.connections:
+					if other is not connection:
+						other.send(event)
+			return {'seq': seq, 'rejected': rejected}
+		if op == 'export':
+			return {'backups': self.store.export()}
+		raise ValueError('Unknown op %s'%str(op))
+
+# a connection to the server. requests wait for their response, while change events are collected on a background
+# thread and picked up with events()
+class Client:
+	def __init__(self, address, name='', timeout=30):
+		self.timeout = timeout
+		self.sock = socket.create_connection(address, timeout=timeout)
+		self.sock.settimeout(None)
+		self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+		self.sendLock = threading.Lock()
+		self.condition = threading.Condition()
+		self.nextId = 0
+		self.responses = {}
+		self.received = collections.deque()
+		self.closed = False
+		self.reader = threading.Thread(target=self.receive, daemon=True)
+		self.reader.start()
+		self.info = self.request('hello', name=name)
+
+	def receive(self):
+		try:
+			for line in self.sock.makefile('rb'):
+				message = json.loads(line)
+				if 'event' in message:
+					self.received.append(message)
+				else:
+					with self.condition:
+						self.responses[message.get('id')] = message
+						self.condition.notify_all()
+		except (OSError, ValueError):
+			pass
+		finally:
+			with self.condition:
+				self.closed = True
+				self.condition.notify_all()
+
+	def request(self, op, **args):
+		with self.condition:
+			self.nextId += 1
+			requestId = self.nextId
+		data = _line(dict(args, op=op, id=requestId))
+		with self.sendLock:
+			self.sock.sendall(data)
+		with self.condition:
+			if not self.condition.wait_for(lambda: requestId in self.responses or self.closed, self.timeout):
+				raise TimeoutError('The annotation server did not answer')
+			if requestId not in self.responses:
+				raise ConnectionError('The annotation server closed the connection')
+			response = self.responses.pop(requestId)
+		if 'error' in response:
+			raise ValueError(response['error'])
+		return response
+
+	# change events received since the last call. never waits
+	def events(self):
+		out = []
+		while len(self.received) > 0:
+			out.append(self.received.popleft())
+		return out
+
+	def read(self, images=None):
+		return self.request('read', images=None if images is None else [str(image) for image in images])
+
+	def lease(self, images, seconds=leaseSeconds):
+		return self.request('lease', images=[str(image) for image in images], seconds=seconds)
+
+	def release(self, images):
+		return self.request('release', images=[str(image) for image in images])
+
+	def write(self, records):
+		return self.request('write', records=records)
+
+	def export(self):
+		return self.request('export')
+
+	def close(self):
+		try:
+			self.sock.shutdown(socket.SHUT_RDWR)
+		except OSError:
+			pass
+		self.sock.close()
@@ -0,0 +1,317 @@
+import os
+import json
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+from . import projectdata, geometry, distortion, skeleton, jointgroups, calibration, depth
+
+# batch operations on a project's files, without Qt, for running from cli.py on machines without a display.
+# the per-chunk work is done by module-level functions so it can be sent to worker processes.
+
+# fn over items on jobs processes, yielding results in order. only a few items are in flight at once, so items
+# can be streamed from a file without reading all of it
+def parallelMap(fn, items, jobs=1):
+	if jobs <= 1:
+		for item in items:
+			yield fn(item)
+		return
+	with ProcessPoolExecutor(jobs) as pool:
+		pending = []
+		for item in items:
+			pending.append(pool.submit(fn, item))
+			if len(pending) >= 2*jobs:
+				yield pending.pop(0).result()
+		for f in pending:
+			yield f.result()
+
+def _labeled(chunk, joints):
+	u = chunk.reindex(columns=pd.MultiIndex.from_product([joints, ['u']])).values.astype(np.float64)
+	v = chunk.reindex(columns=pd.MultiIndex.from_product([joints, ['v']])).values.astype(np.float64)
+	return u, v
+
+def _views(chunk, multi):
+	return chunk.index.get_level_values(0).astype(str).values if multi else np.full(len(chunk), '', dtype=object)
+
+# problems with a project, as (level, message) pairs where level is 'error' or 'warning'
+def validate(cfg, chunkSize=100000, maxError=0.01):
+	problems = []
+	multi = cfg.mode == 'RGB Multi View'
+	if cfg.mode not in ['RGB Single View', 'RGB Multi View', 'RGB Depth']:
+		return [('error', 'Project Mode must be "RGB Single View", "RGB Multi View", or "RGB Depth", but was %s'%str(cfg.mode))]
+	for field in ['joints', 'imageFolder', 'projectFolder', 'imageExtension'] + (['views', 'projectionMatrices'] if multi else []):
+		if getattr(cfg, field, None) is None:
+			problems.append(('error', 'cfg.yaml has no %s'%field))
+	if len(problems) > 0:
+		return problems
+	if len(set(cfg.joints)) != len(cfg.joints):
+		problems.append(('error', 'cfg.yaml has repeated joints'))
+	if not os.path.isdir(cfg.imageFolder):
+		problems.append(('error', 'Image folder %s does not exist'%cfg.imageFolder))
+	for check in [skeleton.bones, jointgroups.groups] + ([distortion.coefficients] if multi else []) + ([depth.settings] if cfg.mode == 'RGB Depth' else []):
+		try:
+			check(cfg)
+		except ValueError as e:
+			problems.append(('error', str(e)))
+	mats = None
+	if multi:
+		mats = np.asarray(cfg.projectionMatrices, dtype=np.float64)
+		if mats.shape != (len(cfg.views), 3, 4) or not np.isfinite(mats).all():
+			problems.append(('error', 'Projection matrices must be %d x 3 x 4 and finite, but were %s'%(len(cfg.views), str(mats.shape))))
+			mats = None
+
+	images = projectdata.imageNames(cfg)
+	if len(images) == 0:
+		problems.append(('error', 'Project has no images%s'%(' that exist in all views' if multi else '')))
+	if cfg.mode == 'RGB Depth' and not any(level == 'error' for level, _ in problems):
+		depthFolder = depth.settings(cfg)[0]
+		noDepth = [image for image in images if not os.path.exists(depth.path(depthFolder, image))]
+		if len(noDepth) > 0:
+			problems.append(('warning', '%d images have no depth map in %s'%(len(noDepth), depthFolder)))
+
+	# 3d points, to check that the pixel annotations agree with them
+	data_3d = None
+	if mats is not None and os.path.exists(os.path.join(cfg.projectFolder, projectdata.file3d)):
+		data_3d = pd.read_csv(os.path.join(cfg.projectFolder, projectdata.file3d), index_col=0, header=[0,1])
+		data_3d = data_3d.reindex(columns=pd.MultiIndex.from_product([cfg.joints, ['x', 'y', 'z']]))
+		coeffs = distortion.coefficients(cfg)
+		intr = distortion.intrinsics(mats)
+
+	annotated = set()
+	half, outside, disagree, unknownViews = 0, 0, 0, set()
+	for chunk in projectdata.iterPixels(cfg, chunkSize):
+		missingJoints = set(cfg.joints) - set(chunk.columns.get_level_values(0))
+		if len(missingJoints) > 0:
+			problems.append(('error', 'Annotations have no columns for joints %s'%', '.join(sorted(missingJoints))))
+			return problems
+		imgs = chunk.index.get_level_values(-1)
+		annotated.update(imgs)
+		u, v = _labeled(chunk, cfg.joints)
+		half += int((np.isnan(u) != np.isnan(v)).sum())
+		outside += int(((u < 0) | (u > 1) | (v < 0) | (v > 1)).sum())
+		if data_3d is not None:
+			views = _views(chunk, multi)
+			viewIdx = pd.Index([str(view) for view in cfg.views]).get_indexer(views)
+			unknownViews.update(views[viewIdx < 0])
+			ok = viewIdx >= 0
+			X = data_3d.reindex(index=imgs[ok]).values.astype(np.float64).reshape([ok.sum(), len(cfg.joints), 3])
+			P = mats[viewIdx[ok]] # rows x 3 x 4
+			Xh = np.concatenate([X, np.ones(X.shape[:-1] + (1,))], axis=-1)
+			p = np.einsum('rij,rkj->rki', P, Xh)
+			with np.errstate(divide='ignore', invalid='ignore'):
+				uv = p[..., :2] / p[..., 2, None]
+			if coeffs is not None:
+				# every row is in its own view, so distort joints x rows x 2
+				uv = distortion.distort(uv.transpose([1, 0, 2]), coeffs[viewIdx[ok]], intr[viewIdx[ok]]).transpose([1, 0, 2])
+			err = np.hypot(uv[..., 0] - u[ok], uv[..., 1] - v[ok])
+			disagree += int((err > maxError).sum())
+
+	if half > 0:
+		problems.append(('error', '%d annotations have only one of u and v'%half))
+	if outside > 0:
+		problems.append(('warning', '%d annotations are outside of their image'%outside))
+	if len(unknownViews) > 0:
+		problems.append(('error', 'Annotations refer to views that aren\'t in cfg.yaml: %s'%', '.join(sorted(unknownViews))))
+	if disagree > 0:
+		problems.append(('warning', '%d annotations are more than %g from the projection of their 3d point'%(disagree, maxError)))
+	removed = annotated - images
+	if len(removed) > 0:
+		problems.append(('warning', '%d annotated images no longer exist%s'%(len(removed), ' in every view' if multi else '')))
+	added = images - annotated
+	if len(added) > 0 and len(annotated) > 0:
+		problems.append(('warning', '%d images have no annotation rows yet'%len(added)))
+	return problems
+
+def _chunkStats(args):
+	chunk, joints, multi = args
+	u, v = _labeled(chunk, joints)
+	labeled = ~np.isnan(u) & ~np.isnan(v)
+	views = _views(chunk, multi)
+	counts = pd.DataFrame(labeled.astype(np.int64), columns=joints).groupby(views).sum()
+	counts['complete frames'] = pd.Series(labeled.all(axis=1).astype(np.int64)).groupby(views).sum()
+	counts['frames'] = pd.Series(np.ones(len(chunk), dtype=np.int64)).groupby(views).sum()
+	return counts
+
+# per view: the number of frames, the number of frames with every joint labeled, and how many times every joint is
+# labeled. also counts where the annotations came from
+def stats(cfg, jobs=1, chunkSize=100000):
+	multi = cfg.mode == 'RGB Multi View'
+	total = None
+	chunks = ((chunk, cfg.joints, multi) for chunk in projectdata.iterPixels(cfg, chunkSize))
+	for counts in parallelMap(_chunkStats, chunks, jobs):
+		total = counts if total is None else total.add(counts, fill_value=0)
+	sources = pd.Series(dtype=np.int64)
+	path = os.path.join(cfg.projectFolder, projectdata.sourceFile)
+	if os.path.exists(path):
+		indexCol = [0,1] if multi else 0
+		for chunk in pd.read_csv(path, index_col=indexCol, header=0, chunksize=chunkSize):
+			sources = sources.add(pd.Series(chunk.values.ravel()).dropna().value_counts(), fill_value=0)
+	return {
+		'views': {} if total is None else {str(view): {k: int(c) for k, c in row.items()} for view, row in total.iterrows()},
+		'sources': {str(k): int(c) for k, c in sources.items()}
+	}
+
+def formatStats(s):
+	lines = []
+	for view, row in s['views'].items():
+		lines.append('%s%d frames, %d complete'%('%s: '%view if view else '', row['frames'], row['complete frames']))
+		joints = [(k, c) for k, c in row.items() if k not in ['frames', 'complete frames']]
+		for joint, c in joints:
+			lines.append('  %s: %d (%.1f%%)'%(joint, c, 100*c/max(row['frames'], 1)))
+	if len(s['sources']) > 0:
+		lines.append('sources: ' + ', '.join('%s %d'%(k, c) for k, c in sorted(s['sources'].items())))
+	return '\n'.join(lines)
+
+def _exportChunk(args):
+	chunk, joints, multi, format = args
+	u, v = _labeled(chunk, joints)
+	views = _views(chunk, multi)
+	imgs = chunk.index.get_level_values(-1).astype(str).values
+	if format == 'jsonl':
+		lines = []
+		for r in range(len(chunk)):
+			obj = {'image': imgs[r]}
+			if multi:
+				obj['view'] = views[r]
+			obj['joints'] = {j: [u[r, i], v[r, i]] for i, j in enumerate(joints) if not np.isnan(u[r, i])}
+			lines.append(json.dumps(obj))
+		return ''.join(line + '\n' for line in lines)
+	# one row per labeled (image, view, joint)
+	rows, cols = np.nonzero(~np.isnan(u) & ~np.isnan(v))
+	long = pd.DataFrame({
+		'image': imgs[rows],
+		'view': views[rows],
+		'joint': np.asarray(joints, dtype=object)[cols],
+		'u': u[rows, cols],
+		'v': v[rows, cols]
+	})
+	if not multi:
+		long = long.drop(columns='view')
+	return long.to_csv(index=False, header=False)
+
+# writes every labeled annotation to out (a file object), either as long csv (image, view, joint, u, v) or as
+# json lines (one object per image and view). chunks are converted in parallel and written in order
+def export(cfg, out, format='csv', jobs=1, chunkSize=100000):
+	multi = cfg.mode == 'RGB Multi View'
+	if format == 'csv':
+		out.write('image,view,joint,u,v\n' if multi else 'image,joint,u,v\n')
+	chunks = ((chunk, cfg.joints, multi, format) for chunk in projectdata.iterPixels(cfg, chunkSize))
+	for text in parallelMap(_exportChunk, chunks, jobs):
+		out.write(text)
+
+def _triangulateChunk(args):
+	mats, points = args
+	return geometry.triangulate(mats, points)
+
+# the (image, joint) points triangulated from their hand-labeled annotations (images*joints x 3, nan where fewer
+# than 2 views were labeled by hand), and which views were labeled by hand (images*joints x views)
+def _handTriangulate(cfg, data_pixel, data_source, images, jobs=1, chunkSize=100000):
+	mats = np.asarray(cfg.projectionMatrices, dtype=np.float64)
+	coeffs = distortion.coefficients(cfg)
+	obs = calibration.annotationArray(data_pixel, cfg.views, images, cfg.joints) # images*joints x views x 2
+	sources = np.stack([
+		data_source.loc[view].reindex(index=images, columns=cfg.joints).values for view in cfg.views
+	]).reshape([len(cfg.views), -1]).T
+	# only what was placed by hand; older projects have no sources at all, so those count as placed by hand too
+	handLabeled = (sources != 'projected') & (sources != 'interpolated')
+	obs[~handLabeled] = np.nan
+	if coeffs is not None:
+		obs = distortion.undistort(obs, coeffs, distortion.intrinsics(mats))
+	chunks = ((mats, obs[i:i+chunkSize]) for i in range(0, len(obs), chunkSize))
+	X = np.concatenate(list(parallelMap(_triangulateChunk, chunks, jobs)) or [np.zeros([0, 3])])
+	return X, handLabeled
+
+# triangulates every (image, joint) from its hand-labeled annotations (least squares over all the views, unlike
+# the window, which agrees exactly with the view being labeled). points seen in fewer than 2 views keep their
+# old 3d value. with reproject, the views that weren't labeled by hand get the reprojected points
+def retriangulate(cfg, jobs=1, reproject=False, chunkSize=100000):
+	if cfg.mode != 'RGB Multi View':
+		raise ValueError('Only multi view projects can be triangulated')
+	data = projectdata.readMultiview(cfg)
+	data_pixel, data_3d = data['data_pixel'], data['data_3d']
+	images = data_3d.index.values
+	data_source = data['data_source'].reindex(index=data_pixel.index, columns=cfg.joints).astype(object)
+	mats = np.asarray(cfg.projectionMatrices, dtype=np.float64)
+	coeffs = distortion.coefficients(cfg)
+	intr = distortion.intrinsics(mats)
+
+	X, handLabeled = _handTriangulate(cfg, data_pixel, data_source, images, jobs, chunkSize)
+	valid = np.isfinite(X).all(axis=1)
+
+	cols3d = data_3d.columns.get_indexer(pd.MultiIndex.from_product([cfg.joints, ['x', 'y', 'z']]))
+	old = data_3d.iloc[:, cols3d].values.astype(np.float64).reshape([-1, 3])
+	old[valid] = X[valid]
+	data_3d.iloc[:, cols3d] = old.reshape([len(images), -1])
+	frames = {projectdata.file3d: data_3d}
+
+	if reproject:
+		uv = geometry.project(mats, X[valid]) # n x views x 2
+		if coeffs is not None:
+			uv = distortion.distort(uv, coeffs, intr)
+		pointIdx = np.flatnonzero(valid)
+		imageIdx, jointIdx = pointIdx // len(cfg.joints), pointIdx % len(cfg.joints)
+		pixelCols = data_pixel.columns.get_indexer(pd.MultiIndex.from_product([cfg.joints, ['u', 'v']])).reshape([-1, 2])
+		values = data_pixel.values.astype(np.float64)
+		srcValues = data_source.values.copy()
+		for i, view in enumerate(cfg.views):
+			rows = data_pixel.index.get_indexer(pd.MultiIndex.from_arrays([np.full(len(pointIdx), view), images[imageIdx]]))
+			replace = (rows >= 0) & ~handLabeled[pointIdx, i] & np.isfinite(uv[:, i]).all(axis=1)
+			r, j = rows[replace], jointIdx[replace]
+			values[r, pixelCols[j, 0]] = uv[replace, i, 0]
+			values[r, pixelCols[j, 1]] = uv[replace, i, 1]
+			srcValues[r, j] = 'projected'
+		frames[projectdata.pixelFile] = pd.DataFrame(values, index=data_pixel.index, columns=data_pixel.columns)
+		frames[projectdata.sourceFile] = pd.DataFrame(srcValues, index=data_source.index, columns=data_source.columns)
+	return int(valid.sum()), projectdata.writeFrames(cfg, frames)
+
+# adds another project's annotations to this one. each (row, joint) is taken whole from one project, its pixel
+# together with its source: from the preferred one, unless only the other has it. a 3d point comes from the project
+# whose pixels it was made from; where an image's joint now has pixels from both, it's triangulated again from them
+def merge(cfg, otherCfg, prefer='ours', jobs=1, chunkSize=100000):
+	if cfg.mode != otherCfg.mode:
+		raise ValueError('Can\'t merge a %s project into a %s project'%(otherCfg.mode, cfg.mode))
+	if set(otherCfg.joints) - set(cfg.joints):
+		raise ValueError('The other project has joints this one doesn\'t: %s'%', '.join(sorted(set(otherCfg.joints) - set(cfg.joints))))
+	if cfg.mode == 'RGB Multi View' and set(map(str, otherCfg.views)) - set(map(str, cfg.views)):
+		raise ValueError('The other project has views this one doesn\'t')
+	ours, theirs = projectdata.read(cfg), projectdata.read(otherCfg)
+	first, second = (ours, theirs) if prefer == 'ours' else (theirs, ours)
+	numJoints = len(cfg.joints)
+
+	rows = ours['data_pixel'].index.union(theirs['data_pixel'].index).union(ours['data_source'].index).union(theirs['data_source'].index)
+	pixelCols = pd.MultiIndex.from_product([cfg.joints, ['u', 'v']], names=['joint', 'coordinate'])
+	def pixels(data):
+		return data['data_pixel'].reindex(index=rows, columns=pixelCols).values.astype(np.float64).reshape([len(rows), numJoints, 2])
+	def sources(data):
+		return data['data_source'].reindex(index=rows, columns=cfg.joints).values.astype(object)
+	p1, p2 = pixels(first), pixels(second)
+	has1 = np.isfinite(p1).all(axis=2)
+	fromSecond = ~has1 & np.isfinite(p2).all(axis=2)
+	data_pixel = pd.DataFrame(np.where(fromSecond[:, :, None], p2, p1).reshape([len(rows), -1]), index=rows, columns=pixelCols)
+	data_source = pd.DataFrame(np.where(fromSecond, sources(second), sources(first)), index=rows, columns=pd.Index(cfg.joints))
+	frames = {projectdata.pixelFile: data_pixel.sort_index(), projectdata.sourceFile: data_source.sort_index()}
+
+	if 'data_3d' in ours:
+		rowImages = rows.get_level_values(rows.nlevels-1)
+		images = ours['data_3d'].index.union(theirs['data_3d'].index).union(rowImages.unique())
+		cols3d = pd.MultiIndex.from_product([cfg.joints, ['x', 'y', 'z']], names=['joint', 'coordinate'])
+		def points(data):
+			return data['data_3d'].reindex(index=images, columns=cols3d).values.astype(np.float64).reshape([len(images), numJoints, 3])
+		X1, X2 = points(first), points(second)
+		# which projects each image's joints have pixels from, over all its views
+		any1 = np.zeros([len(images), numJoints], dtype=bool)
+		any2 = np.zeros([len(images), numJoints], dtype=bool)
+		imageIdx = images.get_indexer(rowImages)
+		np.logical_or.at(any1, imageIdx, has1)
+		np.logical_or.at(any2, imageIdx, fromSecond)
+		# points without pixels in either project are picked like the pixels are
+		use2 = (any2 & ~any1) | (~any1 & ~any2 & ~np.isfinite(X1).all(axis=2) & np.isfinite(X2).all(axis=2))
+		X = np.where(use2[:, :, None], X2, X1)
+		mixed = any1 & any2
+		if cfg.mode == 'RGB Multi View' and mixed.any():
+			redo = np.flatnonzero(mixed.any(axis=1))
+			Xt = _handTriangulate(cfg, data_pixel, data_source, images[redo], jobs, chunkSize)[0].reshape([len(redo), numJoints, 3])
+			# if it can't be triangulated (fewer than 2 views labeled by hand), the preferred project's point stays
+			replace = mixed[redo] & np.isfinite(Xt).all(axis=2)
+			X[redo] = np.where(replace[:, :, None], Xt, X[redo])
+		frames[projectdata.file3d] = pd.DataFrame(X.reshape([len(images), -1]), index=images, columns=cols3d)
+	return projectdata.writeFrames(cfg, frames)
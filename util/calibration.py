@@ -0,0 +1,153 @@
+import os
+import shutil
+import time
+import numpy as np
+import yaml
+from .geometry import triangulate, reprojectionErrors
+
+# refines projection matrices with a sparse Levenberg-Marquardt bundle adjustment.
+# the unknowns are the 12 entries of every projection matrix plus an (x,y,z) for every point;
+# the point blocks are eliminated with the Schur complement so that only a (12*views x 12*views)
+# system ever has to be solved, no matter how many points there are.
+
+# turn the pixel annotation frame into a (points, views, 2) array, where each point is an (image, joint) pair
+def annotationArray(data_pixel, views, images, joints):
+	cols = [(joint, c) for joint in joints for c in ['u', 'v']]
+	arr = np.stack([
+		data_pixel.loc[view].reindex(index=images, columns=cols).values.astype(np.float64) for view in views
+	]) # views x images x joints*2
+	arr = arr.reshape([len(views), len(images)*len(joints), 2])
+	return arr.transpose([1, 0, 2])
+
+def _rms(err):
+	err = err[~np.isnan(err)]
+	return float(np.sqrt(np.mean(err**2))) if len(err) > 0 else float('nan')
+
+# residuals and jacobians for every (point, view) slot; missing observations get zeroed out by the mask
+def _linearize(mats, X, obs, mask):
+	Xh = np.concatenate([X, np.ones([len(X), 1])], axis=1)
+	p = np.einsum('vij,nj->nvi', mats, Xh)
+	w = p[:, :, 2]
+	w = np.where(mask, w, 1.0)
+	proj = p[:, :, :2] / w[:, :, None]
+	r = np.where(mask[:, :, None], proj - np.nan_to_num(obs), 0.0) # N x V x 2
+	# d(u,v)/d(row entries of P) -- only rows 0 (for u), 1 (for v), and 2 (for both) are non-zero
+	s = (mask / w)[:, :, None] * Xh[:, None, :] # N x V x 4
+	Jc = np.zeros([len(X), len(mats), 2, 12])
+	Jc[:, :, 0, 0:4] = s
+	Jc[:, :, 1, 4:8] = s
+	Jc[:, :, 0, 8:12] = -proj[:, :, 0, None] * s
+	Jc[:, :, 1, 8:12] = -proj[:, :, 1, None] * s
+	# d(u,v)/dX
+	Jp = (mats[None, :, :2, :3] - proj[:, :, :, None] * mats[None, :, 2, None, :3]) / w[:, :, None, None]
+	Jp = Jp * mask[:, :, None, None] # N x V x 2 x 3
+	return r, Jc, Jp
+
+def refineProjectionMatrices(mats, obs, minViews=2, maxError=0.02, iterations=20, prior=1e-6, chunkSize=4096):
+	mats0 = np.asarray(mats, dtype=np.float64)
+	numViews = len(mats0)
+	# work with unit-norm matrices; the scale of a projection matrix is arbitrary
+	scales = np.linalg.norm(mats0.reshape([numViews, -1]), axis=1)
+	mats0 = mats0 / scales[:, None, None]
+
+	# only keep points that are seen in enough views and already agree with the current calibration
+	mask = ~np.isnan(obs).any(axis=2)
+	indices = np.flatnonzero(mask.sum(axis=1) >= minViews)
+	obs, mask = obs[indices], mask[indices]
+	X = triangulate(mats0, obs)
+	with np.errstate(invalid='ignore'):
+		pointErr = np.nanmax(reprojectionErrors(mats0, X, obs), axis=1)
+	keep = np.isfinite(X).all(axis=1) & (pointErr <= maxError)
+	obs, mask, X, indices = obs[keep], mask[keep], X[keep], indices[keep]
+	if len(X) == 0:
+		raise ValueError('No annotations were labeled in at least %d views with reprojection error below %g.'%(minViews, maxError))
+
+	before = reprojectionErrors(mats0, X, obs)
+	P = mats0.copy()
+	lam = 1e-3
+	cost = np.nansum(before**2)
+	for _ in range(iterations):
+		step = _solveStep(P, X, obs, mask, mats0, lam, prior, chunkSize)
+		newP = P + step[0].reshape([numViews, 3, 4])
+		newP /= np.linalg.norm(newP.reshape([numViews, -1]), axis=1)[:, None, None]
+		newX = X + step[1]
+		newCost = np.nansum(reprojectionErrors(newP, newX, obs)**2)
+		if np.isfinite(newCost) and newCost < cost:
+			converged = (cost - newCost) < 1e-10 * cost
+			P, X, cost = newP, newX, newCost
+			lam = max(lam / 10, 1e-12)
+			if converged:
+				break
+		else:
+			lam *= 10
+			if lam > 1e8:
+				break
+	after = reprojectionErrors(P, X, obs)
+
+	report = {
+		'points': int(len(X)),
+		'observations': int(mask.sum()),
+		'rmsBefore': _rms(before),
+		'rmsAfter': _rms(after),
+		'viewRmsBefore': [_rms(before[:, v]) for v in range(numViews)],
+		'viewRmsAfter': [_rms(after[:, v]) for v in range(numViews)],
+		'pointIndices': indices,
+	}
+	# restore the original scale so the numbers in cfg.yaml stay recognizable
+	P = P * scales[:, None, None]
+	return P, X, report
+
+def _solveStep(P, X, obs, mask, P0, lam, prior, chunkSize):
+	numViews = len(P)
+	n = 12*numViews
+	S = np.zeros([n, n])
+	g = np.zeros(n)
+	chunks = []
+	# accumulate the reduced camera system chunk by chunk so memory stays bounded for large projects
+	for start in range(0, len(X), chunkSize):
+		sl = slice(start, start+chunkSize)
+		r, Jc, Jp = _linearize(P, X[sl], obs[sl], mask[sl])
+		m = len(r)
+		U = np.einsum('nvki,nvkj->vij', Jc, Jc)
+		V = np.einsum('nvki,nvkj->nij', Jp, Jp)
+		V = V + lam * np.eye(3) * (1 + np.diagonal(V, axis1=1, axis2=2))[:, None, :]
+		W = np.einsum('nvki,nvkj->nvij', Jc, Jp).reshape([m, n, 3]) # camera/point coupling
+		gc = np.einsum('nvki,nvk->vi', Jc, r).reshape(n)
+		gp = np.einsum('nvki,nvk->ni', Jp, r)
+		Vinv = np.linalg.inv(V)
+		Y = np.matmul(W, Vinv) # m x n x 3
+		blocks = np.zeros([numViews, 12, numViews, 12])
+		blocks[np.arange(numViews), :, np.arange(numViews), :] = U
+		S += blocks.reshape([n, n]) - np.matmul(Y.transpose([1, 0, 2]).reshape([n, -1]), W.transpose([1, 0, 2]).reshape([n, -1]).T)
+		g += gc - np.einsum('nij,nj->i', Y, gp)
+		chunks.append((sl, W, Vinv, gp))
+	# levenberg-marquardt damping plus a weak prior toward the starting matrices, which pins down the gauge
+	S[np.diag_indices(n)] += lam * (1 + np.diagonal(S).copy()) + prior
+	g += prior * (P - P0).reshape(n)
+	dc = np.linalg.solve(S, -g)
+	dX = np.zeros_like(X)
+	for sl, W, Vinv, gp in chunks:
+		dX[sl] = -np.einsum('nij,nj->ni', Vinv, gp + np.einsum('nij,i->nj', W, dc))
+	return dc, dX
+
+# write refined projection matrices into the project's cfg.yaml, keeping a timestamped backup of the old one
+def writeProjectionMatrices(projectFolder, mats):
+	path = os.path.join(projectFolder, 'cfg.yaml')
+	backup = '%s.%s.bak'%(path, time.strftime('%Y%m%d-%H%M%S'))
+	shutil.copy2(path, backup)
+	with open(path, 'r') as f:
+		cfg = yaml.safe_load(f)
+	cfg['projectionMatrices'] = np.asarray(mats, dtype=np.float64).tolist()
+	with open(path, 'w') as f:
+		yaml.dump(cfg, f)
+	return backup
+
+def formatReport(report, views):
+	lines = [
+		'Refined using %d points (%d observations).'%(report['points'], report['observations']),
+		'RMS reprojection error: %.6f -> %.6f'%(report['rmsBefore'], report['rmsAfter']),
+		''
+	]
+	for view, b, a in zip(views, report['viewRmsBefore'], report['viewRmsAfter']):
+		lines.append('%s: %.6f -> %.6f'%(view, b, a))
+	return '\n'.join(lines)
@@ -0,0 +1,15 @@
+from PySide2.QtGui import QColor
+
+# color schemes for the joints
+schemes = ['Default', 'Rainbow']
+
+def jointColors(numJoints, scheme='Default'):
+	if scheme == 'Default':
+		# I guess these aren't necessarily visually distinct, maybe there's a better way
+		inc = 256**3 // numJoints
+		color = 256**3-1
+		return [QColor(*tuple((color-inc*i).to_bytes(3, 'big'))) for i in range(numJoints)]
+	elif scheme == 'Rainbow':
+		# evenly spaced hues
+		return [QColor.fromHsvF(i / numJoints, 0.85, 1.0) for i in range(numJoints)]
+	raise ValueError('Color scheme must be one of %s, but was %s'%(str(schemes), str(scheme)))
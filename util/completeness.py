@@ -0,0 +1,37 @@
+import numpy as np
+import pandas as pd
+
+# per-frame labeling completeness, as drawn by the timeline
+
+# fraction of cols (the u column of each joint) that are labeled in data, for every row in rows (views x frames).
+# done in chunks of frames so it doesn't make a copy of the whole table for long sequences
+def fractions(data, rows, cols, chunkSize=65536):
+	rows = np.asarray(rows)
+	out = np.zeros(rows.shape, dtype=np.float32)
+	if len(cols) == 0:
+		return out
+	for start in range(0, rows.shape[1], chunkSize):
+		r = rows[:, start:start+chunkSize]
+		labeled = ~pd.isna(data.iloc[r.ravel(), cols].values)
+		out[:, start:start+chunkSize] = labeled.mean(axis=1).reshape(r.shape)
+	return out
+
+# frame boundaries of numBins bins covering numFrames frames (no bin is empty, so there are at most numFrames bins)
+def binEdges(numFrames, numBins):
+	numBins = max(1, min(numBins, numFrames))
+	return np.linspace(0, numFrames, numBins+1).astype(np.int64)
+
+# mean of every bin, rows x bins
+def binned(fraction, edges):
+	return np.add.reduceat(fraction, edges[:-1], axis=1) / np.diff(edges)
+
+# red (nothing labeled) through yellow to green (everything labeled), as BGRA
+lut = np.zeros([256, 4], dtype=np.uint8)
+_t = np.linspace(0, 1, 256)
+lut[:, 2] = np.clip(2 - 2*_t, 0, 1) * 200 # red
+lut[:, 1] = np.clip(2*_t, 0, 1) * 180 # green
+lut[:, 3] = 255
+
+# rows x bins fractions to a rows x bins x 4 image
+def colorize(values):
+	return lut[np.round(np.nan_to_num(values) * 255).astype(np.int64)]
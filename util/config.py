@@ -0,0 +1,12 @@
+import os
+from collections import namedtuple
+import yaml
+
+# reading a project's cfg.yaml. kept apart from util/projectdata.py (which needs pandas), so the launcher can check
+# a project's config on the main thread without loading pandas
+
+def loadConfig(projectFolder):
+	with open(os.path.join(projectFolder, 'cfg.yaml'), 'r') as f:
+		cfg = yaml.safe_load(f)
+	# unnecessary, but feels cleaner to access the fields when it's a namedtuple
+	return namedtuple("cfg", cfg.keys())(*cfg.values())
@@ -0,0 +1,130 @@
+import os
+import functools
+import numpy as np
+
+# depth maps for RGB Depth projects. every image has a depth map with the same name in depthFolder, saved as a
+# 2d .npy array (any numeric type, e.g. uint16 millimeters with depthScale 0.001). depth maps are memory mapped, so
+# looking up a few points only reads the pages around them instead of decoding the whole map.
+# cfg.yaml entries:
+#   projectionMatrix: 3x4 matrix of the depth camera, in the same (0,0)-(1,1) image coordinates as everything else
+#   depthFolder: optional, <imageFolder>/depth by default
+#   depthScale: optional, multiplies the stored values to get depth along the camera's axis (1 by default)
+#   depthRange: optional [near, far] for coloring the depth overlay, picked from each depth map otherwise
+
+extension = '.npy'
+
+# (depthFolder, projectionMatrix, depthScale, depthRange), raising ValueError if cfg.yaml is missing something
+def settings(cfg):
+	P = getattr(cfg, 'projectionMatrix', None)
+	if P is None:
+		raise ValueError('cfg.yaml needs a projectionMatrix for the depth camera')
+	P = np.asarray(P, dtype=np.float64)
+	if P.shape != (3, 4) or not np.isfinite(P).all():
+		raise ValueError('The projection matrix must be 3 x 4 and finite, but was %s'%str(P.shape))
+	if abs(np.linalg.det(P[:, :3])) < 1e-12:
+		raise ValueError('The left 3 x 3 block of the projection matrix must be invertible')
+	folder = getattr(cfg, 'depthFolder', None) or os.path.join(cfg.imageFolder, 'depth')
+	scale = float(getattr(cfg, 'depthScale', None) or 1.0)
+	depthRange = getattr(cfg, 'depthRange', None)
+	if depthRange is not None and (len(depthRange) != 2 or not depthRange[0] < depthRange[1]):
+		raise ValueError('depthRange must be [near, far] with near < far, but was %s'%str(depthRange))
+	return folder, P, scale, depthRange
+
+def path(folder, image):
+	return os.path.join(folder, os.path.splitext(image)[0] + extension)
+
+# the depth map of an image, memory mapped, or None if it doesn't have one
+def load(folder, image):
+	try:
+		d = np.load(path(folder, image), mmap_mode='r')
+	except (FileNotFoundError, ValueError):
+		return None
+	return d if d.ndim == 2 else None
+
+# depth at n x 2 normalized (u, v) points: the median of the valid (finite and positive) values in the
+# (2*window+1) x (2*window+1) pixels around each point, so a click on an edge or a hole still gets a depth.
+# nan where there are none
+def sample(depthMap, uv, scale=1.0, window=1):
+	uv = np.asarray(uv, dtype=np.float64).reshape([-1, 2])
+	h, w = depthMap.shape
+	out = np.full(len(uv), np.nan)
+	ok = np.isfinite(uv).all(axis=1)
+	if not ok.any():
+		return out
+	offsets = np.arange(-window, window+1)
+	cols = np.floor(uv[ok, 0] * w).astype(np.int64)[:, None, None] + offsets[None, None, :]
+	rows = np.floor(uv[ok, 1] * h).astype(np.int64)[:, None, None] + offsets[None, :, None]
+	inside = (cols >= 0) & (cols < w) & (rows >= 0) & (rows < h)
+	# fancy indexing a memmap only reads the pages holding these pixels
+	values = np.asarray(depthMap[np.clip(rows, 0, h-1), np.clip(cols, 0, w-1)], dtype=np.float64) * scale
+	values[~inside | ~np.isfinite(values) | (values <= 0)] = np.nan
+	values = values.reshape([len(values), -1])
+	has = ~np.isnan(values).all(axis=1)
+	med = np.full(len(values), np.nan)
+	med[has] = np.nanmedian(values[has], axis=1)
+	out[ok] = med
+	return out
+
+# 3d points (n x 3) for normalized (u, v) points (n x 2) at depths z (n, along the camera's axis), inverting
+# P = K [R | t] in closed form: X = M^-1 (z x - p4), with P scaled so that the third row of M = KR is a unit vector
+def backproject(P, uv, z):
+	P = np.asarray(P, dtype=np.float64)
+	M = P[:, :3]
+	P = P * np.sign(np.linalg.det(M)) / np.linalg.norm(M[2])
+	uv = np.asarray(uv, dtype=np.float64).reshape([-1, 2])
+	xh = np.concatenate([uv, np.ones([len(uv), 1])], axis=1)
+	return np.linalg.solve(P[:, :3], (np.asarray(z, dtype=np.float64)[:, None] * xh - P[:, 3]).T).T
+
+# a 256 entry lookup table of BGRA colors (the layout of util/images.py), from near (blue) to far (red)
+@functools.lru_cache(maxsize=None)
+def lut(name='Turbo'):
+	t = np.linspace(0, 1, 256)
+	if name == 'Gray':
+		rgb = np.stack([t, t, t], axis=1)
+	else:
+		# polynomial approximation of the turbo colormap, highest power first
+		rgb = np.stack([np.polyval(c, t) for c in [
+			[59.28637943, -152.94239396, 132.13108234, -42.66032258, 4.61539260, 0.13572138],
+			[2.82956604, 4.27729857, -14.18503333, 4.84296658, 2.19418839, 0.09140261],
+			[27.34824973, -89.90310912, 110.36276771, -60.58204836, 12.64194608, 0.10667330]
+		]], axis=1)
+	out = np.full([256, 4], 255, dtype=np.uint8)
+	out[:, :3] = np.clip(rgb[:, ::-1] * 255, 0, 255).astype(np.uint8)
+	out.flags.writeable = False
+	return out
+
+colormaps = ['Turbo', 'Gray']
+
+# [near, far] of a depth map from a strided subsample, ignoring the closest and farthest 2%
+def autoRange(depthMap, scale=1.0, stride=8):
+	values = np.asarray(depthMap[::stride, ::stride], dtype=np.float64).ravel() * scale
+	values = values[np.isfinite(values) & (values > 0)]
+	if len(values) == 0:
+		return None
+	near, far = np.percentile(values, [2, 98])
+	return near, max(far, near + 1e-6)
+
+# the depth map resampled (nearest) to width x height and colored through the table. the second array is
+# False where there is no depth
+def colorize(depthMap, width, height, depthRange, scale=1.0, table=None):
+	table = lut() if table is None else table
+	h, w = depthMap.shape
+	if (h, w) == (height, width):
+		d = np.asarray(depthMap, dtype=np.float32) * scale
+	else:
+		rows = (np.arange(height) * h // height)[:, None]
+		cols = (np.arange(width) * w // width)[None, :]
+		d = np.asarray(depthMap[rows, cols], dtype=np.float32) * scale
+	valid = np.isfinite(d) & (d > 0)
+	near, far = depthRange
+	idx = np.clip((d - near) * (255 / (far - near)), 0, 255)
+	idx[~valid] = 0
+	return table[idx.astype(np.uint8)], valid
+
+# the colored depth blended over a BGRA image (height x width x 4) wherever there is depth
+def overlay(arr, colored, valid, opacity=0.5):
+	out = arr.copy()
+	a = int(round(opacity * 256))
+	blend = (arr[valid].astype(np.uint16) * (256 - a) + colored[valid].astype(np.uint16) * a) >> 8
+	out[valid] = blend.astype(np.uint8)
+	return out
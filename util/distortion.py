@@ -0,0 +1,114 @@
+import os
+import hashlib
+import numpy as np
+
+# Brown-Conrady lens distortion, with coefficients in OpenCV's order (k1, k2, p1, p2, k3).
+# cfg.yaml can have an optional 'distortion' entry with one list of coefficients (or null) per view.
+# the focal lengths and principal point come from each view's projection matrix, so they are in the
+# same (0,0)-(1,1) image coordinates as everything else.
+
+numCoefficients = 5
+
+# returns a views x 5 array of coefficients, or None if no view is distorted
+def coefficients(cfg):
+	dist = getattr(cfg, 'distortion', None)
+	if dist is None:
+		return None
+	if len(dist) != len(cfg.views):
+		raise ValueError('cfg.yaml has %d distortion entries but %d views'%(len(dist), len(cfg.views)))
+	coeffs = np.zeros([len(dist), numCoefficients])
+	for i, d in enumerate(dist):
+		if d is None:
+			continue
+		if len(d) > numCoefficients:
+			raise ValueError('Distortion for view %s has more than %d coefficients'%(str(cfg.views[i]), numCoefficients))
+		coeffs[i, :len(d)] = d
+	if not coeffs.any():
+		return None
+	return coeffs
+
+# (fu, fv, cu, cv) of every view, from the RQ decomposition of the left 3x3 block of its projection matrix
+def intrinsics(mats):
+	out = []
+	for P in np.asarray(mats, dtype=np.float64):
+		# RQ via QR of the row/column-reversed matrix
+		q, r = np.linalg.qr(P[::-1, :3].T)
+		K = r.T[::-1, ::-1]
+		K = K * np.sign(np.diag(K))[None, :]
+		K = K / K[2, 2]
+		out.append([K[0, 0], K[1, 1], K[0, 2], K[1, 2]])
+	return np.array(out)
+
+# points are ... x views x 2, coeffs are views x 5 and intr are views x 4
+def distort(points, coeffs, intr):
+	k1, k2, p1, p2, k3 = [coeffs[:, i] for i in range(numCoefficients)]
+	x = (points[..., 0] - intr[:, 2]) / intr[:, 0]
+	y = (points[..., 1] - intr[:, 3]) / intr[:, 1]
+	r2 = x*x + y*y
+	radial = 1 + r2*(k1 + r2*(k2 + r2*k3))
+	xd = x*radial + 2*p1*x*y + p2*(r2 + 2*x*x)
+	yd = y*radial + p1*(r2 + 2*y*y) + 2*p2*x*y
+	return np.stack([xd*intr[:, 0] + intr[:, 2], yd*intr[:, 1] + intr[:, 3]], axis=-1)
+
+# inverse of distort, by fixed-point iteration
+def undistort(points, coeffs, intr, iterations=20):
+	k1, k2, p1, p2, k3 = [coeffs[:, i] for i in range(numCoefficients)]
+	xd = (points[..., 0] - intr[:, 2]) / intr[:, 0]
+	yd = (points[..., 1] - intr[:, 3]) / intr[:, 1]
+	x, y = xd, yd
+	for _ in range(iterations):
+		r2 = x*x + y*y
+		radial = 1 + r2*(k1 + r2*(k2 + r2*k3))
+		x = (xd - 2*p1*x*y - p2*(r2 + 2*x*x)) / radial
+		y = (yd - p1*(r2 + 2*y*y) - 2*p2*x*y) / radial
+	return np.stack([x*intr[:, 0] + intr[:, 2], y*intr[:, 1] + intr[:, 3]], axis=-1)
+
+# straight segments in undistorted coordinates become curves in the distorted image, so split each one up.
+# segments are views x n x 4; returns views x n*(samples-1) x 4
+def distortSegments(segments, coeffs, intr, samples=16):
+	t = np.linspace(0, 1, samples)[:, None]
+	pts = segments[:, :, None, :2] + t * (segments[:, :, None, 2:] - segments[:, :, None, :2]) # views x n x samples x 2
+	numViews, n = pts.shape[:2]
+	pts = distort(pts.transpose([1, 2, 0, 3]), coeffs, intr).transpose([2, 0, 1, 3])
+	out = np.concatenate([pts[:, :, :-1], pts[:, :, 1:]], axis=-1)
+	return out.reshape([numViews, -1, 4])
+
+# for every pixel of the undistorted image, the (x, y) pixel of the original image it comes from.
+# tables are cached as .npy files in the project folder and memory-mapped, so they're only ever computed once
+def remapTable(projectFolder, view, coeffs, intr, width, height, chunkRows=256):
+	key = hashlib.md5(np.concatenate([coeffs, intr]).astype(np.float64).tobytes()).hexdigest()[:12]
+	folder = os.path.join(projectFolder, 'undistort-cache')
+	path = os.path.join(folder, '%s-%dx%d-%s.npy'%(view, width, height, key))
+	if not os.path.exists(path):
+		os.makedirs(folder, exist_ok=True)
+		tmp = path + '.tmp'
+		table = np.lib.format.open_memmap(tmp, mode='w+', dtype=np.float32, shape=(height, width, 2))
+		xs = (np.arange(width) + 0.5) / width
+		for start in range(0, height, chunkRows):
+			ys = (np.arange(start, min(start+chunkRows, height)) + 0.5) / height
+			uv = np.stack(np.broadcast_arrays(xs[None, :], ys[:, None]), axis=-1)[..., None, :] # rows x width x 1 x 2
+			src = distort(uv, coeffs[None], intr[None])[..., 0, :]
+			table[start:start+len(ys)] = src * [width, height] - 0.5
+		table.flush()
+		del table
+		os.replace(tmp, path)
+	return np.load(path, mmap_mode='r')
+
+# bilinear lookup of image (height x width x channels) at the positions in table
+def remap(image, table):
+	h, w = image.shape[:2]
+	x = table[..., 0]
+	y = table[..., 1]
+	x0 = np.floor(x).astype(np.int32)
+	y0 = np.floor(y).astype(np.int32)
+	fx = (x - x0)[..., None]
+	fy = (y - y0)[..., None]
+	outside = (x0 < 0) | (y0 < 0) | (x0 >= w-1) | (y0 >= h-1)
+	x0 = np.clip(x0, 0, w-2)
+	y0 = np.clip(y0, 0, h-2)
+	img = image.astype(np.float32)
+	top = img[y0, x0] * (1-fx) + img[y0, x0+1] * fx
+	bottom = img[y0+1, x0] * (1-fx) + img[y0+1, x0+1] * fx
+	out = (top * (1-fy) + bottom * fy).astype(image.dtype)
+	out[outside] = 0
+	return out
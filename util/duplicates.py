@@ -0,0 +1,156 @@
+import os
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+
+# near-duplicate frames, found with a perceptual hash of every image: the image is shrunk to 32 x 32 gray levels,
+# and the lowest 8 x 8 frequencies of its DCT, compared with their median, make a 64 bit hash. images that look
+# alike get hashes that differ in only a few bits, so frames whose hashes are close are near-duplicates.
+# hashes are cached in image-hashes.csv in the project folder with the size and modification time of every image,
+# so only new or changed images are hashed again. cfg.yaml entries (optional):
+#   duplicateThreshold: the most bits that can differ between near-duplicates (4 by default)
+
+fileName = 'image-hashes.csv'
+size = 32
+bits = 8
+defaultThreshold = 4
+
+# orthonormal DCT-II matrix, so the 2d DCT of x is D x D^T
+_k, _n = np.mgrid[0:size, 0:size]
+_D = np.sqrt(2 / size) * np.cos(np.pi * (2*_n + 1) * _k / (2*size))
+_D[0] /= np.sqrt(2)
+
+# number of set bits in every byte
+_popcount = np.array([bin(i).count('1') for i in range(256)], dtype=np.uint8)
+
+# the most bits that can differ between near-duplicates, raising ValueError if cfg.yaml's is out of range
+def threshold(cfg):
+	t = getattr(cfg, 'duplicateThreshold', None)
+	if t is None:
+		return defaultThreshold
+	if not 0 <= t <= bits*bits:
+		raise ValueError('duplicateThreshold must be between 0 and %d, but was %s'%(bits*bits, str(t)))
+	return t
+
+# 64 bit perceptual hash of a grayscale image (height x width)
+def phash(gray):
+	h, w = gray.shape
+	# average the pixels that fall into each of size x size cells (or take the nearest pixel, for tiny images)
+	rows = np.arange(size) * h // size
+	cols = np.arange(size) * w // size
+	if h >= size and w >= size:
+		small = np.add.reduceat(np.add.reduceat(gray, rows, axis=0), cols, axis=1)
+		small /= np.diff(np.append(rows, h))[:, None] * np.diff(np.append(cols, w))[None, :]
+	else:
+		small = gray[rows][:, cols]
+	low = (_D @ small @ _D.T)[:bits, :bits].ravel()
+	# the constant term says nothing about the image's structure, so it's left out of the median
+	return int(np.packbits(low > np.median(low[1:])).view('>u8')[0])
+
+# number of differing bits between hashes (uint64 arrays that broadcast together)
+def distance(a, b):
+	x = np.bitwise_xor(np.asarray(a, dtype=np.uint64), np.asarray(b, dtype=np.uint64))
+	return _popcount[x[..., None].view(np.uint8)].sum(axis=-1)
+
+# worker process: hashes of the images at paths, None for images that can't be read
+def _hashImages(paths):
+	# Qt's decoder is only needed here, so the rest of the module doesn't depend on Qt
+	from .images import grayscale
+	out = []
+	for path in paths:
+		gray = grayscale(path, 4*size)
+		out.append(None if gray is None else phash(gray))
+	return out
+
+# the first frame of the run of near-duplicates every frame is in, for hashes that are views x frames (uint64),
+# where valid says which images could be hashed. frames are near-duplicates when every view is. each frame is
+# compared with the first frame of its run, rather than the one before it, so a slow drift still starts new runs
+def groups(hashes, valid, maxDistance=defaultThreshold):
+	hashes, valid = np.atleast_2d(hashes), np.atleast_2d(valid)
+	numFrames = hashes.shape[1]
+	# frames that can't be near-duplicates of the one before them always start a run, which skips most comparisons
+	close = np.ones(numFrames, dtype=bool)
+	close[0] = False
+	close[1:] = (distance(hashes[:, 1:], hashes[:, :-1]) <= 2*maxDistance).all(axis=0) & valid[:, 1:].all(axis=0) & valid[:, :-1].all(axis=0)
+	out = np.arange(numFrames)
+	start = 0
+	for f in range(1, numFrames):
+		if close[f] and (distance(hashes[:, f], hashes[:, start]) <= maxDistance).all():
+			out[f] = start
+		else:
+			start = f
+	return out
+
+def readCache(cfg):
+	try:
+		cache = pd.read_csv(os.path.join(cfg.projectFolder, fileName), index_col=0, dtype={'hash': str})
+	except FileNotFoundError:
+		return {}
+	return {path: (size, mtime, h) for path, size, mtime, h in zip(cache.index, cache['size'], cache['mtime'], cache['hash'])}
+
+def writeCache(cfg, cache):
+	frame = pd.DataFrame.from_dict(cache, orient='index', columns=['size', 'mtime', 'hash'])
+	frame.index.name = 'path'
+	frame.to_csv(os.path.join(cfg.projectFolder, fileName))
+
+# hashes images (given by their paths relative to cfg.imageFolder) on worker processes, reusing the cached hashes
+# of images that haven't changed, so the window never waits on them
+class HashIndex:
+	def __init__(self, cfg, paths, jobs=None, chunkSize=64):
+		self.cfg = cfg
+		self.paths = list(paths)
+		self.cache = readCache(cfg)
+		self.stats = {}
+		stale = []
+		for path in self.paths:
+			try:
+				st = os.stat(os.path.join(cfg.imageFolder, path))
+			except OSError:
+				continue
+			self.stats[path] = (st.st_size, st.st_mtime_ns)
+			cached = self.cache.get(path)
+			if cached is None or tuple(cached[:2]) != self.stats[path]:
+				stale.append(path)
+		self.pool = None
+		self.pending = []
+		if len(stale) > 0:
+			jobs = jobs or max(1, min(4, (os.cpu_count() or 2) - 1))
+			# spawned rather than forked, since forking a process running Qt isn't safe
+			self.pool = ProcessPoolExecutor(jobs, mp_context=multiprocessing.get_context('spawn'))
+			chunks = [stale[i:i+chunkSize] for i in range(0, len(stale), chunkSize)]
+			self.pending = [(chunk, self.pool.submit(_hashImages, [os.path.join(cfg.imageFolder, p) for p in chunk])) for chunk in chunks]
+		self.total = len(stale)
+
+	# number of images still being hashed
+	def remaining(self):
+		return sum(len(chunk) for chunk, future in self.pending if not future.done())
+
+	# None while images are being hashed, then (hashes, valid) in the order of paths. raises whatever a worker raised
+	def poll(self):
+		if any(not future.done() for _, future in self.pending):
+			return None
+		if len(self.pending) > 0:
+			for chunk, future in self.pending:
+				for path, h in zip(chunk, future.result()):
+					self.cache[path] = self.stats[path] + ('' if h is None else '%016x'%h,)
+			self.pending = []
+			self.pool.shutdown(wait=False)
+			self.pool = None
+			writeCache(self.cfg, self.cache)
+		hashes = np.zeros(len(self.paths), dtype=np.uint64)
+		valid = np.zeros(len(self.paths), dtype=bool)
+		for i, path in enumerate(self.paths):
+			cached = self.cache.get(path)
+			if cached is not None and isinstance(cached[2], str) and len(cached[2]) > 0 and path in self.stats:
+				hashes[i] = np.uint64(int(cached[2], 16))
+				valid[i] = True
+		return hashes, valid
+
+	def stop(self):
+		for _, future in self.pending:
+			future.cancel()
+		self.pending = []
+		if self.pool is not None:
+			self.pool.shutdown(wait=False)
+			self.pool = None
@@ -0,0 +1,56 @@
+import numpy as np
+
+# F[t, s] maps a point in view s to its epipolar line in view t (both in normalized (u,v) coordinates).
+# these only depend on the projection matrices, so they are computed once per project.
+def fundamentalMatrices(mats):
+	mats = np.asarray(mats, dtype=np.float64)
+	numViews = len(mats)
+	# camera centers are the null spaces of the projection matrices
+	_, _, vh = np.linalg.svd(mats)
+	centers = vh[:, -1] # views x 4
+	pinvs = np.linalg.pinv(mats) # views x 4 x 3
+	epipoles = np.einsum('tij,sj->tsi', mats, centers) # epipole of camera s in view t
+	cross = np.zeros([numViews, numViews, 3, 3])
+	cross[:, :, 0, 1] = -epipoles[:, :, 2]
+	cross[:, :, 0, 2] = epipoles[:, :, 1]
+	cross[:, :, 1, 0] = epipoles[:, :, 2]
+	cross[:, :, 1, 2] = -epipoles[:, :, 0]
+	cross[:, :, 2, 0] = -epipoles[:, :, 1]
+	cross[:, :, 2, 1] = epipoles[:, :, 0]
+	F = np.einsum('tsij,tjk,skl->tsil', cross, mats, pinvs)
+	F[np.arange(numViews), np.arange(numViews)] = 0
+	# scale doesn't matter, but keeping it bounded avoids trouble with badly scaled matrices
+	norms = np.linalg.norm(F.reshape([numViews, numViews, -1]), axis=2)
+	norms[norms == 0] = 1
+	return F / norms[:, :, None, None]
+
+# epipolar lines (a, b, c), with a*u + b*v + c = 0, in every view for points given in every view.
+# points is ... x views x 2 with nans for views without a point; returns ... x views(target) x views(source) x 3
+def lines(F, points):
+	ph = np.concatenate([points, np.ones(points.shape[:-1] + (1,))], axis=-1)
+	return np.einsum('tsij,...sj->...tsi', F, ph)
+
+# clip lines to the unit square (the image), giving segments (u0, v0, u1, v1); nan where a line misses the image
+def clipToImage(l):
+	a, b, c = l[..., 0, None], l[..., 1, None], l[..., 2, None]
+	edge = np.array([0.0, 1.0])
+	with np.errstate(divide='ignore', invalid='ignore'):
+		# intersections with the vertical edges u=0,1 and the horizontal edges v=0,1
+		us = np.concatenate([np.broadcast_to(edge, a.shape[:-1] + (2,)), -(b*edge + c) / a], axis=-1)
+		vs = np.concatenate([-(a*edge + c) / b, np.broadcast_to(edge, a.shape[:-1] + (2,))], axis=-1)
+	eps = 1e-9
+	inside = (us >= -eps) & (us <= 1+eps) & (vs >= -eps) & (vs <= 1+eps)
+	# the two intersections farthest apart along the line are its endpoints within the image
+	t = np.where(inside, us*b[..., 0, None] - vs*a[..., 0, None], np.nan)
+	valid = inside.sum(axis=-1) >= 2
+	t = np.where(valid[..., None], t, 0)
+	i0 = np.nanargmin(t, axis=-1)
+	i1 = np.nanargmax(t, axis=-1)
+	seg = np.stack([
+		np.take_along_axis(us, i0[..., None], -1)[..., 0],
+		np.take_along_axis(vs, i0[..., None], -1)[..., 0],
+		np.take_along_axis(us, i1[..., None], -1)[..., 0],
+		np.take_along_axis(vs, i1[..., None], -1)[..., 0]
+	], axis=-1)
+	seg[~valid] = np.nan
+	return seg
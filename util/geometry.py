@@ -0,0 +1,90 @@
+import numpy as np
+
+# multiview geometry on plain numpy arrays, with no dependence on Qt or on the project's dataframes.
+# every function is batched: points are ... x views x 2 in normalized (u,v) coordinates, where the top-left
+# corner of an image is (0,0) and the bottom-right is (1,1), with nans for views where a point is missing.
+# mats are the views x 3 x 4 projection matrices, which map 3D points into those same coordinates.
+
+# pixel coordinates (... x 2) to normalized coordinates, and back
+def normalize(xy, width, height):
+	return np.asarray(xy, dtype=np.float64) / [width, height]
+
+def denormalize(uv, width, height):
+	return np.asarray(uv, dtype=np.float64) * [width, height]
+
+def _check(mats, points):
+	mats = np.asarray(mats, dtype=np.float64)
+	points = np.asarray(points, dtype=np.float64)
+	if mats.ndim != 3 or mats.shape[1:] != (3, 4):
+		raise ValueError('Projection matrices must be views x 3 x 4, but were %s'%str(mats.shape))
+	if points.shape[-2:] != (len(mats), 2):
+		raise ValueError('Points must be ... x %d x 2, but were %s'%(len(mats), str(points.shape)))
+	return mats, points
+
+# project ... x 3 points into every view, giving ... x views x 2 (nan for points at infinity in a view)
+def project(mats, X):
+	mats = np.asarray(mats, dtype=np.float64)
+	X = np.asarray(X, dtype=np.float64)
+	Xh = np.concatenate([X, np.ones(X.shape[:-1] + (1,))], axis=-1)
+	p = np.einsum('vij,...j->...vi', mats, Xh)
+	with np.errstate(divide='ignore', invalid='ignore'):
+		uv = p[..., :2] / p[..., 2, None]
+	uv[~np.isfinite(uv)] = np.nan
+	return uv
+
+# euclidean reprojection error of every observation (... x views, nan where there is no observation)
+def reprojectionErrors(mats, X, points):
+	return np.linalg.norm(project(mats, X) - points, axis=-1)
+
+# linear (DLT) triangulation of every point at once. points seen in fewer than 2 views come back as nan
+def triangulate(mats, points):
+	mats, points = _check(mats, points)
+	mask = ~np.isnan(points).any(axis=-1)
+	u = np.nan_to_num(points[..., 0])[..., None]
+	v = np.nan_to_num(points[..., 1])[..., None]
+	# each view contributes u*p3 - p1 and v*p3 - p2, and missing views contribute zero rows
+	rows = np.concatenate([
+		u*mats[:, 2] - mats[:, 0],
+		v*mats[:, 2] - mats[:, 1]
+	], axis=-2) * np.concatenate([mask, mask], axis=-1)[..., None]
+	# the null vector of rows is the eigenvector of rows^T rows with the smallest eigenvalue, and a batch of
+	# 4x4 symmetric eigenproblems is much cheaper than a batch of SVDs
+	_, vecs = np.linalg.eigh(np.matmul(np.swapaxes(rows, -1, -2), rows))
+	X = vecs[..., :, 0]
+	with np.errstate(divide='ignore', invalid='ignore'):
+		X = X[..., :3] / X[..., 3, None]
+	X[mask.sum(axis=-1) < 2] = np.nan
+	return X
+
+# least squares triangulation that is then corrected to agree exactly with one view (the view being labeled),
+# possibly at the expense of the others. solves P_i X = s_i x_i for X and the depths s_i
+# (see pg 5 of https://hal.inria.fr/inria-00524401/PDF/Sturm-cvpr05.pdf)
+def triangulateConsistent(mats, points, viewIdx):
+	mats, points = _check(mats, points)
+	numViews = len(mats)
+	batch = points.shape[:-2]
+	points = points.reshape((-1, numViews, 2))
+	n = len(points)
+	mask = ~np.isnan(points).any(axis=-1)
+
+	xh = np.concatenate([np.nan_to_num(points), np.ones([n, numViews, 1])], axis=-1)
+	A = np.zeros([n, numViews, 3, 4 + numViews])
+	A[:, :, :, :4] = mats * mask[:, :, None, None]
+	A[:, np.arange(numViews), :, 4 + np.arange(numViews)] = -xh.transpose([1, 0, 2]) * mask.T[:, :, None]
+	# the depth of a missing view is pinned to 0, instead of being left free
+	A[:, np.arange(numViews), 0, 4 + np.arange(numViews)] += ~mask
+	A = A.reshape([n, 3*numViews, 4 + numViews])
+
+	_, vecs = np.linalg.eigh(np.matmul(A.transpose([0, 2, 1]), A))
+	x = vecs[:, :, 0] # eigenvector of the smallest eigenvalue
+
+	# remove the component of the solution in the row space of the chosen view's equations
+	B = A[:, 3*viewIdx:3*(viewIdx+1)]
+	BBt = np.matmul(B, B.transpose([0, 2, 1]))
+	coef = np.linalg.solve(BBt, np.matmul(B, x[:, :, None]))
+	x = x - np.matmul(B.transpose([0, 2, 1]), coef)[:, :, 0]
+
+	with np.errstate(divide='ignore', invalid='ignore'):
+		X = x[:, :3] / x[:, 3, None]
+	X[(mask.sum(axis=1) < 2) | ~mask[:, viewIdx]] = np.nan
+	return X.reshape(batch + (3,))
@@ -0,0 +1,38 @@
+import numpy as np
+from PySide2.QtGui import QImage, QPixmap
+from PySide2.QtCore import Qt
+
+# conversions between Qt images and height x width x 4 (BGRA) uint8 arrays.
+# QImages can be made and converted off the main thread, but QPixmaps can't
+
+def imageToArray(img):
+	img = img.convertToFormat(QImage.Format_RGB32)
+	w, h = img.width(), img.height()
+	arr = np.frombuffer(img.constBits(), np.uint8, count=img.byteCount()).reshape([h, img.bytesPerLine() // 4, 4])
+	return arr[:, :w].copy()
+
+def arrayToImage(arr):
+	arr = np.ascontiguousarray(arr)
+	h, w = arr.shape[:2]
+	img = QImage(arr.data, w, h, 4*w, QImage.Format_RGB32)
+	# QImage doesn't own the buffer, so copy before the array goes away
+	return img.copy()
+
+def pixmapToArray(pixmap):
+	return imageToArray(pixmap.toImage())
+
+def arrayToPixmap(arr):
+	return QPixmap.fromImage(arrayToImage(arr))
+
+# the image at path as a height x width float32 array of gray levels in [0, 1], downscaled so its longer side is
+# at most maxSide, or None if it can't be read
+def grayscale(path, maxSide=None):
+	img = QImage(path)
+	if img.isNull():
+		return None
+	if maxSide is not None and max(img.width(), img.height()) > maxSide:
+		img = img.scaled(maxSide, maxSide, Qt.KeepAspectRatio, Qt.SmoothTransformation)
+	img = img.convertToFormat(QImage.Format_Grayscale8)
+	w, h = img.width(), img.height()
+	arr = np.frombuffer(img.constBits(), np.uint8, count=img.byteCount()).reshape([h, img.bytesPerLine()])
+	return arr[:, :w].astype(np.float32) / 255
@@ -0,0 +1,121 @@
+import os
+import json
+import time
+import bisect
+import threading
+import functools
+import collections
+
+# latency histograms and a trace of the hot paths (decoding, annotation updates, triangulation, ...).
+# functions are wrapped with @timed, which costs a single flag check per call while recording is off.
+# recording starts off unless POSE_ANNOTATION_PROFILE is set, and can be toggled from Tools > Performance.
+# the trace is written in the Chrome trace event format, which chrome://tracing and Perfetto can open.
+
+enabled = bool(os.environ.get('POSE_ANNOTATION_PROFILE'))
+
+# bucket upper edges in seconds, 4 per decade from 1us to 100s
+edges = [10**(k/4) * 1e-6 for k in range(33)]
+
+traceLength = 200000
+
+_lock = threading.Lock()
+_histograms = {}
+_trace = collections.deque(maxlen=traceLength)
+_origin = time.perf_counter()
+
+def setEnabled(on):
+	global enabled
+	enabled = on
+
+def reset():
+	with _lock:
+		_histograms.clear()
+		_trace.clear()
+
+def record(name, start, duration):
+	with _lock:
+		h = _histograms.get(name)
+		if h is None:
+			h = _histograms[name] = {'counts': [0]*(len(edges)+1), 'count': 0, 'total': 0.0, 'max': 0.0}
+		h['counts'][bisect.bisect_left(edges, duration)] += 1
+		h['count'] += 1
+		h['total'] += duration
+		h['max'] = max(h['max'], duration)
+		_trace.append((name, start, duration, threading.get_ident()))
+
+# decorator recording every call of fn under name (its qualified name by default)
+def timed(fn=None, name=None):
+	if fn is None:
+		return lambda f: timed(f, name)
+	name = name or fn.__qualname__
+	@functools.wraps(fn)
+	def wrapper(*args, **kwargs):
+		if not enabled:
+			return fn(*args, **kwargs)
+		start = time.perf_counter()
+		try:
+			return fn(*args, **kwargs)
+		finally:
+			record(name, start, time.perf_counter() - start)
+	return wrapper
+
+# for timing part of a function:
+#   with instrument.span('decode'):
+#       ...
+class span:
+	def __init__(self, name):
+		self.name = name
+
+	def __enter__(self):
+		self.start = time.perf_counter() if enabled else None
+		return self
+
+	def __exit__(self, *exc):
+		if self.start is not None:
+			record(self.name, self.start, time.perf_counter() - self.start)
+
+# the upper edge of the bucket holding quantile q (so at most 78% over)
+def _quantile(counts, total, q):
+	target = q * total
+	seen = 0
+	for i, c in enumerate(counts):
+		seen += c
+		if seen >= target and c > 0:
+			return edges[i] if i < len(edges) else float('inf')
+	return 0.0
+
+# count, mean, p50, p90, p99 and max (in seconds) of every operation, slowest total first
+def summary():
+	with _lock:
+		items = [(name, dict(h, counts=list(h['counts']))) for name, h in _histograms.items()]
+	out = []
+	for name, h in sorted(items, key=lambda item: -item[1]['total']):
+		out.append({
+			'name': name,
+			'count': h['count'],
+			'total': h['total'],
+			'mean': h['total'] / h['count'],
+			'p50': min(_quantile(h['counts'], h['count'], 0.5), h['max']),
+			'p90': min(_quantile(h['counts'], h['count'], 0.9), h['max']),
+			'p99': min(_quantile(h['counts'], h['count'], 0.99), h['max']),
+			'max': h['max'],
+			'counts': h['counts']
+		})
+	return out
+
+def writeTrace(path):
+	with _lock:
+		events = list(_trace)
+	with open(path, 'w') as f:
+		json.dump({
+			'traceEvents': [{
+				'name': name,
+				'ph': 'X',
+				'ts': 1e6*(start - _origin),
+				'dur': 1e6*duration,
+				'pid': os.getpid(),
+				'tid': tid
+			} for name, start, duration, tid in events],
+			'displayTimeUnit': 'ms'
+		}, f)
+	return len(events)
@@ -0,0 +1,68 @@
+import numpy as np
+
+# keyframe interpolation of annotations. frames are integers, values are frames x dims arrays.
+# 'spline' is a Catmull-Rom spline, which only depends on the two keyframes on either side of a segment,
+# so changing one keyframe only changes the frames up to two keyframes away.
+
+methods = ['linear', 'spline']
+
+def interpolate(keyFrames, keyValues, frames, method='linear'):
+	keyFrames = np.asarray(keyFrames)
+	keyValues = np.asarray(keyValues, dtype=np.float64)
+	frames = np.asarray(frames)
+	out = np.full([len(frames), keyValues.shape[1]], np.nan)
+	if len(keyFrames) < 2 or len(frames) == 0:
+		return out
+	# only interpolate, never extrapolate past the first/last keyframe
+	inside = (frames >= keyFrames[0]) & (frames <= keyFrames[-1])
+	f = frames[inside]
+	seg = np.clip(np.searchsorted(keyFrames, f, side='right') - 1, 0, len(keyFrames) - 2)
+	t0 = keyFrames[seg]
+	t1 = keyFrames[seg+1]
+	p0 = keyValues[seg]
+	p1 = keyValues[seg+1]
+	s = ((f - t0) / (t1 - t0))[:, None]
+	if method == 'linear':
+		out[inside] = p0 + s * (p1 - p0)
+		return out
+	if method != 'spline':
+		raise ValueError('Interpolation method must be one of %s, but was %s'%(str(methods), str(method)))
+	# tangents at every keyframe (one-sided at the ends), scaled to each segment's length
+	tangents = np.empty_like(keyValues)
+	tangents[1:-1] = (keyValues[2:] - keyValues[:-2]) / (keyFrames[2:] - keyFrames[:-2])[:, None]
+	tangents[0] = (keyValues[1] - keyValues[0]) / (keyFrames[1] - keyFrames[0])
+	tangents[-1] = (keyValues[-1] - keyValues[-2]) / (keyFrames[-1] - keyFrames[-2])
+	dt = (t1 - t0)[:, None]
+	m0 = tangents[seg] * dt
+	m1 = tangents[seg+1] * dt
+	# cubic hermite basis
+	s2 = s*s
+	s3 = s2*s
+	out[inside] = (2*s3 - 3*s2 + 1)*p0 + (s3 - 2*s2 + s)*m0 + (-2*s3 + 3*s2)*p1 + (s3 - s2)*m1
+	return out
+
+# the inclusive range of frames whose interpolated values can change when the keyframe at `frame` is
+# added, moved, or removed
+def affectedRange(keyFrames, frame, numFrames, method='linear'):
+	keyFrames = np.asarray(keyFrames)
+	keyFrames = keyFrames[keyFrames != frame]
+	reach = 1 if method == 'linear' else 2
+	before = keyFrames[keyFrames < frame]
+	after = keyFrames[keyFrames > frame]
+	lo = before[-reach] if len(before) >= reach else 0
+	hi = after[reach-1] if len(after) >= reach else numFrames - 1
+	return int(lo), int(hi)
+
+# fill the frames in [lo, hi] from the keyframes of a single joint.
+# values is frames x dims (nan where unlabeled) and isKey marks the frames that were labeled by hand.
+# fillable marks the frames that may be overwritten (by default, every frame that is not a keyframe).
+# returns the frames that were recomputed and their new values (nan where they fall outside the keyframes)
+def fillRange(values, isKey, method='linear', lo=0, hi=None, fillable=None):
+	if hi is None:
+		hi = len(values) - 1
+	if fillable is None:
+		fillable = ~isKey
+	keyFrames = np.flatnonzero(isKey)
+	frames = np.arange(lo, hi+1)
+	frames = frames[fillable[frames]]
+	return frames, interpolate(keyFrames, values[keyFrames], frames, method)
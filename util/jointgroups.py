@@ -0,0 +1,15 @@
+# cfg.yaml can have an optional 'jointGroups' entry mapping group names to lists of joints, e.g.
+#   jointGroups:
+#     left hand: [l_thumb, l_index]
+# the joint lists can then be filtered by group. returns the set of groups of every joint
+def groups(cfg):
+	jointGroups = getattr(cfg, 'jointGroups', None)
+	out = [set() for _ in cfg.joints]
+	if jointGroups is None:
+		return out
+	for name, joints in jointGroups.items():
+		for joint in joints:
+			if joint not in cfg.joints:
+				raise ValueError('Joint group %s refers to joint %s, which is not one of the project\'s joints'%(str(name), str(joint)))
+			out[cfg.joints.index(joint)].add(str(name))
+	return out
@@ -0,0 +1,91 @@
+import os
+import time
+import collections
+from concurrent.futures import ThreadPoolExecutor
+
+# plays frames back at a target rate. frames are decoded ahead of time on worker threads by load(frame), and when
+# decoding can't keep up the frames that are already late are dropped, so playback keeps up with the clock instead
+# of slowing down. there's nothing Qt specific in here; the window calls tick() from a timer and shows what it returns.
+class Player:
+	def __init__(self, load, numFrames, fps=30, lookahead=16, workers=None, clock=time.perf_counter):
+		self.load = load
+		self.numFrames = numFrames
+		self.fps = fps
+		self.lookahead = min(lookahead, numFrames)
+		self.clock = clock
+		self.pool = ThreadPoolExecutor(workers or min(8, os.cpu_count() or 1))
+		self.pending = collections.OrderedDict()
+		# times at which frames were shown, for measuring the achieved rate
+		self.shownTimes = collections.deque()
+		self.dropped = 0
+		self.current = 0
+		self.startFrame = 0
+		self.startTime = 0
+
+	def start(self, frame):
+		self.current = frame
+		self.startFrame = frame
+		self.startTime = self.clock()
+		self.shownTimes.clear()
+		self.dropped = 0
+		self.prefetch(frame)
+
+	def stop(self):
+		for f in self.pending.values():
+			f.cancel()
+		self.pending.clear()
+		self.pool.shutdown(wait=False)
+
+	def setFps(self, fps):
+		self.fps = fps
+		# keep playing from the frame that is showing, at the new rate
+		self.startFrame = self.current
+		self.startTime = self.clock()
+
+	# the frame that should be showing right now
+	def due(self):
+		return (self.startFrame + int((self.clock() - self.startTime) * self.fps)) % self.numFrames
+
+	# keeps the frames from frame on being decoded, with at most lookahead decodes outstanding. everything else is
+	# cancelled, including the frames between the one showing and frame, which are late and would only be dropped
+	def prefetch(self, frame):
+		wanted = [(frame + i) % self.numFrames for i in range(self.lookahead)]
+		for f in list(self.pending):
+			# running decodes can't be cancelled, so they're kept (and counted) until they finish
+			if f not in wanted and (self.pending[f].cancel() or self.pending[f].done()):
+				del self.pending[f]
+		outstanding = sum(not future.done() for future in self.pending.values())
+		for f in wanted:
+			if outstanding >= self.lookahead:
+				break
+			if f not in self.pending:
+				self.pending[f] = self.pool.submit(self.load, f)
+				outstanding += 1
+
+	# returns (frame, data) when there's a new frame to show, or None to keep showing the current one.
+	# the newest decoded frame that isn't past the due frame is shown, and everything before it is dropped
+	def tick(self):
+		target = self.due()
+		shown = None
+		steps = (target - self.current) % self.numFrames
+		for i in range(steps, 0, -1):
+			f = (self.current + i) % self.numFrames
+			future = self.pending.get(f)
+			if future is not None and future.done() and not future.cancelled():
+				del self.pending[f]
+				self.dropped += i - 1
+				self.current = f
+				now = self.clock()
+				self.shownTimes.append(now)
+				while now - self.shownTimes[0] > 1:
+					self.shownTimes.popleft()
+				shown = f, future.result()
+				break
+		self.prefetch(target)
+		return shown
+
+	# frames actually shown per second, over the last second
+	def achievedFps(self):
+		if len(self.shownTimes) < 2:
+			return 0.0
+		return (len(self.shownTimes) - 1) / max(self.shownTimes[-1] - self.shownTimes[0], 1e-9)
@@ -0,0 +1,163 @@
+import os
+import importlib
+import collections
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+
+# suggested annotations from a keypoint predictor, computed on worker processes so the window never waits on them.
+# a predictor is a class constructed once per worker as Predictor(cfg, **args) with a method predict(path) that
+# returns a joints x 3 array of (u, v, confidence) for the image at path, in normalized coordinates, with nan for
+# joints it can't find. cfg.yaml entries (all optional):
+#   predictor: package.module:ClassName (on the python path), or the name of a built-in predictor
+#   predictorArgs: keyword arguments for the predictor
+#   predictorThreshold: suggestions less confident than this aren't shown
+#   predictorJobs: number of worker processes
+
+fileName = 'predictions.csv'
+coordinates = ['u', 'v', 'confidence']
+
+# predicts every joint at its average labeled position, with the fraction of frames where it's labeled as the
+# confidence. it doesn't look at the images, so it's only useful for trying out pre-annotation
+class MeanPose:
+	def __init__(self, cfg):
+		self.multi = cfg.mode == 'RGB Multi View'
+		self.none = np.full([len(cfg.joints), 3], np.nan)
+		self.predictions = {}
+		path = os.path.join(cfg.projectFolder, 'pixel-annotation-data.csv')
+		if not os.path.exists(path):
+			return
+		data = pd.read_csv(path, index_col=[0,1] if self.multi else 0, header=[0,1])
+		values = data.reindex(columns=pd.MultiIndex.from_product([cfg.joints, ['u', 'v']])).values.astype(np.float64)
+		values = values.reshape([len(data), -1, 2])
+		labeled = ~np.isnan(values).any(axis=2)
+		# one prediction per view, which is the name of the folder its images are in
+		views = data.index.get_level_values(0).astype(str) if self.multi else np.full(len(data), '')
+		for view in np.unique(views):
+			rows = views == view
+			prediction = self.none.copy()
+			with np.errstate(invalid='ignore'):
+				prediction[:, :2] = np.nanmean(np.where(labeled[rows, :, None], values[rows], np.nan), axis=0)
+			prediction[:, 2] = labeled[rows].mean(axis=0)
+			self.predictions[view] = prediction
+
+	def predict(self, path):
+		view = os.path.basename(os.path.dirname(path)) if self.multi else ''
+		return self.predictions.get(view, self.none).copy()
+
+builtins = {
+	'MeanPose': MeanPose
+}
+
+def predictorClass(spec):
+	if spec in builtins:
+		return builtins[spec]
+	if ':' not in spec:
+		raise ValueError('predictor must be one of %s, or package.module:ClassName, but was %s'%(', '.join(builtins), spec))
+	moduleName, className = spec.split(':', 1)
+	return getattr(importlib.import_module(moduleName), className)
+
+# each worker process builds its own predictor once
+_predictor = None
+_numJoints = 0
+
+def _initWorker(spec, cfgFields, args):
+	global _predictor, _numJoints
+	cfg = collections.namedtuple('cfg', cfgFields.keys())(*cfgFields.values())
+	_predictor = predictorClass(spec)(cfg, **args)
+	_numJoints = len(cfg.joints)
+
+def _predict(path):
+	prediction = np.asarray(_predictor.predict(path), dtype=np.float64)
+	if prediction.shape != (_numJoints, 3):
+		raise ValueError('predictions must be %d x 3 (u, v, confidence), but were %s'%(_numJoints, str(prediction.shape)))
+	return prediction
+
+# the predictions saved in a project (as read by util.projectdata), with a row for every row of the annotations
+def frame(data_predicted, index, joints):
+	columns = pd.MultiIndex.from_product([joints, coordinates], names=['joint', 'coordinate'])
+	if data_predicted is None:
+		return pd.DataFrame(np.nan, index=index, columns=columns)
+	return data_predicted.reindex(index=index, columns=columns).astype(np.float64)
+
+# normalized (u, v) of the joints (n x 3 predictions) confident enough to suggest, and nan for the others.
+# predictions without a confidence are always suggested
+def suggestions(prediction, threshold=None):
+	uv = prediction[:, :2].copy()
+	if threshold is not None:
+		uv[prediction[:, 2] < threshold] = np.nan
+	return uv
+
+# frames in the order they should be predicted: the current one and the next `ahead`, then the previous `behind`,
+# then the other frames that are missing annotations, nearest after the current frame first
+def order(current, numFrames, missing, ahead=32, behind=4):
+	near = list(range(current, min(current + ahead, numFrames))) + list(range(current - 1, max(current - behind, 0) - 1, -1))
+	rest = np.flatnonzero(missing)
+	rest = rest[np.argsort((rest - current) % numFrames, kind='stable')]
+	seen = set(near)
+	return near + [int(f) for f in rest if f not in seen]
+
+# runs a predictor over the images the window asks for, most wanted first. keys are whatever the window uses to
+# identify an image (a frame, or a (view, frame) pair), and path(key) gives its file. only a few images are
+# queued at a time, so when the wanted images change (the user moved to another frame) the queue follows quickly
+class Preannotator:
+	def __init__(self, cfg, path, done=(), jobs=None):
+		spec = getattr(cfg, 'predictor', None) or 'MeanPose'
+		args = getattr(cfg, 'predictorArgs', None) or {}
+		# fail here, rather than in every worker
+		predictorClass(spec)
+		jobs = jobs or getattr(cfg, 'predictorJobs', None) or max(1, min(4, (os.cpu_count() or 2) - 1))
+		# spawned rather than forked, since forking a process running Qt isn't safe
+		self.pool = ProcessPoolExecutor(jobs, mp_context=multiprocessing.get_context('spawn'),
+			initializer=_initWorker, initargs=(spec, cfg._asdict(), args))
+		self.path = path
+		self.queueLength = 2*jobs
+		self.done = set(done)
+		self.wanted = []
+		self.pending = {}
+		self.failure = None
+
+	def prioritize(self, keys):
+		self.wanted = [key for key in keys if key not in self.done]
+		self.pump()
+
+	def pump(self):
+		queued = set(self.wanted[:self.queueLength])
+		for key in list(self.pending):
+			if key not in queued and self.pending[key].cancel():
+				del self.pending[key]
+		for key in self.wanted:
+			if len(self.pending) >= self.queueLength:
+				break
+			if key not in self.pending and key not in self.done:
+				self.pending[key] = self.pool.submit(_predict, self.path(key))
+
+	# (key, joints x 3 prediction) for everything finished since the last call. never waits
+	def poll(self):
+		out = []
+		finished = 0
+		for key, future in list(self.pending.items()):
+			if not future.done():
+				continue
+			finished += 1
+			del self.pending[key]
+			self.done.add(key)
+			if future.exception() is None:
+				out.append((key, future.result()))
+			elif self.failure is None:
+				self.failure = future.exception()
+		if finished > 0:
+			self.wanted = [key for key in self.wanted if key not in self.done]
+			self.pump()
+		return out
+
+	# the first error a predictor raised, if any, so the window can report it
+	def error(self):
+		return self.failure
+
+	def stop(self):
+		for future in self.pending.values():
+			future.cancel()
+		self.pending.clear()
+		self.pool.shutdown(wait=False)
@@ -0,0 +1,113 @@
+import os
+import time
+import shutil
+from glob import iglob
+import pandas as pd
+
+# reading a project's image names and annotation files. there's no Qt in here, so it can run on a background
+# thread while a window is opening, or without a display at all
+
+pixelFile = 'pixel-annotation-data.csv'
+file3d = '3d-annotation-data.csv'
+sourceFile = 'annotation-source.csv'
+
+def imageNames(cfg):
+	if cfg.mode == 'RGB Multi View':
+		# we will only use images that exist for all views
+		names = [iglob(os.path.join(cfg.imageFolder, view, '*'+cfg.imageExtension)) for view in cfg.views]
+		names = [set(map(lambda s: os.path.basename(s), l)) for l in names]
+		return set.intersection(*names)
+	names = iglob(os.path.join(cfg.imageFolder, '*'+cfg.imageExtension))
+	return set(map(lambda s: os.path.basename(s), names))
+
+# suggestions saved by pre-annotation (see util/preannotate.py), or None if there are none
+def readPredictions(cfg):
+	try:
+		return pd.read_csv(os.path.join(cfg.projectFolder, 'predictions.csv'), index_col=[0,1] if cfg.mode == 'RGB Multi View' else 0, header=[0,1])
+	except FileNotFoundError:
+		return None
+
+# read the data; if there is none, then create new frames for it
+def readSingleview(cfg):
+	try:
+		data_pixel = pd.read_csv(os.path.join(cfg.projectFolder, 'pixel-annotation-data.csv'), index_col=0, header=[0,1])
+	except FileNotFoundError:
+		data_pixel = pd.DataFrame(
+			columns=pd.MultiIndex.from_product([cfg.joints, ['u', 'v']], names=['joint', 'coordinate']),
+			index=pd.Index([], name='image')
+		)
+	try:
+		data_source = pd.read_csv(os.path.join(cfg.projectFolder, 'annotation-source.csv'), index_col=0, header=0)
+	except FileNotFoundError:
+		data_source = pd.DataFrame(columns=cfg.joints, index=pd.Index([], name='image'))
+	return {
+		'imageNames': imageNames(cfg),
+		'data_pixel': data_pixel,
+		'data_source': data_source,
+		'data_predicted': readPredictions(cfg)
+	}
+
+def readMultiview(cfg):
+	try:
+		data_pixel = pd.read_csv(os.path.join(cfg.projectFolder, 'pixel-annotation-data.csv'), index_col=[0,1], header=[0,1])
+		data_3d = pd.read_csv(os.path.join(cfg.projectFolder, '3d-annotation-data.csv'), index_col=0, header=[0,1])
+	except FileNotFoundError:
+		data_pixel = pd.DataFrame(
+			columns=pd.MultiIndex.from_product([cfg.joints, ['u', 'v']], names=['joint', 'coordinate']),
+			index=pd.MultiIndex(levels=[[],[]], codes=[[],[]], names=['view', 'image'])
+		)
+		data_3d = pd.DataFrame(
+			columns=pd.MultiIndex.from_product([cfg.joints, ['x','y','z']], names=['joint', 'coordinate']),
+			index=pd.Index([], name='image')
+		)
+	try:
+		data_source = pd.read_csv(os.path.join(cfg.projectFolder, 'annotation-source.csv'), index_col=[0,1], header=0)
+	except FileNotFoundError:
+		data_source = pd.DataFrame(columns=cfg.joints, index=pd.MultiIndex(levels=[[],[]], codes=[[],[]], names=['view', 'image']))
+	return {
+		'imageNames': imageNames(cfg),
+		'data_pixel': data_pixel,
+		'data_3d': data_3d,
+		'data_source': data_source,
+		'data_predicted': readPredictions(cfg)
+	}
+
+# a single view project, plus the 3d points back-projected from the depth maps
+def readDepth(cfg):
+	data = readSingleview(cfg)
+	try:
+		data['data_3d'] = pd.read_csv(os.path.join(cfg.projectFolder, file3d), index_col=0, header=[0,1])
+	except FileNotFoundError:
+		data['data_3d'] = pd.DataFrame(
+			columns=pd.MultiIndex.from_product([cfg.joints, ['x','y','z']], names=['joint', 'coordinate']),
+			index=pd.Index([], name='image')
+		)
+	return data
+
+def read(cfg):
+	if cfg.mode == 'RGB Multi View':
+		return readMultiview(cfg)
+	elif cfg.mode == 'RGB Depth':
+		return readDepth(cfg)
+	return readSingleview(cfg)
+
+# the pixel annotations chunkSize rows at a time, so long projects can be processed without reading the whole file
+def iterPixels(cfg, chunkSize=100000):
+	path = os.path.join(cfg.projectFolder, pixelFile)
+	if not os.path.exists(path):
+		return
+	indexCol = [0,1] if cfg.mode == 'RGB Multi View' else 0
+	for chunk in pd.read_csv(path, index_col=indexCol, header=[0,1], chunksize=chunkSize):
+		yield chunk
+
+# write some of the project's files (file name -> dataframe), keeping a timestamped copy of every file replaced
+def writeFrames(cfg, frames):
+	stamp = time.strftime('%Y%m%d-%H%M%S')
+	backups = []
+	for name, df in frames.items():
+		path = os.path.join(cfg.projectFolder, name)
+		if os.path.exists(path):
+			backups.append('%s.%s.bak'%(path, stamp))
+			shutil.copy2(path, backups[-1])
+		df.to_csv(path)
+	return backups
@@ -0,0 +1,169 @@
+import re
+import operator
+import numpy as np
+
+# a small query language for picking frames by their annotations, e.g.
+#   joint nose missing in view cam1
+#   error > 0.01 and not joint "left hand" labeled
+#   (interpolated or tracked) and view 2 annotated
+# a condition is one of missing, annotated, an annotation source (labeled, projected, interpolated, predicted,
+# tracked), or error followed by a comparison and a number (the reprojection error of multi view annotations, in
+# normalized image coordinates). it can be narrowed to one joint with `joint NAME` and to one view with
+# `[in] view NAME`, before or after it, where names with spaces are quoted. a frame matches a condition when any
+# of the annotations it covers does, and conditions are combined with and, or, not and parentheses.
+# queries are evaluated on whole arrays at once: sources are frames x views x joints, pixels frames x views x joints
+# x 2, and errors (only needed when the query uses error) frames x views x joints.
+
+sourceNames = ['labeled', 'projected', 'interpolated', 'predicted', 'tracked']
+comparisons = {'>': operator.gt, '>=': operator.ge, '<': operator.lt, '<=': operator.le, '=': operator.eq, '!=': operator.ne}
+
+_token = re.compile(r'\s*(?:"([^"]*)"|\'([^\']*)\'|(>=|<=|!=|[()<>=])|([^\s()<>=!"\']+))')
+
+def tokenize(text):
+	tokens = []
+	pos = 0
+	text = text.rstrip()
+	while pos < len(text):
+		m = _token.match(text, pos)
+		if m is None:
+			raise ValueError('Could not read the query at "%s"'%text[pos:])
+		quoted = m.group(1) if m.group(1) is not None else m.group(2)
+		# quoted names are kept apart from keywords
+		tokens.append(('name', quoted) if quoted is not None else ('op', m.group(3)) if m.group(3) is not None else ('word', m.group(4)))
+		pos = m.end()
+	return tokens
+
+class Query:
+	def __init__(self, text, joints, views=None):
+		self.text = text
+		self.joints = [str(j) for j in joints]
+		self.views = None if views is None else [str(v) for v in views]
+		self.tokens = tokenize(text)
+		self.pos = 0
+		self.usesErrors = False
+		if len(self.tokens) == 0:
+			raise ValueError('The query is empty')
+		self.tree = self.parseOr()
+		if self.pos < len(self.tokens):
+			raise ValueError('Unexpected "%s" in the query'%self.tokens[self.pos][1])
+		# which frames match, once evaluated
+		self.matches = None
+
+	def peek(self):
+		if self.pos >= len(self.tokens):
+			return None, None
+		kind, value = self.tokens[self.pos]
+		return kind, value.lower() if kind == 'word' else value
+
+	def take(self):
+		if self.pos >= len(self.tokens):
+			raise ValueError('The query ends too early')
+		self.pos += 1
+		return self.tokens[self.pos-1][1]
+
+	def parseOr(self):
+		node = self.parseAnd()
+		while self.peek() == ('word', 'or'):
+			self.pos += 1
+			node = ('or', node, self.parseAnd())
+		return node
+
+	def parseAnd(self):
+		node = self.parseNot()
+		while self.peek() == ('word', 'and'):
+			self.pos += 1
+			node = ('and', node, self.parseNot())
+		return node
+
+	def parseNot(self):
+		if self.peek() == ('word', 'not'):
+			self.pos += 1
+			return ('not', self.parseNot())
+		if self.peek() == ('op', '('):
+			self.pos += 1
+			node = self.parseOr()
+			if self.peek() != ('op', ')'):
+				raise ValueError('A parenthesis in the query is never closed')
+			self.pos += 1
+			return node
+		return self.parseCondition()
+
+	def parseCondition(self):
+		condition, joint, view = None, None, None
+		while True:
+			kind, word = self.peek()
+			if kind != 'word':
+				break
+			if word == 'joint' and joint is None:
+				self.pos += 1
+				name = self.take()
+				if name not in self.joints:
+					raise ValueError('There is no joint %s'%name)
+				joint = self.joints.index(name)
+			elif word in ['in', 'view'] and view is None:
+				self.pos += 1
+				if word == 'in' and self.take().lower() != 'view':
+					raise ValueError('"in" must be followed by "view NAME"')
+				name = self.take()
+				if self.views is None:
+					raise ValueError('Only multi view projects have views')
+				if name not in self.views:
+					raise ValueError('There is no view %s'%name)
+				view = self.views.index(name)
+			elif word in ['missing', 'annotated'] + sourceNames and condition is None:
+				self.pos += 1
+				condition = (word,)
+			elif word == 'error' and condition is None:
+				self.pos += 1
+				kind, op = self.peek()
+				if kind != 'op' or op not in comparisons:
+					raise ValueError('"error" must be followed by a comparison, like error > 0.01')
+				self.pos += 1
+				try:
+					value = float(self.take())
+				except ValueError:
+					raise ValueError('"error %s" must be followed by a number'%op)
+				if self.views is None:
+					raise ValueError('Reprojection errors are only known in multi view projects')
+				self.usesErrors = True
+				condition = ('error', op, value)
+			else:
+				break
+		if condition is None:
+			kind, word = self.peek()
+			raise ValueError('Expected a condition (missing, annotated, %s or error) %s'%(', '.join(sourceNames),
+				'but the query ends' if word is None else 'at "%s"'%word))
+		return ('condition', condition, joint, view)
+
+	# which of the given frames match, as a boolean array
+	def evaluate(self, pixels, sources, errors=None):
+		return self._evaluate(self.tree, pixels, sources, errors)
+
+	def _evaluate(self, node, pixels, sources, errors):
+		if node[0] == 'and':
+			return self._evaluate(node[1], pixels, sources, errors) & self._evaluate(node[2], pixels, sources, errors)
+		if node[0] == 'or':
+			return self._evaluate(node[1], pixels, sources, errors) | self._evaluate(node[2], pixels, sources, errors)
+		if node[0] == 'not':
+			return ~self._evaluate(node[1], pixels, sources, errors)
+		_, condition, joint, view = node
+		views = slice(None) if view is None else [view]
+		joints = slice(None) if joint is None else [joint]
+		if condition[0] == 'missing':
+			cells = np.isnan(pixels[:, views, joints]).any(axis=-1)
+		elif condition[0] == 'annotated':
+			cells = ~np.isnan(pixels[:, views, joints]).any(axis=-1)
+		elif condition[0] == 'error':
+			with np.errstate(invalid='ignore'):
+				cells = comparisons[condition[1]](errors[:, views, joints], condition[2])
+		else:
+			cells = sources[:, views, joints] == condition[0]
+		return cells.reshape([len(cells), -1]).any(axis=1)
+
+	# evaluate the query on every frame (when frames is None) or re-evaluate it on some of them, after their
+	# annotations changed. the arrays only hold the frames being evaluated
+	def update(self, frames, pixels, sources, errors=None):
+		if frames is None:
+			self.matches = self.evaluate(pixels, sources, errors)
+		else:
+			self.matches[frames] = self.evaluate(pixels, sources, errors)
@@ -0,0 +1,14 @@
+# cfg.yaml can have an optional 'skeleton' entry: a list of [joint, joint] pairs that are drawn as bones
+def bones(cfg):
+	skeleton = getattr(cfg, 'skeleton', None)
+	if skeleton is None:
+		return []
+	out = []
+	for bone in skeleton:
+		if len(bone) != 2:
+			raise ValueError('Every bone in the skeleton must be a pair of joints, but got %s'%str(bone))
+		for joint in bone:
+			if joint not in cfg.joints:
+				raise ValueError('Skeleton refers to joint %s, which is not one of the project\'s joints'%str(joint))
+		out.append((bone[0], bone[1]))
+	return out
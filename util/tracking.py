@@ -0,0 +1,145 @@
+import os
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+
+# tracking of annotations from a frame into the frames after it with pyramidal Lucas-Kanade optical flow, on
+# grayscale frames downscaled so their longer side is at most maxSide. coordinates are the usual normalized (u, v),
+# and inside this module pixel coordinates put pixel centers at i + 0.5, so halving a coordinate maps it onto the
+# next level of the pyramid. a joint is lost (and not tracked any further) when tracking it back from where it
+# landed doesn't return to where it started, when its window has too little texture, or when it leaves the image.
+
+maxSide = 480
+levels = 3
+radius = 7 # the window is (2*radius+1) x (2*radius+1) pixels
+iterations = 10
+maxError = 0.75 # forward-backward error in (downscaled) pixels
+minEigenvalue = 1e-4 # of the window's gradient matrix, per pixel, for intensities in [0, 1]
+
+_dy, _dx = np.mgrid[-radius:radius+1, -radius:radius+1]
+_offsets = np.stack([_dx.ravel(), _dy.ravel()], axis=1).astype(np.float64)
+
+# halves the image (by averaging 2 x 2 blocks) until there are `levels` of them or it gets too small for the window
+def pyramid(gray):
+	out = [gray]
+	while len(out) < levels and min(out[-1].shape) >= 4*(2*radius+1):
+		g = out[-1]
+		h, w = g.shape[0] // 2 * 2, g.shape[1] // 2 * 2
+		out.append(0.25 * (g[0:h:2, 0:w:2] + g[1:h:2, 0:w:2] + g[0:h:2, 1:w:2] + g[1:h:2, 1:w:2]))
+	return [(g, *np.gradient(g)[::-1]) for g in out]
+
+# image values at pixel coordinates x, y (any matching shapes), clamped at the borders. nan coordinates (of points
+# that were already lost) read a corner, and their results are thrown away anyway
+def bilinear(img, x, y):
+	h, w = img.shape
+	x = np.clip(np.nan_to_num(x - 0.5), 0, w - 1)
+	y = np.clip(np.nan_to_num(y - 0.5), 0, h - 1)
+	x0 = np.minimum(x.astype(np.int64), w - 2) if w > 1 else np.zeros(x.shape, dtype=np.int64)
+	y0 = np.minimum(y.astype(np.int64), h - 2) if h > 1 else np.zeros(y.shape, dtype=np.int64)
+	fx, fy = x - x0, y - y0
+	x1, y1 = np.minimum(x0 + 1, w - 1), np.minimum(y0 + 1, h - 1)
+	top = img[y0, x0] * (1 - fx) + img[y0, x1] * fx
+	bottom = img[y1, x0] * (1 - fx) + img[y1, x1] * fx
+	return top * (1 - fy) + bottom * fy
+
+# displacement (n x 2) of the windows around points (n x 2) from one level to the other, refined from an initial
+# guess, and the smallest eigenvalue of each window's gradient matrix
+def flow(prev, cur, points, guess):
+	I, Ix, Iy = prev
+	J = cur[0]
+	x = points[:, 0, None] + _offsets[None, :, 0]
+	y = points[:, 1, None] + _offsets[None, :, 1]
+	T, gx, gy = bilinear(I, x, y), bilinear(Ix, x, y), bilinear(Iy, x, y)
+	a, b, c = (gx*gx).sum(axis=1), (gx*gy).sum(axis=1), (gy*gy).sum(axis=1)
+	det = a*c - b*b
+	minEig = ((a + c) - np.sqrt((a - c)**2 + 4*b*b)) / 2 / len(_offsets)
+	d = guess.copy()
+	active = det > 1e-12
+	for _ in range(iterations):
+		if not active.any():
+			break
+		e = T[active] - bilinear(J, x[active] + d[active, 0, None], y[active] + d[active, 1, None])
+		bx, by = (e*gx[active]).sum(axis=1), (e*gy[active]).sum(axis=1)
+		step = np.stack([c[active]*bx - b[active]*by, a[active]*by - b[active]*bx], axis=1) / det[active, None]
+		d[active] += step
+		# points that have stopped moving are done
+		active[np.flatnonzero(active)[np.abs(step).max(axis=1) < 0.01]] = False
+	d[~(det > 1e-12)] = np.nan
+	return d, minEig
+
+# where points (n x 2 pixel coordinates of the first level) move from one pyramid to the other, coarse to fine,
+# and the smallest eigenvalue of their windows at the finest level
+def lucasKanade(prev, cur, points):
+	numLevels = min(len(prev), len(cur))
+	d = np.zeros_like(points)
+	for level in range(numLevels - 1, -1, -1):
+		d, minEig = flow(prev[level], cur[level], points / 2**level, d)
+		if level > 0:
+			d = d * 2
+	return points + d, minEig
+
+# tracks normalized points (n x 2, nan for joints that aren't tracked) from the first of a sequence of grayscale
+# frames (height x width arrays in [0, 1]) into every frame after it. gives (len(frames) - 1) x n x 2, nan from the
+# frame where each joint was lost. frames can be any iterable, and it isn't consumed further once every joint is lost
+def track(frames, points, numFrames):
+	points = np.asarray(points, dtype=np.float64)
+	out = np.full([numFrames - 1, len(points), 2], np.nan)
+	frames = iter(frames)
+	first = next(frames)
+	h, w = first.shape
+	prev = pyramid(first)
+	xy = points * [w, h]
+	alive = ~np.isnan(xy).any(axis=1)
+	for f in range(numFrames - 1):
+		if not alive.any():
+			break
+		frame = next(frames)
+		if frame is None or frame.shape != (h, w):
+			break
+		cur = pyramid(frame)
+		moved, minEig = lucasKanade(prev, cur, xy[alive])
+		back, _ = lucasKanade(cur, prev, moved)
+		error = np.linalg.norm(back - xy[alive], axis=1)
+		inside = (moved[:, 0] >= 0) & (moved[:, 0] < w) & (moved[:, 1] >= 0) & (moved[:, 1] < h)
+		ok = np.isfinite(moved).all(axis=1) & (error < maxError) & (minEig > minEigenvalue) & inside
+		idx = np.flatnonzero(alive)
+		xy[idx[ok]] = moved[ok]
+		alive[idx[~ok]] = False
+		out[f, alive] = xy[alive] / [w, h]
+		prev = cur
+	return out
+
+# worker process: tracks points through the images at paths, decoding one image at a time
+def _trackView(paths, points):
+	# Qt's decoder is only needed here, so the rest of the module doesn't depend on Qt
+	from .images import grayscale
+	return track((grayscale(path, maxSide) for path in paths), points, len(paths))
+
+# runs tracking requests on worker processes, one task per view, so the window never waits on them
+class Tracker:
+	def __init__(self, jobs=None):
+		jobs = jobs or max(1, min(4, (os.cpu_count() or 2) - 1))
+		# spawned rather than forked, since forking a process running Qt isn't safe
+		self.pool = ProcessPoolExecutor(jobs, mp_context=multiprocessing.get_context('spawn'))
+		self.pending = {}
+
+	# tasks maps a key (e.g. a view) to (paths, points): the images to track through, starting with the one the
+	# points (n x 2 normalized) are on
+	def start(self, tasks):
+		self.pending = {key: self.pool.submit(_trackView, paths, points) for key, (paths, points) in tasks.items()}
+
+	def busy(self):
+		return len(self.pending) > 0
+
+	# None while any task is running, then {key: tracked points} once. raises whatever a task raised
+	def poll(self):
+		if not self.busy() or not all(f.done() for f in self.pending.values()):
+			return None
+		pending, self.pending = self.pending, {}
+		return {key: f.result() for key, f in pending.items()}
+
+	def stop(self):
+		for f in self.pending.values():
+			f.cancel()
+		self.pending = {}
+		self.pool.shutdown(wait=False)
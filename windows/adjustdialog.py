@@ -0,0 +1,78 @@
+import math
+from PySide2.QtWidgets import QDialog, QFormLayout, QComboBox, QSlider, QCheckBox, QPushButton
+from PySide2.QtCore import Qt, Signal
+from util import adjust
+
+# brightness, contrast, gamma and histogram equalization of the displayed images, per view or for all of them.
+# contrast and gamma sliders are logarithmic, from 1/4 to 4
+class AdjustDialog(QDialog):
+	# view indices, settings
+	adjustmentChanged = Signal(list, dict)
+
+	def __init__(self, parent, viewNames, adjustments):
+		super(AdjustDialog, self).__init__(parent)
+		self.setWindowTitle('Image Adjustments')
+		self.adjustments = adjustments
+		layout = QFormLayout(self)
+
+		self.viewBox = QComboBox(self)
+		self.viewBox.addItem('All views')
+		self.viewBox.addItems(viewNames)
+		self.viewBox.currentIndexChanged.connect(self.loadSettings)
+		if len(viewNames) > 1:
+			layout.addRow('View:', self.viewBox)
+		else:
+			self.viewBox.hide()
+
+		self.brightness = self.slider(-100, 100)
+		layout.addRow('Brightness:', self.brightness)
+		self.contrast = self.slider(-100, 100)
+		layout.addRow('Contrast:', self.contrast)
+		self.gamma = self.slider(-100, 100)
+		layout.addRow('Gamma:', self.gamma)
+		self.equalize = QCheckBox('Histogram Equalization', self)
+		self.equalize.toggled.connect(self.changed)
+		layout.addRow(self.equalize)
+		reset = QPushButton('Reset', self)
+		reset.clicked.connect(self.reset)
+		layout.addRow(reset)
+
+		self.loadSettings()
+
+	def slider(self, lo, hi):
+		s = QSlider(Qt.Horizontal, self)
+		s.setRange(lo, hi)
+		s.valueChanged.connect(self.changed)
+		return s
+
+	def views(self):
+		if self.viewBox.currentIndex() == 0:
+			return list(range(len(self.adjustments)))
+		return [self.viewBox.currentIndex() - 1]
+
+	def settings(self):
+		return {
+			'brightness': self.brightness.value() / 200,
+			'contrast': 4 ** (self.contrast.value() / 100),
+			'gamma': 4 ** (self.gamma.value() / 100),
+			'equalize': self.equalize.isChecked()
+		}
+
+	# show the settings of the selected view (or of the first view, for all of them)
+	def loadSettings(self):
+		settings = self.adjustments[self.views()[0]]
+		for w in [self.brightness, self.contrast, self.gamma, self.equalize]:
+			w.blockSignals(True)
+		self.brightness.setValue(round(settings['brightness'] * 200))
+		self.contrast.setValue(round(math.log(settings['contrast'], 4) * 100))
+		self.gamma.setValue(round(math.log(settings['gamma'], 4) * 100))
+		self.equalize.setChecked(settings['equalize'])
+		for w in [self.brightness, self.contrast, self.gamma, self.equalize]:
+			w.blockSignals(False)
+
+	def changed(self):
+		self.adjustmentChanged.emit(self.views(), self.settings())
+
+	def reset(self):
+		self.adjustmentChanged.emit(self.views(), dict(adjust.defaults))
+		self.loadSettings()
@@ -1,7 +1,144 @@
-from PySide2.QtWidgets import QMainWindow
+import os
+import numpy as np
+import pandas as pd
+from PySide2.QtWidgets import QActionGroup
+from PySide2.QtCore import Qt
+from util.alert import Alert
+from util import depth, images, projectdata, instrument
+from .singleviewprojectmainwindow import SingleviewProjectMainWindow
 
-class DepthProjectMainWindow(QMainWindow):
-	def __init__(self, cfg):
-		self.cfg = cfg
-		super(DepthProjectMainWindow, self).__init__()
-		print('hey, man!')
\ No newline at end of file
+# a single view project where every image has a depth map (see util/depth.py). annotations are labeled exactly
+# like in a single view project, and every one is back-projected to 3d as soon as it's placed. the depth can
+# also be drawn over the image
+class DepthProjectMainWindow(SingleviewProjectMainWindow):
+	# the single view window shows the first frame while it sets itself up, before any of this window's setup
+	showDepth = False
+
+	# data is what util.projectdata.readDepth returns
+	def __init__(self, cfg, data=None):
+		if data is None:
+			data = projectdata.readDepth(cfg)
+		super(DepthProjectMainWindow, self).__init__(cfg, data)
+		if not hasattr(self, 'ui'):
+			# the single view window couldn't open the project
+			return
+
+		# 3d point of every annotation, in the coordinates of the depth camera's projection matrix.
+		# columns are (x, y, z) of every joint, in the order of cfg.joints
+		self.data_3d = data['data_3d'].reindex(
+			index=pd.Index(self.images, name='image'),
+			columns=pd.MultiIndex.from_product([cfg.joints, ['x', 'y', 'z']], names=['joint', 'coordinate'])
+		).astype(np.float64)
+
+		try:
+			self.depthFolder, self.projectionMatrix, self.depthScale, self.depthRange = depth.settings(cfg)
+		except ValueError as e:
+			Alert(str(e)).exec_()
+			self.close()
+			return
+		if not os.path.isdir(self.depthFolder):
+			Alert('Depth folder %s does not exist.'%self.depthFolder).exec_()
+			self.close()
+			return
+
+		# the memory mapped depth map of the current frame
+		self.depthMap = None
+		self.depthMapIdx = None
+
+		# annotations that were made before their depth maps existed (or in a single view project) have no 3d point yet
+		uv = self.data_pixel.iloc[:, self.pixelCols].values.astype(np.float64).reshape([len(self.images), -1, 2])
+		missing = ~np.isnan(uv).any(axis=2) & np.isnan(self.data_3d.values.reshape([len(self.images), -1, 3])).any(axis=2)
+		frames = np.flatnonzero(missing.any(axis=1))
+		if len(frames) > 0:
+			self.backproject(frames, np.arange(len(cfg.joints)))
+
+		self.depthColors = depth.colormaps[0]
+		a = self.toolsMenu.addAction('Show Depth')
+		a.setCheckable(True)
+		a.toggled.connect(self.setShowDepth)
+		self.showDepthAction = a
+		colorMenu = self.toolsMenu.addMenu('Depth Colors')
+		colorGroup = QActionGroup(self)
+		for name in depth.colormaps:
+			a = colorMenu.addAction(name)
+			a.setCheckable(True)
+			a.setChecked(name == self.depthColors)
+			a.triggered.connect(self.setDepthColors(name))
+			colorGroup.addAction(a)
+
+	def currentDepthMap(self):
+		if self.depthMapIdx != self.imageIdx:
+			self.depthMap = depth.load(self.depthFolder, self.images[self.imageIdx])
+			self.depthMapIdx = self.imageIdx
+		return self.depthMap
+
+	def depthMapOf(self, frame):
+		if frame == self.imageIdx:
+			return self.currentDepthMap()
+		return depth.load(self.depthFolder, self.images[frame])
+
+	# back-project the annotations of some joints in some frames. each frame's depth map is opened once and
+	# sampled at all of its points, and all the points are back-projected together
+	@instrument.timed
+	def backproject(self, frames, jointIdxs):
+		frames, jointIdxs = np.asarray(frames), np.asarray(jointIdxs)
+		cols = np.stack([self.pixelCols[2*jointIdxs], self.pixelCols[2*jointIdxs+1]], axis=1).ravel()
+		uv = self.data_pixel.iloc[frames, cols].values.astype(np.float64).reshape([len(frames), len(jointIdxs), 2])
+		z = np.full(uv.shape[:2], np.nan)
+		for i, frame in enumerate(frames):
+			if np.isnan(uv[i]).all():
+				continue
+			d = self.depthMapOf(frame)
+			if d is not None:
+				z[i] = depth.sample(d, uv[i], self.depthScale)
+		X = depth.backproject(self.projectionMatrix, uv.reshape([-1, 2]), z.ravel()).reshape([len(frames), -1])
+		cols3d = (3*jointIdxs[:, None] + np.arange(3)[None, :]).ravel()
+		self.data_3d.iloc[frames, cols3d] = X
+		return X.reshape([len(frames), len(jointIdxs), 3])
+
+	def annotationsChanged(self, frames, jointIdx):
+		X = self.backproject(frames, [jointIdx])
+		if len(frames) == 1 and frames[0] == self.imageIdx:
+			joint = self.cfg.joints[jointIdx]
+			if np.isfinite(X[0, 0]).all():
+				self.statusBar().showMessage('%s: (%.4g, %.4g, %.4g)'%(joint, *X[0, 0]))
+			elif not np.isnan(self.data_pixel.iloc[self.imageIdx, self.pixelCols[2*jointIdx]]):
+				self.statusBar().showMessage('%s: no depth here'%joint)
+			else:
+				self.statusBar().clearMessage()
+
+	# the image with its adjustments, and the colored depth over it when it's shown
+	def adjusted(self, img):
+		img = super(DepthProjectMainWindow, self).adjusted(img)
+		if not self.showDepth or img.isNull():
+			return img
+		d = self.currentDepthMap()
+		if d is None:
+			return img
+		depthRange = self.depthRange or depth.autoRange(d, self.depthScale)
+		if depthRange is None:
+			return img
+		colored, valid = depth.colorize(d, img.width(), img.height(), depthRange, self.depthScale, depth.lut(self.depthColors))
+		return images.arrayToImage(depth.overlay(images.imageToArray(img), colored, valid))
+
+	def setShowDepth(self, on):
+		self.showDepth = on
+		self.setPhoto(self.rawImage)
+
+	def setDepthColors(self, name):
+		def f():
+			self.depthColors = name
+			if self.showDepth:
+				self.setPhoto(self.rawImage)
+		return f
+
+	def keyPressEvent(self, event):
+		if event.key() == Qt.Key_D:
+			self.showDepthAction.toggle()
+		else:
+			super(DepthProjectMainWindow, self).keyPressEvent(event)
+
+	@instrument.timed
+	def save(self):
+		super(DepthProjectMainWindow, self).save()
+		self.data_3d.to_csv(os.path.join(self.cfg.projectFolder, '3d-annotation-data.csv'))
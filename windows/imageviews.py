@@ -1,6 +1,8 @@
-from PySide2.QtWidgets import QGraphicsView, QGraphicsScene, QGraphicsPixmapItem, QFrame, QGraphicsItem
-from PySide2.QtCore import Signal, QPoint, QPointF, Qt, QRectF, QEvent, QSize
-from PySide2.QtGui import QBrush, QColor, QPixmap, QPainter
+import numpy as np
+from PySide2.QtWidgets import QApplication, QGraphicsView, QGraphicsScene, QGraphicsPixmapItem, QFrame, QGraphicsItem
+from PySide2.QtCore import Signal, QPoint, QPointF, Qt, QRectF, QEvent, QSize, QLineF
+from PySide2.QtGui import QBrush, QColor, QPixmap, QPainter, QPen
+from util import instrument
 
 # based on https://stackoverflow.com/questions/35508711/how-to-enable-pan-and-zoom-in-a-qgraphicsview
 class ImageView(QGraphicsView):	
@@ -8,6 +10,9 @@ class ImageView(QGraphicsView):
 		super(ImageView, self).__init__(parent)
 		self._empty = True
 		self._scene = QGraphicsScene(self)
+		# the scene only ever holds a handful of items whose geometry changes every frame, so keeping a
+		# spatial index of them costs more than it saves
+		self._scene.setItemIndexMethod(QGraphicsScene.NoIndex)
 		self._photo = QGraphicsPixmapItem()
 		self._scene.addItem(self._photo)
 		self.setScene(self._scene)
@@ -18,7 +23,14 @@ class ImageView(QGraphicsView):
 		self.setBackgroundBrush(QBrush(QColor(30, 30, 30)))
 		self.setFrameShape(QFrame.NoFrame)
 
-		self._annotations = {}
+		# bones are added first so they are drawn underneath the dots
+		self._bones = BonesItem()
+		self._scene.addItem(self._bones)
+		self._annotations = AnnotationOverlay(self._bones)
+		self._scene.addItem(self._annotations)
+
+		self._epipolarLines = LinesItem()
+		self._scene.addItem(self._epipolarLines)
 
 	def hasPhoto(self):
 		return not self._empty
@@ -39,6 +51,7 @@ class ImageView(QGraphicsView):
 							 viewrect.height() / scenerect.height())
 				self.scale(factor, factor)
 
+	@instrument.timed
 	def setPhoto(self, pixmap=None):
 		if pixmap and not pixmap.isNull():
 			self._empty = False
@@ -48,52 +61,102 @@ class ImageView(QGraphicsView):
 			self._photo.setPixmap(QPixmap())
 		self.fitInView()
 
-	def addAnnotation(self, position, color, radius, key):
-		if key in self._annotations:
-			self._scene.removeItem(self._annotations[key])
-		d = DotItem(position, color, radius)
-		self._annotations[key] = d
-		self._scene.addItem(d)
+	def addAnnotation(self, position, color, radius, key, hollow=False):
+		self._annotations.set(key, position.x(), position.y(), color, radius, hollow)
 
 	def removeAnnotation(self, key):
-		self._scene.removeItem(self._annotations.pop(key, None))
+		self._annotations.remove(key)
 
 	def hideAnnotation(self, key):
-		if key in self._annotations:
-			self._scene.removeItem(self._annotations[key])
+		self._annotations.setVisible(key, False)
 
 	def showAnnotation(self, key):
-		if key in self._annotations:
-			self._scene.addItem(self._annotations[key])
+		self._annotations.setVisible(key, True)
+
+	# replace every annotation at once. points is n x 2 in scene (pixel) coordinates, with nan rows for
+	# keys that have no annotation; hollow and visible are optional boolean arrays
+	@instrument.timed
+	def setAnnotationArray(self, keys, points, colors, radius, hollow=None, visible=None):
+		self._annotations.setAll(keys, points, colors, radius, hollow, visible)
+
+	# change how annotations are displayed (which keys are visible, their radius and colors) in one update.
+	# anything left as None is unchanged
+	@instrument.timed
+	def setAnnotationDisplay(self, keys, visible=None, radius=None, colors=None):
+		self._annotations.setDisplay(keys, visible, radius, colors)
 
 	def getAnnotations(self):
-		return { key: val.copy() for key, val in self._annotations.items() }
+		return self._annotations.state()
 
 	def setAnnotations(self, annotations):
-		self.clearAnnotations()
-		self._annotations = annotations
-		for a in self._annotations.values():
-			self._scene.addItem(a)
+		self._annotations.setState(annotations)
 
 	def clearAnnotations(self):
-		for a in self._annotations.values():
-			self._scene.removeItem(a)
-		self._annotations = {}
+		self._annotations.clear()
+
+	@instrument.timed
+	def copyAnnotationsFrom(self, view):
+		self._annotations.copyFrom(view._annotations)
+
+	def annotationKeys(self):
+		return self._annotations.presentKeys()
+
+	# bones is a list of (key, key) pairs to connect with lines whenever both annotations are shown
+	def setSkeleton(self, bones):
+		self._bones.setBones(bones, self._annotations)
+
+	def setSkeletonVisible(self, visible):
+		self._bones.setVisible(visible)
+
+	# key of the visible annotation nearest to a scene position, or None if there is none within maxDist
+	# of the edge of its dot
+	def annotationAt(self, position, maxDist=None):
+		return self._annotations.nearest(position.x(), position.y(), maxDist)
+
+	def moveAnnotation(self, key, position):
+		self._annotations.move(key, position.x(), position.y())
+
+	def annotationPosition(self, key):
+		p = self._annotations.position(key)
+		return None if p is None else QPointF(*p)
 
 	def getPixmap(self):
 		return self._photo.pixmap()
 
+	# segments is an n x 4 array of (u0, v0, u1, v1) in normalized coordinates; nan rows are skipped
+	def setEpipolarLines(self, segments, color):
+		r = self._photo.pixmap().rect()
+		self._epipolarLines.setLines(segments * [r.width(), r.height(), r.width(), r.height()], color)
+
+	def clearEpipolarLines(self):
+		self._epipolarLines.setLines(np.zeros([0, 4]), None)
+
+# pressing on an existing annotation and moving the mouse drags that annotation instead of panning
 class MainImageView(ImageView):
 	photoClicked = Signal(QPointF)
 	photoRightClicked = Signal()
+	annotationDragged = Signal(str, QPointF)
+	annotationDropped = Signal(str, QPointF)
+
+	# how close (in screen pixels) the mouse has to be to a dot to grab it
+	grabDistance = 4
 
 	def __init__(self, parent):
 		super(MainImageView, self).__init__(parent)
 		self._zoom = 0
 		self.setDragMode(QGraphicsView.ScrollHandDrag)
 		self.viewport().setCursor(Qt.CrossCursor)
+		self.viewport().setMouseTracking(True)
 
 		self._mousePressed = False
+		self._grabbed = None
+		self._dragging = False
+		# where the grabbed annotation was pressed, and how far its center is from there (in scene coordinates)
+		self._pressPos = None
+		self._grabOffset = QPointF()
+
+	def _annotationUnderMouse(self, pos):
+		return self.annotationAt(self.mapToScene(pos), self.grabDistance / self.transform().m11())
 
 	def fitInView(self):
 		super(MainImageView, self).fitInView()
@@ -115,6 +178,13 @@ class MainImageView(ImageView):
 				self._zoom = 0
 
 	def mousePressEvent(self, event):
+		if event.button() == Qt.LeftButton and self._photo.isUnderMouse():
+			self._grabbed = self._annotationUnderMouse(event.pos())
+			if self._grabbed is not None:
+				self._mousePressed = True
+				self._pressPos = event.pos()
+				self._grabOffset = self.annotationPosition(self._grabbed) - self.mapToScene(event.pos())
+				return
 		super(MainImageView, self).mousePressEvent(event)
 		if event.button() == Qt.RightButton:
 			self.photoRightClicked.emit() 
@@ -123,12 +193,34 @@ class MainImageView(ImageView):
 			self._mousePressed = True
 
 	def mouseMoveEvent(self, event):
+		if self._grabbed is not None:
+			# a click that jitters a little doesn't move the annotation
+			if not self._dragging:
+				if (event.pos() - self._pressPos).manhattanLength() < QApplication.startDragDistance():
+					return
+				self._dragging = True
+				self._mousePressed = False
+			pos = self.mapToScene(event.pos()) + self._grabOffset
+			self.moveAnnotation(self._grabbed, pos)
+			self.annotationDragged.emit(self._grabbed, pos)
+			return
 		super(MainImageView, self).mouseMoveEvent(event)
 		if self._mousePressed:
 			self._mousePressed = False
-		
+		if not event.buttons():
+			hovering = self._annotationUnderMouse(event.pos()) is not None
+			self.viewport().setCursor(Qt.OpenHandCursor if hovering else Qt.CrossCursor)
 
 	def mouseReleaseEvent(self, event):
+		if self._grabbed is not None:
+			key = self._grabbed
+			dragging = self._dragging
+			self._grabbed = None
+			self._dragging = False
+			if dragging:
+				self.viewport().setCursor(Qt.CrossCursor)
+				self.annotationDropped.emit(key, self.mapToScene(event.pos()) + self._grabOffset)
+				return
 		super(MainImageView, self).mouseReleaseEvent(event)
 		self.viewport().setCursor(Qt.CrossCursor)
 		if self._mousePressed:
@@ -347,23 +439,303 @@ class MainImageView(ImageView):
 # 	def getPixmap(self):
 # 		return self._photo.pixmap()
 
-class DotItem(QGraphicsItem):
-	def __init__(self, point, color, radius):
-		super(DotItem, self).__init__()
-		self.point = point
-		self.color = color
-		self.radius = radius
+# draws a whole set of line segments in a single paint call
+class LinesItem(QGraphicsItem):
+	def __init__(self):
+		super(LinesItem, self).__init__()
+		self.lines = []
+		self.rect = QRectF()
+		self.pen = QPen()
+		self.pen.setCosmetic(True)
+		self.pen.setStyle(Qt.DashLine)
+
+	def setLines(self, segments, color):
+		segments = segments[~np.isnan(segments).any(axis=1)]
+		self.prepareGeometryChange()
+		self.lines = [QLineF(*s) for s in segments.tolist()]
+		if len(segments) > 0:
+			lo = np.minimum(segments[:, :2], segments[:, 2:]).min(axis=0)
+			hi = np.maximum(segments[:, :2], segments[:, 2:]).max(axis=0)
+			self.rect = QRectF(lo[0], lo[1], hi[0]-lo[0], hi[1]-lo[1]).adjusted(-1, -1, 1, 1)
+			self.pen.setColor(color)
+		else:
+			self.rect = QRectF()
+		self.update()
 
-		self.rect = QRectF(point - QPointF(radius, radius), 2*QSize(radius, radius))
+	def boundingRect(self):
+		return self.rect
+
+	def paint(self, painter, option, widget=None):
+		if len(self.lines) > 0:
+			painter.setPen(self.pen)
+			painter.drawLines(self.lines)
+
+# lines between pairs of annotations. the segment geometry is recomputed in one batch when all annotations
+# change, and only for the bones touching a joint when a single annotation changes
+class BonesItem(QGraphicsItem):
+	def __init__(self):
+		super(BonesItem, self).__init__()
+		self.keyPairs = []
+		self.pairs = np.zeros([0, 2], dtype=int)
+		self.bySlot = {}
+		self.segments = np.zeros([0, 4])
+		self.shown = np.zeros([0], dtype=bool)
+		self.lines = []
+		self.shownLines = []
+		self.layout = None
+		self.rect = QRectF()
+		self.pen = QPen(QColor(255, 255, 255, 160))
+		self.pen.setCosmetic(True)
+		self.pen.setWidth(2)
+
+	def setBones(self, keyPairs, overlay):
+		self.keyPairs = list(keyPairs)
+		self.layout = None
+		self.annotationsChanged(overlay, None)
+
+	def annotationsChanged(self, overlay, slot):
+		if len(self.keyPairs) == 0:
+			return
+		if slot is None and self.layout != overlay.layout:
+			# slots are assigned as keys show up, so resolve them again whenever the overlay's slots change
+			self.pairs = overlay.slotsOf([key for pair in self.keyPairs for key in pair]).reshape([-1, 2])
+			self.layout = overlay.layout
+			self.bySlot = {}
+			for i, (a, b) in enumerate(self.pairs):
+				self.bySlot.setdefault(a, []).append(i)
+				self.bySlot.setdefault(b, []).append(i)
+			self.segments = np.zeros([len(self.pairs), 4])
+			self.shown = np.zeros([len(self.pairs)], dtype=bool)
+			self.lines = [QLineF() for _ in self.pairs]
+			bones = np.arange(len(self.pairs))
+		elif slot is None:
+			bones = np.arange(len(self.pairs))
+		else:
+			bones = np.array(self.bySlot.get(slot, []), dtype=int)
+			if len(bones) == 0:
+				return
+		shown = overlay.present & overlay.visible
+		a, b = self.pairs[bones, 0], self.pairs[bones, 1]
+		segments = np.concatenate([overlay.points[a], overlay.points[b]], axis=1)
+		# only the bones that actually moved need new line objects
+		old = self.segments[bones]
+		same = (segments == old) | (np.isnan(segments) & np.isnan(old))
+		moved = ~same.all(axis=1)
+		for i, seg in zip(bones[moved], segments[moved].tolist()):
+			self.lines[i] = QLineF(*seg)
+		self.segments[bones] = segments
+		self.shown[bones] = shown[a] & shown[b]
+		self.shownLines = [self.lines[i] for i in np.flatnonzero(self.shown)]
+		self.prepareGeometryChange()
+		if self.shown.any():
+			seg = self.segments[self.shown]
+			lo = np.minimum(seg[:, :2], seg[:, 2:]).min(axis=0)
+			hi = np.maximum(seg[:, :2], seg[:, 2:]).max(axis=0)
+			self.rect = QRectF(lo[0], lo[1], hi[0]-lo[0], hi[1]-lo[1]).adjusted(-2, -2, 2, 2)
+		else:
+			self.rect = QRectF()
+		self.update()
 
 	def boundingRect(self):
 		return self.rect
 
 	def paint(self, painter, option, widget=None):
-		painter.setPen(self.color)
-		painter.setBrush(self.color)	
-		painter.drawEllipse(self.point, self.radius, self.radius)
+		painter.setPen(self.pen)
+		painter.drawLines(self.shownLines)
+
+# draws every annotation of a view in a single item. annotations are kept in arrays indexed by slot,
+# with one slot per key, so frames can be switched without creating or removing any scene items.
+# hollow dots are used for annotations that were filled in automatically rather than clicked
+class AnnotationOverlay(QGraphicsItem):
+	def __init__(self, bones=None):
+		super(AnnotationOverlay, self).__init__()
+		self.bones = bones
+		# bumped whenever keys are assigned to slots, so anything indexing by slot knows to look again
+		self.layout = 0
+		self.slots = {}
+		self.keys = []
+		self.lastKeys = None
+		self.lastIdx = None
+		self.lastColors = None
+		self.points = np.zeros([0, 2])
+		self.radii = np.zeros([0])
+		self.present = np.zeros([0], dtype=bool)
+		self.visible = np.zeros([0], dtype=bool)
+		self.hollow = np.zeros([0], dtype=bool)
+		self.colors = []
+		self.rect = QRectF()
+		self.setFlag(QGraphicsItem.ItemUsesExtendedStyleOption)
+
+	def _slot(self, key):
+		if key not in self.slots:
+			self.slots[key] = len(self.keys)
+			self.keys.append(key)
+			self.layout += 1
+			# grow the arrays by doubling, so adding keys one at a time doesn't reallocate every time
+			if len(self.keys) > len(self.points):
+				n = max(2*len(self.points), 8)
+				self.points = np.concatenate([self.points, np.zeros([n - len(self.points), 2])])
+				self.radii = np.concatenate([self.radii, np.zeros(n - len(self.radii))])
+				self.present = np.concatenate([self.present, np.zeros(n - len(self.present), dtype=bool)])
+				self.visible = np.concatenate([self.visible, np.ones(n - len(self.visible), dtype=bool)])
+				self.hollow = np.concatenate([self.hollow, np.zeros(n - len(self.hollow), dtype=bool)])
+				self.colors += [None] * (n - len(self.colors))
+		return self.slots[key]
+
+	def _slots(self, keys):
+		# frames are almost always set with the same list of keys, so remember the last lookup
+		if self.lastKeys is not keys or self.lastIdx is None:
+			self.lastIdx = np.array([self._slot(key) for key in keys], dtype=int)
+			self.lastKeys = keys
+		return self.lastIdx
+
+	# slots of keys, giving new keys one, for items drawn from the overlay's arrays (like the skeleton's bones)
+	def slotsOf(self, keys):
+		return np.array([self._slot(key) for key in keys], dtype=int)
+
+	def set(self, key, x, y, color, radius, hollow=False):
+		i = self._slot(key)
+		self.points[i] = (x, y)
+		self.colors[i] = color
+		self.lastColors = None
+		self.radii[i] = radius
+		self.hollow[i] = hollow
+		self.present[i] = True
+		self.visible[i] = True
+		self._changed(i)
+
+	def position(self, key):
+		if key not in self.slots or not self.present[self.slots[key]]:
+			return None
+		return tuple(self.points[self.slots[key]].tolist())
+
+	def move(self, key, x, y):
+		if key in self.slots:
+			self.points[self.slots[key]] = (x, y)
+			self._changed(self.slots[key])
+
+	def remove(self, key):
+		if key in self.slots:
+			self.present[self.slots[key]] = False
+			self._changed(self.slots[key])
+
+	def setVisible(self, key, visible):
+		if key in self.slots:
+			self.visible[self.slots[key]] = visible
+			self._changed(self.slots[key])
+
+	def setAll(self, keys, points, colors, radius, hollow=None, visible=None):
+		idx = self._slots(keys)
+		points = np.asarray(points, dtype=np.float64)
+		self.present[:] = False
+		self.present[idx] = ~np.isnan(points).any(axis=1)
+		self.points[idx] = points
+		self.radii[idx] = radius
+		self.hollow[idx] = False if hollow is None else hollow
+		self.visible[idx] = True if visible is None else visible
+		if colors is not self.lastColors:
+			for i, c in zip(idx, colors):
+				self.colors[i] = c
+			self.lastColors = colors
+		self._changed()
+
+	def setDisplay(self, keys, visible=None, radius=None, colors=None):
+		idx = self._slots(keys)
+		if visible is not None:
+			self.visible[idx] = visible
+		if radius is not None:
+			self.radii[idx] = radius
+		if colors is not None:
+			for i, c in zip(idx, colors):
+				self.colors[i] = c
+			self.lastColors = colors
+		self._changed()
+
+	def clear(self):
+		self.present[:] = False
+		self._changed()
+
+	def presentKeys(self):
+		return [self.keys[i] for i in np.flatnonzero(self.present)]
+
+	def state(self):
+		return {
+			'keys': list(self.keys),
+			'points': self.points.copy(),
+			'radii': self.radii.copy(),
+			'present': self.present.copy(),
+			'visible': self.visible.copy(),
+			'hollow': self.hollow.copy(),
+			'colors': list(self.colors)
+		}
+
+	def setState(self, state):
+		self.slots = {key: i for i, key in enumerate(state['keys'])}
+		self.keys = list(state['keys'])
+		self.layout += 1
+		self.lastIdx = None
+		self.lastColors = None
+		self.points = state['points'].copy()
+		self.radii = state['radii'].copy()
+		self.present = state['present'].copy()
+		self.visible = state['visible'].copy()
+		self.hollow = state['hollow'].copy()
+		self.colors = list(state['colors'])
+		self._changed()
+
+	# take on another overlay's annotations. when both have the same keys (the usual case, since every view is
+	# set with the project's joints) this copies into the existing arrays instead of allocating new ones
+	def copyFrom(self, other):
+		if other.keys != self.keys or len(other.points) != len(self.points):
+			self.setState(other.state())
+			return
+		np.copyto(self.points, other.points)
+		np.copyto(self.radii, other.radii)
+		np.copyto(self.present, other.present)
+		np.copyto(self.visible, other.visible)
+		np.copyto(self.hollow, other.hollow)
+		self.colors[:] = other.colors
+		self.lastColors = None
+		self._changed()
+
+	def nearest(self, x, y, maxDist=None):
+		idx = np.flatnonzero(self.present & self.visible)
+		if len(idx) == 0:
+			return None
+		d = np.hypot(self.points[idx, 0] - x, self.points[idx, 1] - y) - self.radii[idx]
+		best = np.argmin(d)
+		if maxDist is not None and d[best] > maxDist:
+			return None
+		return self.keys[idx[best]]
+
+	# slot is the only annotation that changed, or None if they all might have
+	def _changed(self, slot=None):
+		if self.bones is not None:
+			self.bones.annotationsChanged(self, slot)
+		shown = self.present & self.visible
+		self.prepareGeometryChange()
+		if shown.any():
+			r = self.radii[shown, None]
+			lo = (self.points[shown] - r).min(axis=0)
+			hi = (self.points[shown] + r).max(axis=0)
+			self.rect = QRectF(lo[0], lo[1], hi[0]-lo[0], hi[1]-lo[1]).adjusted(-1, -1, 1, 1)
+		else:
+			self.rect = QRectF()
+		self.update()
 
-	def copy(self):
-		return DotItem(self.point, self.color, self.radius)
+	def boundingRect(self):
+		return self.rect
 
+	@instrument.timed
+	def paint(self, painter, option, widget=None):
+		# only draw the dots that overlap the area being repainted
+		e = option.exposedRect
+		idx = np.flatnonzero(self.present & self.visible)
+		x, y, r = self.points[idx, 0], self.points[idx, 1], self.radii[idx]
+		idx = idx[(x + r >= e.left()) & (x - r <= e.right()) & (y + r >= e.top()) & (y - r <= e.bottom())]
+		for i in idx:
+			x, y = self.points[i]
+			r = self.radii[i]
+			painter.setPen(self.colors[i])
+			painter.setBrush(Qt.NoBrush if self.hollow[i] else self.colors[i])
+			painter.drawEllipse(QPointF(x, y), r, r)
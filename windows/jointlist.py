@@ -0,0 +1,200 @@
+import numpy as np
+from PySide2.QtWidgets import QListView, QAbstractItemView, QWidget, QVBoxLayout, QHBoxLayout, QLabel, QLineEdit, QComboBox, QPushButton
+from PySide2.QtCore import Qt, Signal, QAbstractListModel, QSortFilterProxyModel, QModelIndex, QItemSelectionModel
+
+# joints as a list model, so the labeling and displaying lists only make widgets for the rows on screen.
+# all state is kept in arrays, and setting it only emits dataChanged for the rows that actually changed
+class JointListModel(QAbstractListModel):
+	# a joint's check box was clicked (checkable models only)
+	toggled = Signal(int, bool)
+
+	def __init__(self, names, colors, checkable=False):
+		super(JointListModel, self).__init__()
+		self.names = list(names)
+		self.colors = list(colors)
+		self.checkable = checkable
+		self.missing = np.zeros(len(names), dtype=bool)
+		self.enabled = np.ones(len(names), dtype=bool)
+		self.checked = np.ones(len(names), dtype=bool)
+
+	def rowCount(self, parent=QModelIndex()):
+		return 0 if parent.isValid() else len(self.names)
+
+	def data(self, index, role=Qt.DisplayRole):
+		row = index.row()
+		if role == Qt.DisplayRole:
+			return self.names[row] + '*' if self.missing[row] else self.names[row]
+		elif role == Qt.DecorationRole:
+			return self.colors[row]
+		elif role == Qt.CheckStateRole and self.checkable:
+			return Qt.Checked if self.checked[row] else Qt.Unchecked
+		return None
+
+	def flags(self, index):
+		flags = Qt.ItemIsSelectable | Qt.ItemNeverHasChildren
+		if self.enabled[index.row()]:
+			flags |= Qt.ItemIsEnabled
+		if self.checkable:
+			flags |= Qt.ItemIsUserCheckable
+		return flags
+
+	def setData(self, index, value, role=Qt.EditRole):
+		if role != Qt.CheckStateRole or not self.checkable:
+			return False
+		# the window decides what is displayed, and calls setChecked with the result
+		self.toggled.emit(index.row(), int(value) == int(Qt.Checked))
+		return True
+
+	# values is a bool per joint, or per joint in rows
+	def setMissing(self, values, rows=None):
+		self._set(self.missing, values, rows, [Qt.DisplayRole])
+
+	def setEnabled(self, values, rows=None):
+		self._set(self.enabled, values, rows, [])
+
+	def setChecked(self, values, rows=None):
+		self._set(self.checked, values, rows, [Qt.CheckStateRole])
+
+	def setColors(self, colors):
+		self.colors = list(colors)
+		if len(self.names) > 0:
+			self.dataChanged.emit(self.index(0), self.index(len(self.names)-1), [Qt.DecorationRole])
+
+	def _set(self, array, values, rows, roles):
+		rows = np.arange(len(array)) if rows is None else np.atleast_1d(rows)
+		values = np.broadcast_to(np.asarray(values, dtype=bool), rows.shape)
+		changed = rows[array[rows] != values]
+		array[rows] = values
+		if len(changed) == 0:
+			return
+		# one signal per run of consecutive changed rows
+		changed = np.sort(changed)
+		breaks = np.flatnonzero(np.diff(changed) > 1)
+		for start, end in zip(np.r_[changed[0], changed[breaks+1]], np.r_[changed[breaks], changed[-1]]):
+			self.dataChanged.emit(self.index(int(start)), self.index(int(end)), roles)
+
+# filters joints by a substring of their name and by group
+class JointFilter(QSortFilterProxyModel):
+	def __init__(self, groups):
+		super(JointFilter, self).__init__()
+		self.groups = groups
+		self.text = ''
+		self.group = None
+
+	def setFilter(self, text, group=None):
+		self.text = text.lower()
+		self.group = group
+		self.invalidateFilter()
+
+	def filterAcceptsRow(self, row, parent):
+		if self.group is not None and self.group not in self.groups[row]:
+			return False
+		return self.text in self.sourceModel().names[row].lower()
+
+class JointList(QListView):
+	# the user picked a joint (for lists that aren't checkable)
+	jointSelected = Signal(int)
+
+	def __init__(self, parent, names, groups, colors, checkable=False):
+		super(JointList, self).__init__(parent)
+		self.jointModel = JointListModel(names, colors, checkable)
+		self.proxy = JointFilter(groups)
+		self.proxy.setSourceModel(self.jointModel)
+		self.setModel(self.proxy)
+		# every row is the same height, so the view doesn't have to measure rows it isn't showing
+		self.setUniformItemSizes(True)
+		self.setEditTriggers(QAbstractItemView.NoEditTriggers)
+		self.setSelectionMode(QAbstractItemView.ExtendedSelection if checkable else QAbstractItemView.SingleSelection)
+		# the window handles keyboard shortcuts, so the list shouldn't take the focus
+		self.setFocusPolicy(Qt.NoFocus)
+		self.selectionModel().currentChanged.connect(self.currentRowChanged)
+
+	def currentRowChanged(self, current, previous):
+		if current.isValid() and not self.jointModel.checkable:
+			self.jointSelected.emit(self.proxy.mapToSource(current).row())
+
+	# highlight a joint without emitting jointSelected
+	def setCurrent(self, row):
+		index = self.proxy.mapFromSource(self.jointModel.index(row))
+		self.selectionModel().blockSignals(True)
+		if index.isValid():
+			self.selectionModel().setCurrentIndex(index, QItemSelectionModel.ClearAndSelect)
+			self.scrollTo(index)
+		else:
+			self.selectionModel().clear()
+		self.selectionModel().blockSignals(False)
+		self.viewport().update()
+
+	def setFilter(self, text, group=None):
+		self.proxy.setFilter(text, group)
+
+	# the selected joints, or every joint that passes the filter if none are selected
+	def selectedJoints(self):
+		rows = [self.proxy.mapToSource(i).row() for i in self.selectionModel().selectedIndexes()]
+		if len(rows) == 0:
+			rows = [self.proxy.mapToSource(self.proxy.index(i, 0)).row() for i in range(self.proxy.rowCount())]
+		return sorted(rows)
+
+# the labeling and displaying lists, with a filter shared by both and buttons to show or hide many joints at once
+class JointPanel(QWidget):
+	jointSelected = Signal(int)
+	# joints whose display was turned on or off
+	displayingChanged = Signal(list, bool)
+
+	def __init__(self, parent, names, groups, colors):
+		super(JointPanel, self).__init__(parent)
+		layout = QVBoxLayout(self)
+		layout.setContentsMargins(0, 0, 0, 0)
+
+		self.filterEdit = QLineEdit(self)
+		self.filterEdit.setPlaceholderText('Filter joints')
+		self.filterEdit.setClearButtonEnabled(True)
+		self.filterEdit.textChanged.connect(self.updateFilter)
+		layout.addWidget(self.filterEdit)
+		self.groupBox = QComboBox(self)
+		self.groupBox.addItem('All joints')
+		self.groupBox.addItems(sorted(set.union(set(), *groups)))
+		self.groupBox.setVisible(self.groupBox.count() > 1)
+		self.groupBox.setFocusPolicy(Qt.NoFocus)
+		self.groupBox.currentIndexChanged.connect(self.updateFilter)
+		layout.addWidget(self.groupBox)
+
+		layout.addWidget(QLabel('Labeling:', self))
+		self.labelingList = JointList(self, names, groups, colors)
+		self.labelingList.jointModel.setMissing(True)
+		self.labelingList.jointSelected.connect(self.jointSelected)
+		layout.addWidget(self.labelingList)
+
+		layout.addWidget(QLabel('Displaying:', self))
+		self.displayingList = JointList(self, names, groups, colors, checkable=True)
+		self.displayingList.jointModel.toggled.connect(lambda row, on: self.displayingChanged.emit([row], on))
+		layout.addWidget(self.displayingList)
+
+		# act on the selected joints, or all the ones that pass the filter if none are selected
+		buttons = QHBoxLayout()
+		for text, on in [('Show', True), ('Hide', False)]:
+			b = QPushButton(text, self)
+			b.setFocusPolicy(Qt.NoFocus)
+			b.clicked.connect(lambda checked=False, on=on: self.displayingChanged.emit(self.displayingList.selectedJoints(), on))
+			buttons.addWidget(b)
+		layout.addLayout(buttons)
+
+	def updateFilter(self):
+		group = self.groupBox.currentText() if self.groupBox.currentIndex() > 0 else None
+		self.labelingList.setFilter(self.filterEdit.text(), group)
+		self.displayingList.setFilter(self.filterEdit.text(), group)
+
+	def setCurrent(self, row):
+		self.labelingList.setCurrent(row)
+
+	def setMissing(self, values, rows=None):
+		self.labelingList.jointModel.setMissing(values, rows)
+
+	# displaying is a bool per joint; joints that aren't displayed can't be labeled
+	def setDisplaying(self, displaying):
+		self.displayingList.jointModel.setChecked(displaying)
+		self.labelingList.jointModel.setEnabled(displaying)
+
+	def setColors(self, colors):
+		self.labelingList.jointModel.setColors(colors)
+		self.displayingList.jointModel.setColors(colors)
@@ -1,13 +1,23 @@
 import os
-from collections import namedtuple
-import yaml
-from PySide2.QtWidgets import QMainWindow, QFileDialog
+from concurrent.futures import ThreadPoolExecutor
+from PySide2.QtWidgets import QMainWindow, QFileDialog, QProgressDialog
+from PySide2.QtCore import QTimer
 from ui_py.ui_mainwindow import Ui_MainWindow
-from .newprojectdialog import NewProjectDialog
-from .singleviewprojectmainwindow import SingleviewProjectMainWindow
-from .multiviewprojectmainwindow import MultiviewProjectMainWindow
-from .depthprojectmainwindow import DepthProjectMainWindow
 from util.alert import Alert
+from util import config
+
+# the project windows (and pandas/numpy, which they pull in) are only imported once a project is opened, so the
+# launcher comes up quickly. this runs on a background thread, along with reading the project's files
+def loadProject(cfg):
+	from util import projectdata
+	if cfg.mode == 'RGB Single View':
+		from .singleviewprojectmainwindow import SingleviewProjectMainWindow
+		return SingleviewProjectMainWindow, projectdata.readSingleview(cfg)
+	elif cfg.mode == 'RGB Multi View':
+		from .multiviewprojectmainwindow import MultiviewProjectMainWindow
+		return MultiviewProjectMainWindow, projectdata.readMultiview(cfg)
+	from .depthprojectmainwindow import DepthProjectMainWindow
+	return DepthProjectMainWindow, projectdata.readDepth(cfg)
 
 class MainWindow(QMainWindow):    
 	def __init__(self):
@@ -19,8 +29,12 @@ class MainWindow(QMainWindow):
 		
 		self.ui.actionNew_Project.triggered.connect(self.startNewProject)
 		self.ui.actionOpen_Project.triggered.connect(self.startOpenProject)
+
+		# projects are loaded one at a time, off the main thread
+		self.loader = ThreadPoolExecutor(1)
 		
 	def startNewProject(self):
+		from .newprojectdialog import NewProjectDialog
 		projectPathToOpen = []
 		d = NewProjectDialog(projectPathToOpen)
 		if d.exec_():
@@ -35,23 +49,38 @@ class MainWindow(QMainWindow):
 			
 	def doOpenProject(self, projectPath):
 		try:
-			f = open(os.path.join(projectPath, 'cfg.yaml'), 'r')
+			cfg = config.loadConfig(projectPath)
 		except Exception as e:
 			Alert(str(e)).exec_()
 			return
-		cfg = yaml.safe_load(f)
-		# unnecessary, but feels cleaner to access the fields when it's a namedtuple
-		cfg = namedtuple("cfg", cfg.keys())(*cfg.values())
-		if cfg.mode == 'RGB Single View':
-			w = SingleviewProjectMainWindow(cfg)
-		elif cfg.mode == 'RGB Multi View':
-			w = MultiviewProjectMainWindow(cfg)
-		elif cfg.mode == 'RGB Depth':
-			w = DepthProjectMainWindow(cfg)
-		else:
+		if cfg.mode not in ['RGB Single View', 'RGB Multi View', 'RGB Depth']:
 			Alert('Project Mode must be "RGB Single View", "RGB Multi View", or "RGB Depth", but was %s'%str(cfg.mode)).exec_()
 			return
+		progress = QProgressDialog('Loading %s...'%os.path.basename(os.path.normpath(projectPath)), None, 0, 0, self)
+		progress.setWindowTitle('Opening Project')
+		progress.setMinimumDuration(0)
+		progress.show()
+		future = self.loader.submit(loadProject, cfg)
+		timer = QTimer(self)
+		timer.setInterval(30)
+		timer.timeout.connect(lambda: self.checkProjectLoaded(cfg, future, progress, timer))
+		timer.start()
+
+	# polled until the project has been read, then builds its window
+	def checkProjectLoaded(self, cfg, future, progress, timer):
+		if not future.done():
+			return
+		timer.stop()
+		timer.deleteLater()
+		progress.close()
+		# building the window also reads the first images and calibration (and may connect to a server), so it can
+		# fail too
+		try:
+			windowClass, data = future.result()
+			w = windowClass(cfg, data)
+		except Exception as e:
+			Alert('Could not open project: %s'%str(e)).exec_()
+			return
 		self.openProjectWindows[self.projectWindowIdGenerator] = w
 		self.projectWindowIdGenerator += 1
 		w.show()
-		
\ No newline at end of file
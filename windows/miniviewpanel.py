@@ -0,0 +1,103 @@
+from PySide2.QtWidgets import QWidget, QHBoxLayout, QVBoxLayout, QGridLayout, QLabel, QScrollBar
+from PySide2.QtCore import Qt, Signal
+from .imageviews import ImageView
+
+# grid of miniature views that only holds widgets for the views that fit on screen. scrolling reassigns the
+# existing slots to other views (a row at a time) instead of scrolling past a widget for every view, so the
+# window only has to decode and draw the views that are actually visible
+class MiniViewPanel(QWidget):
+	# emitted whenever the set of views being shown changes
+	viewsChanged = Signal()
+
+	def __init__(self, parent, names, columns=1, rows=4):
+		super(MiniViewPanel, self).__init__(parent)
+		self.names = names
+		self.columns = 1
+		self.rows = 1
+		self.first = 0 # first row of views being shown
+		self.slots = []
+
+		layout = QHBoxLayout(self)
+		layout.setContentsMargins(0, 0, 0, 0)
+		self.grid = QGridLayout()
+		layout.addLayout(self.grid, 1)
+		self.scrollBar = QScrollBar(Qt.Vertical, self)
+		self.scrollBar.valueChanged.connect(self.scrollTo)
+		layout.addWidget(self.scrollBar)
+
+		self.setGrid(columns, rows)
+
+	def numRows(self):
+		return (len(self.names) + self.columns - 1) // self.columns
+
+	def setGrid(self, columns, rows):
+		self.columns = max(1, min(columns, len(self.names)))
+		self.rows = max(1, min(rows, self.numRows()))
+		for slot in self.slots:
+			self.grid.removeWidget(slot['container'])
+			slot['container'].deleteLater()
+		self.slots = []
+		for i in range(self.columns * self.rows):
+			w = QWidget(self)
+			vLayout = QVBoxLayout(w)
+			vLayout.setContentsMargins(2, 2, 2, 2)
+			l = QLabel(w)
+			vLayout.addWidget(l)
+			v = ImageView(w)
+			vLayout.addWidget(v)
+			self.grid.addWidget(w, i // self.columns, i % self.columns, 1, 1)
+			self.slots.append({
+				'container': w,
+				'label': l,
+				'view': v,
+				'viewIdx': None
+			})
+		self.scrollBar.blockSignals(True)
+		self.scrollBar.setRange(0, self.numRows() - self.rows)
+		self.scrollBar.setPageStep(self.rows)
+		self.scrollBar.setVisible(self.numRows() > self.rows)
+		self.scrollBar.blockSignals(False)
+		self.first = min(self.first, self.scrollBar.maximum())
+		self.scrollBar.setValue(self.first)
+		self.assign()
+
+	def scrollTo(self, row):
+		if row != self.first:
+			self.first = row
+			self.assign()
+
+	# make sure a view is on screen
+	def ensureVisible(self, viewIdx):
+		row = viewIdx // self.columns
+		if row < self.first:
+			self.scrollBar.setValue(row)
+		elif row >= self.first + self.rows:
+			self.scrollBar.setValue(row - self.rows + 1)
+
+	def assign(self):
+		for i, slot in enumerate(self.slots):
+			viewIdx = self.first * self.columns + i
+			if viewIdx < len(self.names):
+				slot['viewIdx'] = viewIdx
+				slot['label'].setText('View: %s'%self.names[viewIdx])
+				slot['container'].show()
+			else:
+				slot['viewIdx'] = None
+				slot['view'].setPhoto(None)
+				slot['view'].clearAnnotations()
+				slot['container'].hide()
+		self.viewsChanged.emit()
+
+	# (view index, ImageView) of every view on screen
+	def shown(self):
+		return [(slot['viewIdx'], slot['view']) for slot in self.slots if slot['viewIdx'] is not None]
+
+	# the ImageView showing a view, or None if it's scrolled out of sight
+	def view(self, viewIdx):
+		row = viewIdx // self.columns - self.first
+		if row < 0 or row >= self.rows:
+			return None
+		return self.slots[row * self.columns + viewIdx % self.columns]['view']
+
+	def wheelEvent(self, event):
+		self.scrollBar.setValue(self.scrollBar.value() - event.angleDelta().y() // 120)
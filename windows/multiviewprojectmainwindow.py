@@ -1,37 +1,36 @@
 import os
-from glob import iglob
+import time
+import getpass
+import threading
 import numpy as np 
 import pandas as pd
-from PySide2.QtWidgets import QMainWindow, QRadioButton, QCheckBox, QWidget, QVBoxLayout, QLabel, QGraphicsView
-from PySide2.QtGui import QPixmap, QColor
-from PySide2.QtCore import Qt, QPointF
+from PySide2.QtWidgets import QMainWindow, QRadioButton, QCheckBox, QWidget, QVBoxLayout, QLabel, QGraphicsView, QActionGroup, QInputDialog
+from PySide2.QtGui import QPixmap, QColor, QImage
+from PySide2.QtCore import Qt, QPointF, QTimer
 from ui_py.ui_multiviewproject import Ui_MainWindow as Ui_MultiviewProjectMainWindow
 from util.alert import Alert
 from util.confirm import Confirm
+from util import calibration, interpolation, epipolar, distortion, images, geometry, skeleton, colors, playback, completeness, jointgroups, projectdata, adjust, instrument, preannotate, tracking, duplicates, query, annotationserver
 from .imageviews import MainImageView, ImageView
+from .playbackbar import PlaybackBar
+from .timeline import Timeline
+from .jointlist import JointPanel
+from .adjustdialog import AdjustDialog
+from .performancepanel import PerformancePanel
+from .miniviewpanel import MiniViewPanel
 
 class MultiviewProjectMainWindow(QMainWindow):
-	def __init__(self, cfg):
+	# (columns, rows) layouts offered for the mini view panel
+	miniGrids = [(1, 2), (1, 3), (1, 4), (2, 4), (2, 6), (3, 8)]
+
+	# data is what util.projectdata.readMultiview returns. it's usually read on a background thread while the
+	# window is opening (see windows/mainwindow.py), and is read here otherwise
+	def __init__(self, cfg, data=None):
 		super(MultiviewProjectMainWindow, self).__init__()
 		self.cfg = cfg
-		# we will only use images that exist for all views
-		imageNames = [iglob(os.path.join(cfg.imageFolder, view, '*'+cfg.imageExtension)) for view in cfg.views]
-		imageNames = [set(map(lambda s: os.path.basename(s), l)) for l in imageNames]
-		imageNames = set.intersection(*imageNames)
-
-		# read the data; if there is none, then create a new frame for the data
-		try:
-			data_pixel = pd.read_csv(os.path.join(cfg.projectFolder, 'pixel-annotation-data.csv'), index_col=[0,1], header=[0,1])
-			data_3d = pd.read_csv(os.path.join(cfg.projectFolder, '3d-annotation-data.csv'), index_col=0, header=[0,1])
-		except FileNotFoundError:
-			data_pixel = pd.DataFrame(
-				columns=pd.MultiIndex.from_product([cfg.joints, ['u', 'v']], names=['joint', 'coordinate']),
-				index=pd.MultiIndex(levels=[[],[]], codes=[[],[]], names=['view', 'image'])
-			)
-			data_3d = pd.DataFrame(
-				columns=pd.MultiIndex.from_product([cfg.joints, ['x','y','z']], names=['joint', 'coordinate']),
-				index=pd.Index([], name='image')
-			)
+		if data is None:
+			data = projectdata.readMultiview(cfg)
+		imageNames, data_pixel, data_3d = data['imageNames'], data['data_pixel'], data['data_3d']
 
 		# in case the user has deleted images
 		removed = set.difference(set(data_3d.index.values), imageNames)
@@ -78,6 +77,84 @@ class MultiviewProjectMainWindow(QMainWindow):
 			self.close()
 			return
 
+		# row of data_pixel for every (view, image), as a views x images array
+		self.pixelRows = self.data_pixel.index.get_indexer(pd.MultiIndex.from_product([cfg.views, self.images])).reshape([len(cfg.views), -1])
+
+		# where each annotation came from ('labeled' by hand, 'projected' from the other views, 'interpolated' between
+		# keyframes, 'predicted' and accepted, or 'tracked' from an earlier frame)
+		self.data_source = data['data_source'].reindex(index=self.data_pixel.index, columns=cfg.joints).astype(object)
+
+		# predicted (u, v, confidence) of every joint in every view, from pre-annotation
+		self.data_predicted = preannotate.frame(data.get('data_predicted'), self.data_pixel.index, cfg.joints)
+
+		# epipolar geometry between every pair of views only depends on the projection matrices
+		self.fundamentalMatrices = epipolar.fundamentalMatrices(cfg.projectionMatrices)
+
+		# optional lens distortion. annotations are always stored in the coordinates of the original (distorted)
+		# images, and are undistorted before triangulating and distorted again after projecting
+		try:
+			self.distortion = distortion.coefficients(cfg)
+		except ValueError as e:
+			Alert(str(e)).exec_()
+			self.close()
+			return
+		self.intrinsics = distortion.intrinsics(cfg.projectionMatrices)
+
+		# optional skeleton, drawn as bones between joints
+		try:
+			self.bones = skeleton.bones(cfg)
+			self.jointGroups = jointgroups.groups(cfg)
+		except ValueError as e:
+			Alert(str(e)).exec_()
+			self.close()
+			return
+		self.displayUndistorted = False
+		self.remapTables = {}
+
+		# brightness/contrast/gamma of every view, applied to the decoded images through lookup tables
+		self.adjustments = [dict(adjust.defaults) for _ in cfg.views]
+		self.adjustTables = [None for _ in cfg.views]
+		self.adjustDialog = None
+		self.rawImages = {}
+		self.remapLock = threading.Lock()
+
+		# columns of data_pixel holding (u, v) for every joint, in the order of cfg.joints
+		self.pixelCols = self.data_pixel.columns.get_indexer(pd.MultiIndex.from_product([cfg.joints, ['u', 'v']]))
+
+		# optional annotation server shared with other annotators (see util/annotationserver.py). its annotations
+		# replace the project's files, frames changed here are sent to it in batches, and the current frame is
+		# leased so nobody else changes it meanwhile
+		self.server = None
+		self.dirtyFrames = set()
+		self.leased = None
+		self.leaseTime = 0
+		# sequence number of the annotations of every image here, whether they were written from here or came from
+		# the server, so changes older than them are ignored
+		self.imageSeq = {}
+		self.serverTimer = QTimer(self)
+		self.serverTimer.setInterval(500)
+		self.serverTimer.timeout.connect(self.syncServer)
+		address = getattr(cfg, 'annotationServer', None)
+		if address is not None:
+			try:
+				self.server = annotationserver.Client(annotationserver.parseAddress(address), getpass.getuser())
+				if self.server.info['views'] != [str(v) for v in cfg.views] or self.server.info['joints'] != [str(j) for j in cfg.joints]:
+					raise ValueError('it serves a project with other views or joints')
+				response = self.server.read()
+			except Exception as e:
+				if self.server is not None:
+					self.server.close()
+					self.server = None
+				Alert('Could not use the annotation server at %s: %s'%(str(address), str(e))).exec_()
+				self.close()
+				return
+			self.data_pixel.iloc[:, :] = np.nan
+			self.data_3d.iloc[:, :] = np.nan
+			self.data_source.iloc[:, :] = None
+			self.applyRecords(response['records'])
+			self.imageSeq = dict.fromkeys((str(image) for image in self.images), response['seq'])
+			self.serverTimer.start()
+
 		# set up UI
 		self.ui = Ui_MultiviewProjectMainWindow()
 		self.ui.setupUi(self)
@@ -93,10 +170,12 @@ class MultiviewProjectMainWindow(QMainWindow):
 		# initialize radius for annotations
 		self.radius = 5
 
-		# initialize joint colors (I guess these aren't necessarily visually distinct, maybe there's a better way)
-		inc = 256**3 // len(self.cfg.joints)
-		color = 256**3-1
-		self.colors = [QColor(*tuple((color-inc*i).to_bytes(3, 'big'))) for i in range(len(self.cfg.joints))]
+		# initialize joint colors
+		self.colorScheme = colors.schemes[0]
+		self.colors = colors.jointColors(len(self.cfg.joints), self.colorScheme)
+
+		# when set, only the joint being labeled is shown
+		self.onlyCurrentJoint = False
 
 		# set headers above main view
 		self.ui.label.setText('View: %s'%str(self.cfg.views[self.viewIdx]))
@@ -111,91 +190,307 @@ class MultiviewProjectMainWindow(QMainWindow):
 		self.ui.comboBox.currentIndexChanged.connect(self.setView)
 
 		# set up the double spinbox for changing the annotation radius
-		self.ui.doubleSpinBox.valueChanged.connect(self.setRadius)
 		self.ui.doubleSpinBox.setValue(self.radius)
+		self.ui.doubleSpinBox.valueChanged.connect(self.setRadius)
 
 		# set up skip to next frame missing any/all displayed annotations
 		self.ui.pushButton.clicked.connect(self.skipMissingAny)
 		self.ui.pushButton_2.clicked.connect(self.skipMissingAll)
 
-		# add buttons for labeling and displaying annotations
-		self.labelingButtons = []
-		self.displayingButtons = []
-		for row, jointName in enumerate(cfg.joints):
-			r = QRadioButton(jointName+'*', self.ui.scrollAreaWidgetContents_3)
-			r.clicked.connect(self.setJoint(row))
-			# r.setStyleSheet('color: red'
-			self.ui.gridLayout.addWidget(r, row, 0, 1, 1)
-			self.labelingButtons.append(r)
-			c = QCheckBox(jointName, self.ui.scrollAreaWidgetContents_2)
-			c.clicked.connect(self.setDisplaying(row))
-			c.setChecked(True)
-			self.ui.gridLayout_2.addWidget(c, row, 0, 1, 1)
-			self.displayingButtons.append(c)
-		self.labelingButtons[self.jointIdx].setChecked(True)
-		self.ui.gridLayout.setRowStretch(len(cfg.joints), 1)
-		self.ui.gridLayout_2.setRowStretch(len(cfg.joints), 1)
+		# lists of joints for labeling and displaying annotations, which replace the designer's scroll areas
+		self.jointPanel = JointPanel(self.ui.centralwidget, cfg.joints, self.jointGroups, self.colors)
+		for w in [self.ui.label_2, self.ui.scrollArea_3, self.ui.label_3, self.ui.scrollArea_2]:
+			w.hide()
+		self.ui.verticalLayout.insertWidget(0, self.jointPanel, 1)
+		self.jointPanel.jointSelected.connect(self.setJoint)
+		self.jointPanel.displayingChanged.connect(self.setDisplaying)
+		self.jointPanel.setCurrent(self.jointIdx)
 
 		# initialize the main view
 		self.mainView = MainImageView(self.ui.centralwidget)
 		self.ui.verticalLayout_2.addWidget(self.mainView)
 		self.mainView.photoClicked.connect(self.mainImageClicked)
 		self.mainView.photoRightClicked.connect(self.removeAnnotation)
+		self.mainView.annotationDragged.connect(self.annotationDragged)
+		self.mainView.annotationDropped.connect(self.annotationDropped)
+
+		# while an annotation is dragged, the other views preview where it would end up. the preview is
+		# recomputed at most once per display refresh, using the latest mouse position
+		self.dragPos = None
+		self.previewTimer = QTimer(self)
+		self.previewTimer.setSingleShot(True)
+		self.previewTimer.setInterval(16)
+		self.previewTimer.timeout.connect(self.updateDragPreview)
+
+		# completeness of every frame, under the main view
+		self.timeline = Timeline(self.ui.centralwidget, len(self.images), len(cfg.views))
+		self.ui.verticalLayout_2.addWidget(self.timeline)
+		self.timeline.frameClicked.connect(self.ui.spinBox.setValue)
+
+		# playback, where frames are decoded ahead on worker threads and shown at a target rate
+		self.player = None
+		self.playbackBar = PlaybackBar(self.ui.centralwidget, len(self.images))
+		self.ui.verticalLayout_2.addWidget(self.playbackBar)
+		self.playbackBar.playToggled.connect(self.setPlaying)
+		self.playbackBar.scrubbed.connect(self.ui.spinBox.setValue)
+		self.playbackBar.fpsChanged.connect(self.setPlaybackFps)
+		self.playTimer = QTimer(self)
+		self.playTimer.setTimerType(Qt.PreciseTimer)
+		# tick faster than the frame rate, so frames are shown close to when they are due
+		self.playTimer.setInterval(max(1, int(500 / self.playbackBar.fps())))
+		self.playTimer.timeout.connect(self.playbackTick)
+
+		# miniature displays of the other views. only the views that fit in the panel get a widget, and only
+		# those (plus the main view) are decoded every frame
+		self.skeletonVisible = True
+		self.miniPanel = MiniViewPanel(self.ui.centralwidget, [str(view) for view in cfg.views], 1, min(len(cfg.views), 4))
+		self.ui.horizontalLayout_3.replaceWidget(self.ui.scrollArea, self.miniPanel)
+		self.ui.scrollArea.hide()
+		self.decoding = self.decodedViews()
+
+		# set up the tools menu
+		self.toolsMenu = self.ui.menubar.addMenu('Tools')
+		self.toolsMenu.addAction('Refine Projection Matrices...', self.refineProjectionMatrices)
+		self.toolsMenu.addAction('Image Adjustments...', self.showAdjustDialog)
+		self.performancePanel = None
+		self.toolsMenu.addAction('Performance...', self.showPerformancePanel)
+
+		# pre-annotation, where a predictor runs on worker processes and its predictions are shown as suggestions in the main view
+		self.preannotator = None
+		self.suggested = np.zeros(len(cfg.joints), dtype=bool)
+		self.suggestionThreshold = getattr(cfg, 'predictorThreshold', None)
+		self.suggestionTimer = QTimer(self)
+		self.suggestionTimer.setInterval(100)
+		self.suggestionTimer.timeout.connect(self.pollSuggestions)
+		self.preannotateAction = self.toolsMenu.addAction('Pre-annotate')
+		self.preannotateAction.setCheckable(True)
+		self.preannotateAction.toggled.connect(self.setPreannotating)
+
+		# tracking of the current frame's annotations into the next frames, on worker processes (one task per view)
+		self.tracker = None
+		self.trackFrames = 10
+		self.trackTimer = QTimer(self)
+		self.trackTimer.setInterval(100)
+		self.trackTimer.timeout.connect(self.pollTracking)
+		self.trackAction = self.toolsMenu.addAction('Track Forward...', self.trackForward)
+
+		# runs of near-duplicate frames, where every view is a near-duplicate (see util/duplicates.py), which
+		# navigation can skip
+		self.duplicateGroups = None
+		self.hashIndex = None
+		self.skipDuplicates = False
+		self.hashTimer = QTimer(self)
+		self.hashTimer.setInterval(200)
+		self.hashTimer.timeout.connect(self.pollHashes)
+		self.skipDuplicatesAction = self.toolsMenu.addAction('Skip Duplicates')
+		self.skipDuplicatesAction.setCheckable(True)
+		self.skipDuplicatesAction.toggled.connect(self.setSkipDuplicates)
+		self.toolsMenu.addAction('Copy to Duplicates', self.copyToDuplicates)
+
+		# frames picked by a query (see util/query.py), which navigation then stops on
+		self.query = None
+		self.toolsMenu.addAction('Filter Frames...', self.filterFrames)
+		self.showEpipolar = True
+		a = self.toolsMenu.addAction('Show Epipolar Lines')
+		a.setCheckable(True)
+		a.setChecked(self.showEpipolar)
+		a.toggled.connect(self.setShowEpipolar)
+		a = self.toolsMenu.addAction('Show Skeleton')
+		a.setCheckable(True)
+		a.setChecked(True)
+		a.setEnabled(len(self.bones) > 0)
+		a.toggled.connect(self.setSkeletonVisible)
+		a = self.toolsMenu.addAction('Show Undistorted Images')
+		a.setCheckable(True)
+		a.setEnabled(self.distortion is not None)
+		a.toggled.connect(self.setDisplayUndistorted)
 
-		# add a miniature display for every view
-		self.miniViews = []
-		for row, view in enumerate(cfg.views):
-			w = QWidget(self.ui.scrollAreaWidgetContents)
-			self.ui.gridLayout_3.addWidget(w, row, 0, 1, 1)
-			vLayout = QVBoxLayout(w)
-			l = QLabel(w)
-			l.setText('View: %s'%str(view))
-			vLayout.addWidget(l)
-			v = ImageView(w)
-			vLayout.addWidget(v)
-			self.miniViews.append({
-				'container': w,
-				'layout': vLayout,
-				'label': l,
-				'view': v
-			})
+		# set up keyframe mode, where frames between labeled keyframes are filled in automatically
+		self.keyframeMode = False
+		self.interpolationMethod = interpolation.methods[0]
+		a = self.toolsMenu.addAction('Keyframe Mode')
+		a.setCheckable(True)
+		a.toggled.connect(self.setKeyframeMode)
+		self.onlyCurrentJointAction = self.toolsMenu.addAction('Show Only Current Joint')
+		self.onlyCurrentJointAction.setCheckable(True)
+		self.onlyCurrentJointAction.toggled.connect(self.setOnlyCurrentJoint)
+		colorMenu = self.toolsMenu.addMenu('Colors')
+		colorGroup = QActionGroup(self)
+		for scheme in colors.schemes:
+			a = colorMenu.addAction(scheme)
+			a.setCheckable(True)
+			a.setChecked(scheme == self.colorScheme)
+			a.triggered.connect(self.setColorScheme(scheme))
+			colorGroup.addAction(a)
+		gridMenu = self.toolsMenu.addMenu('Mini View Grid')
+		gridGroup = QActionGroup(self)
+		for columns, rows in self.miniGrids:
+			a = gridMenu.addAction('%d x %d'%(columns, rows))
+			a.setCheckable(True)
+			a.setChecked((columns, rows) == (self.miniPanel.columns, self.miniPanel.rows))
+			a.triggered.connect(self.setMiniGrid(columns, rows))
+			gridGroup.addAction(a)
+		methodMenu = self.toolsMenu.addMenu('Interpolation')
+		methodGroup = QActionGroup(self)
+		for method in interpolation.methods:
+			a = methodMenu.addAction(method.capitalize())
+			a.setCheckable(True)
+			a.setChecked(method == self.interpolationMethod)
+			a.triggered.connect(self.setInterpolationMethod(method))
+			methodGroup.addAction(a)
+
+		self.mainView.setSkeleton(self.bones)
+		for _, v in self.miniPanel.shown():
+			v.setSkeleton(self.bones)
+		self.miniPanel.viewsChanged.connect(self.miniViewsChanged)
 
 		self.loadPhotos()
 		self.loadAnnotations()
+		self.updateTimeline()
+		if self.server is not None:
+			self.leaseFrame()
 
 		# helps register keypress events
 		self.setFocusPolicy(Qt.ClickFocus)
 
+	@instrument.timed
 	def loadPhotos(self):
-		self.mainView.setPhoto(QPixmap(os.path.join(self.cfg.imageFolder, self.cfg.views[self.viewIdx], self.images[self.imageIdx])))
-		for i, view in enumerate(self.miniViews):
-			view['view'].setPhoto(QPixmap(os.path.join(self.cfg.imageFolder, self.cfg.views[i], self.images[self.imageIdx])))
+		self.setPhotos(self.loadImages(self.imageIdx))
+
+	# imgs maps view indices to decoded images of the current frame. they are kept, so changing the image
+	# adjustments doesn't need to decode them again
+	@instrument.timed
+	def setPhotos(self, imgs):
+		self.rawImages = imgs
+		for i, v in self.miniPanel.shown():
+			if i not in imgs:
+				# the panel was scrolled after these were decoded
+				imgs[i] = self.loadImage(i, self.imageIdx)
+			v.setPhoto(QPixmap.fromImage(self.adjusted(i, imgs[i])))
+		# the main view usually shows the same image as one of the mini views, so there's no need to convert it twice
+		mini = self.miniPanel.view(self.viewIdx)
+		if mini is not None:
+			self.mainView.setPhoto(mini.getPixmap())
+		else:
+			if self.viewIdx not in imgs:
+				imgs[self.viewIdx] = self.loadImage(self.viewIdx, self.imageIdx)
+			self.mainView.setPhoto(QPixmap.fromImage(self.adjusted(self.viewIdx, imgs[self.viewIdx])))
+
+	# the image with the view's brightness/contrast/gamma lookup table applied
+	def adjusted(self, viewIdx, img):
+		if self.adjustTables[viewIdx] is None or img.isNull():
+			return img
+		return images.arrayToImage(adjust.apply(images.imageToArray(img), self.adjustTables[viewIdx], self.adjustments[viewIdx]))
+
+	def setAdjustment(self, viewIdxs, settings):
+		for i in viewIdxs:
+			self.adjustments[i] = dict(settings)
+			# the table is only rebuilt when the settings change
+			self.adjustTables[i] = None if adjust.isIdentity(settings) else adjust.table(settings)
+		self.setPhotos(self.rawImages)
+
+	def showAdjustDialog(self):
+		if self.adjustDialog is None:
+			self.adjustDialog = AdjustDialog(self, [str(view) for view in self.cfg.views], self.adjustments)
+			self.adjustDialog.adjustmentChanged.connect(self.setAdjustment)
+		self.adjustDialog.show()
+		self.adjustDialog.raise_()
+
+	def showPerformancePanel(self):
+		if self.performancePanel is None:
+			self.performancePanel = PerformancePanel(self)
+		self.performancePanel.show()
+		self.performancePanel.raise_()
+
+	# the views that are on screen, which are the only ones that need decoding
+	def decodedViews(self):
+		return tuple(sorted({self.viewIdx} | {i for i, _ in self.miniPanel.shown()}))
+
+	# (ImageView, view index) of the main view and every mini view on screen
+	def imageViews(self):
+		return [(self.mainView, self.viewIdx)] + [(v, i) for i, v in self.miniPanel.shown()]
+
+	# decodes the images of the visible views for a frame. this also runs on the playback threads, so it only makes QImages
+	def loadImages(self, imageIdx):
+		return {i: self.loadImage(i, imageIdx) for i in self.decoding}
+
+	@instrument.timed
+	def loadImage(self, viewIdx, imageIdx):
+		img = QImage(os.path.join(self.cfg.imageFolder, self.cfg.views[viewIdx], self.images[imageIdx]))
+		if not self.displayUndistorted or self.distortion is None or not self.distortion[viewIdx].any() or img.isNull():
+			return img
+		key = (viewIdx, img.width(), img.height())
+		with self.remapLock:
+			if key not in self.remapTables:
+				self.remapTables[key] = distortion.remapTable(self.cfg.projectFolder, self.cfg.views[viewIdx], self.distortion[viewIdx],
+					self.intrinsics[viewIdx], img.width(), img.height())
+		return images.arrayToImage(distortion.remap(images.imageToArray(img), self.remapTables[key]))
 
+	def setSkeletonVisible(self, on):
+		self.skeletonVisible = on
+		for v, _ in self.imageViews():
+			v.setSkeletonVisible(on)
+
+	def setMiniGrid(self, columns, rows):
+		def f():
+			self.miniPanel.setGrid(columns, rows)
+		return f
+
+	# the panel was scrolled or its grid changed, so some of its slots now show different views
+	def miniViewsChanged(self):
+		self.decoding = self.decodedViews()
+		for _, v in self.miniPanel.shown():
+			v.setSkeleton(self.bones)
+			v.setSkeletonVisible(self.skeletonVisible)
+		self.loadPhotos()
+		self.loadAnnotations()
+
+	def setDisplayUndistorted(self, on):
+		self.displayUndistorted = on
+		if self.player is not None:
+			# frames that were already decoded ahead were decoded the old way
+			self.player.stop()
+			self.player = playback.Player(self.loadImages, len(self.images), self.playbackBar.fps())
+			self.player.start(self.imageIdx)
+		self.loadPhotos()
+		self.loadAnnotations()
+
+	# convert normalized annotation coordinates (n x 2) of a view to/from the coordinates of the displayed image
+	def toDisplay(self, viewIdx, uv):
+		if not self.displayUndistorted or self.distortion is None:
+			return uv
+		return distortion.undistort(uv[:, None, :], self.distortion[[viewIdx]], self.intrinsics[[viewIdx]])[:, 0]
+	def fromDisplay(self, viewIdx, uv):
+		if not self.displayUndistorted or self.distortion is None:
+			return uv
+		return distortion.distort(uv[:, None, :], self.distortion[[viewIdx]], self.intrinsics[[viewIdx]])[:, 0]
+
+	@instrument.timed
 	def loadAnnotations(self):
-		self.mainView.clearAnnotations()
-		r = self.mainView.getPixmap().rect()
-		data2d = self.data_pixel.loc[(self.cfg.views[self.viewIdx], self.images[self.imageIdx]), :]
-		for j, joint in enumerate(self.cfg.joints):
-			d = data2d[joint]
-			if d.isna().any():
-				self.labelingButtons[j].setText(joint+'*')
-				continue
-			self.mainView.addAnnotation(QPointF(d['u'] * r.width(), d['v'] * r.height()), self.colors[j], self.radius, joint)
-			self.labelingButtons[j].setText(joint)
-			if not j in self.displaying:
-				self.mainView.hideAnnotation(joint)
-		for i, view in enumerate(self.cfg.views):
-			self.miniViews[i]['view'].clearAnnotations()
-			r = self.miniViews[i]['view'].getPixmap().rect()
-			data2d = self.data_pixel.loc[(view, self.images[self.imageIdx]), :]
-			for j, joint in enumerate(self.cfg.joints):
-				d = data2d[joint]
-				if d.isna().any():
-					continue
-				self.miniViews[i]['view'].addAnnotation(QPointF(d['u']*r.width(), d['v']*r.height()), self.colors[j], self.radius, joint)
-				if not j in self.displaying:
-					self.miniViews[i]['view'].hideAnnotation(joint)
+		displaying = self.visibleJoints()
+		rows = self.pixelRows[:, self.imageIdx]
+		data2d = self.data_pixel.iloc[rows, self.pixelCols].values.astype(np.float64).reshape([len(self.cfg.views), -1, 2])
+		interpolated = np.isin(self.data_source.iloc[rows].values, ['interpolated', 'tracked']) # views x joints
+		missing = np.isnan(data2d[self.viewIdx]).any(axis=1)
+		# suggestions fill in the joints that aren't labeled in the main view, drawn hollow like interpolated ones
+		self.suggested[:] = False
+		suggestion = data2d[self.viewIdx].copy()
+		if self.preannotator is not None:
+			uv = self.suggestions(self.viewIdx, self.imageIdx)
+			self.suggested = missing & ~np.isnan(uv).any(axis=1)
+			suggestion[self.suggested] = uv[self.suggested]
+		for v, i in self.imageViews():
+			r = v.getPixmap().rect()
+			if v is self.mainView:
+				points = geometry.denormalize(self.toDisplay(i, suggestion), r.width(), r.height())
+				v.setAnnotationArray(self.cfg.joints, points, self.colors, self.radius, interpolated[i] | self.suggested, displaying)
+			else:
+				points = geometry.denormalize(self.toDisplay(i, data2d[i]), r.width(), r.height())
+				v.setAnnotationArray(self.cfg.joints, points, self.colors, self.radius, interpolated[i], displaying)
+		self.jointPanel.setMissing(missing)
+		self.updateEpipolarLines()
 
+	@instrument.timed
 	def setFrame(self, index):
 		if index >= len(self.images):
 			self.ui.spinBox.setValue(0)
@@ -204,187 +499,811 @@ class MultiviewProjectMainWindow(QMainWindow):
 			self.ui.spinBox.setValue(len(self.images)-1)
 		self.imageIdx = index
 		self.ui.label_4.setText('Image: %s'%self.images[self.imageIdx])
+		self.playbackBar.setFrame(self.imageIdx)
+		self.timeline.setCurrentFrame(self.imageIdx)
+		if self.player is not None:
+			# keep playing from the new frame
+			self.player.start(self.imageIdx)
 		self.loadPhotos()
 		self.loadAnnotations()
+		self.updatePreannotationFocus()
+		if self.server is not None:
+			self.leaseFrame()
+
+	# fraction of the displayed joints that are labeled in every view, for frames (all of them by default)
+	def labeledFractions(self, frames=None):
+		frames = np.arange(len(self.images)) if frames is None else np.asarray(frames)
+		cols = self.pixelCols[2*np.array(sorted(self.displaying))]
+		return completeness.fractions(self.data_pixel, self.pixelRows[:, frames], cols)
+
+	# the timeline, the query's results and the annotation server follow every change to the annotations
+	@instrument.timed
+	def updateTimeline(self, frames=None):
+		if frames is None:
+			self.timeline.setFractions(self.labeledFractions())
+		else:
+			self.timeline.updateFrames(frames, self.labeledFractions(frames))
+			if self.server is not None:
+				self.dirtyFrames.update(int(f) for f in np.atleast_1d(frames))
+		if self.query is not None:
+			self.query.update(frames, *self.queryArrays(frames, self.query.usesErrors))
+
+	def setPlaying(self, on):
+		if on and self.player is None:
+			self.player = playback.Player(self.loadImages, len(self.images), self.playbackBar.fps())
+			self.player.start(self.imageIdx)
+			self.playTimer.start()
+		elif not on and self.player is not None:
+			self.playTimer.stop()
+			self.player.stop()
+			self.player = None
+			self.playbackBar.setAchievedFps(None, 0)
+
+	def setPlaybackFps(self, fps):
+		self.playTimer.setInterval(max(1, int(500 / fps)))
+		if self.player is not None:
+			self.player.setFps(fps)
 
+	# shows the frame the playback scheduler says is due, if it has been decoded, without going through the spin box
+	@instrument.timed
+	def playbackTick(self):
+		shown = self.player.tick()
+		if shown is not None:
+			self.imageIdx, imgs = shown
+			self.ui.spinBox.blockSignals(True)
+			self.ui.spinBox.setValue(self.imageIdx)
+			self.ui.spinBox.blockSignals(False)
+			self.ui.label_4.setText('Image: %s'%self.images[self.imageIdx])
+			self.playbackBar.setFrame(self.imageIdx)
+			self.timeline.setCurrentFrame(self.imageIdx)
+			self.setPhotos(imgs)
+			self.loadAnnotations()
+		self.playbackBar.setAchievedFps(self.player.achievedFps(), self.player.dropped)
+
+	@instrument.timed
 	def setView(self, index):
 		self.viewIdx = index
 		self.ui.label.setText('View: %s'%str(self.cfg.views[self.viewIdx]))
-		self.mainView.setPhoto(self.miniViews[index]['view'].getPixmap())
-		self.mainView.setAnnotations(self.miniViews[index]['view'].getAnnotations())
-		labeled = self.miniViews[index]['view'].getAnnotations()
-		for i, joint in enumerate(self.cfg.joints):
-			if joint in labeled:
-				self.labelingButtons[i].setText(joint)
-			else:
-				self.labelingButtons[i].setText(joint+'*')
+		self.decoding = self.decodedViews()
+		# scroll the panel to the new view, if it's out of sight
+		self.miniPanel.ensureVisible(index)
+		mini = self.miniPanel.view(index)
+		if mini is None:
+			# the view isn't in the panel, so it was never decoded
+			self.rawImages[index] = self.loadImage(index, self.imageIdx)
+			self.mainView.setPhoto(QPixmap.fromImage(self.adjusted(index, self.rawImages[index])))
+			self.loadAnnotations()
+			self.updatePreannotationFocus()
+			return
+		self.mainView.setPhoto(mini.getPixmap())
+		self.updatePreannotationFocus()
+		if self.preannotator is not None:
+			# the mini view doesn't have the suggestions
+			self.loadAnnotations()
+			return
+		self.mainView.copyAnnotationsFrom(mini)
+		self.jointPanel.setMissing(~np.isin(self.cfg.joints, list(self.mainView.annotationKeys())))
+		self.updateEpipolarLines()
 
 	def setRadius(self, r):
 		self.radius = r
+		self.updateDisplay()
 
-	def setJoint(self, index):
-		def f():
-			if self.labelingButtons[index].isChecked():
-				self.jointIdx = index
-		return f
-	def setDisplaying(self, index):
+	def visibleJoints(self):
+		visible = np.isin(np.arange(len(self.cfg.joints)), list(self.displaying))
+		if self.onlyCurrentJoint:
+			visible &= np.arange(len(self.cfg.joints)) == self.jointIdx
+		return visible
+
+	# apply the radius, visible joints and colors to every view with a single update per view
+	def updateDisplay(self):
+		visible = self.visibleJoints()
+		for v, _ in self.imageViews():
+			v.setAnnotationDisplay(self.cfg.joints, visible, self.radius, self.colors)
+
+	def setOnlyCurrentJoint(self, on):
+		self.onlyCurrentJoint = on
+		self.updateDisplay()
+
+	def setColorScheme(self, scheme):
 		def f():
-			if self.displayingButtons[index].isChecked():
-				self.showAnnotations(self.cfg.joints[index])
-				self.displaying.add(index)
-				self.labelingButtons[index].setEnabled(True)
-			else:
-				# ensure that at least one box will stay checked
-				if len(self.displaying) == 1:
-					self.displayingButtons[index].setChecked(True)
-				else:
-					self.hideAnnotations(self.cfg.joints[index])
-					self.displaying.remove(index)
-					self.labelingButtons[index].setEnabled(False)
-					if self.jointIdx == index:
-						self.labelingButtons[self.jointIdx].setChecked(False)
-						self.jointIdx = next(iter(self.displaying))
-						self.labelingButtons[self.jointIdx].setChecked(True)
+			self.colorScheme = scheme
+			self.colors = colors.jointColors(len(self.cfg.joints), scheme)
+			self.jointPanel.setColors(self.colors)
+			self.updateDisplay()
 		return f
 
+	def setJoint(self, index):
+		self.jointIdx = index
+		self.jointPanel.setCurrent(index)
+		if self.onlyCurrentJoint:
+			self.updateDisplay()
+		self.updateEpipolarLines()
+
+	def setDisplaying(self, rows, on):
+		if on:
+			self.displaying.update(rows)
+		else:
+			# ensure that at least one joint will stay displayed
+			self.displaying = self.displaying.difference(rows) or {self.jointIdx}
+		self.jointPanel.setDisplaying(np.isin(np.arange(len(self.cfg.joints)), list(self.displaying)))
+		if self.jointIdx not in self.displaying:
+			self.setJoint(min(self.displaying))
+		self.updateDisplay()
+		self.updateTimeline()
+		self.updateEpipolarLines()
+
+	@instrument.timed
 	def mainImageClicked(self, pos):
-		self.labelingButtons[self.jointIdx].setText(self.cfg.joints[self.jointIdx])
+		if self.heldElsewhere():
+			return
+		self.jointPanel.setMissing(False, self.jointIdx)
+		rows = self.pixelRows[:, self.imageIdx]
+		sources = self.data_source.iloc[rows, self.jointIdx].values
+		# clicking on an interpolated frame turns it into a keyframe, so the interpolated points in the other views
+		# shouldn't pull the triangulation toward them
+		if (sources == 'interpolated').any():
+			self.data_pixel.loc[[(view, self.images[self.imageIdx]) for view in self.cfg.views], self.cfg.joints[self.jointIdx]] = np.nan
+			sources = np.full(len(self.cfg.views), None, dtype=object)
 		r = self.mainView.getPixmap().rect()
-		pos_normalized = (pos.x() / r.width(), pos.y() / r.height())
+		pos_normalized = tuple(self.fromDisplay(self.viewIdx, geometry.normalize([[pos.x(), pos.y()]], r.width(), r.height()))[0])
 		self.data_pixel.loc[(self.cfg.views[self.viewIdx], self.images[self.imageIdx]), self.cfg.joints[self.jointIdx]] = pos_normalized
+		sources[self.viewIdx] = 'labeled'
 		preds3d = self.project_3d()
 		if preds3d is not None:
 			self.data_3d.loc[self.images[self.imageIdx], self.cfg.joints[self.jointIdx]] = preds3d
 			preds2d = self.compute2d(preds3d)
 			for i, view in enumerate(self.cfg.views):
 				self.data_pixel.loc[(view, self.images[self.imageIdx]), self.cfg.joints[self.jointIdx]] = preds2d[i]
+			sources = np.where(np.isin(sources, ['labeled', 'predicted']), sources, 'projected')
+			self.data_source.iloc[rows, self.jointIdx] = sources
 			self.addAnnotations(preds2d)
 		else:
+			self.data_source.iloc[rows, self.jointIdx] = sources
 			self.mainView.addAnnotation(pos, self.colors[self.jointIdx], self.radius, self.cfg.joints[self.jointIdx])
-			self.miniViews[self.viewIdx]['view'].addAnnotation(pos, self.colors[self.jointIdx], self.radius, self.cfg.joints[self.jointIdx])
+			mini = self.miniPanel.view(self.viewIdx)
+			if mini is not None:
+				mini.addAnnotation(pos, self.colors[self.jointIdx], self.radius, self.cfg.joints[self.jointIdx])
+		if self.keyframeMode:
+			self.updateInterpolation(self.jointIdx, self.imageIdx)
+		self.updateTimeline([self.imageIdx])
+		self.updateEpipolarLines()
+
+	def annotationDragged(self, key, pos):
+		j = self.cfg.joints.index(key)
+		if j != self.jointIdx:
+			self.setJoint(j)
+		self.dragPos = pos
+		if not self.previewTimer.isActive():
+			self.previewTimer.start()
+
+	# triangulate the dragged point with the other views' annotations, without storing anything, and move the
+	# reprojections in the other views
+	@instrument.timed
+	def updateDragPreview(self):
+		if self.dragPos is None:
+			return
+		r = self.mainView.getPixmap().rect()
+		preds2d = self.data_pixel.iloc[self.pixelRows[:, self.imageIdx], self.pixelCols[2*self.jointIdx:2*self.jointIdx+2]].values.astype(np.float64)
+		if (self.data_source.iloc[self.pixelRows[:, self.imageIdx], self.jointIdx].values == 'interpolated').any():
+			preds2d[:] = np.nan
+		preds2d[self.viewIdx] = self.fromDisplay(self.viewIdx, geometry.normalize([[self.dragPos.x(), self.dragPos.y()]], r.width(), r.height()))[0]
+		if (~np.isnan(preds2d).any(axis=1)).sum() <= 1:
+			mini = self.miniPanel.view(self.viewIdx)
+			if mini is not None:
+				mini.moveAnnotation(self.cfg.joints[self.jointIdx], self.dragPos)
+			return
+		if self.distortion is not None:
+			preds2d = distortion.undistort(preds2d, self.distortion, self.intrinsics)
+		preds3d = geometry.triangulateConsistent(self.cfg.projectionMatrices, preds2d, self.viewIdx)
+		if not np.isfinite(preds3d).all():
+			return
+		preds2d = self.compute2d(preds3d)
+		for i, v in self.miniPanel.shown():
+			r = v.getPixmap().rect()
+			p = geometry.denormalize(self.toDisplay(i, preds2d[[i]]), r.width(), r.height())[0]
+			v.moveAnnotation(self.cfg.joints[self.jointIdx], QPointF(*p))
+
+	# the drag is only committed (and triangulated for real) once, when the annotation is dropped
+	def annotationDropped(self, key, pos):
+		self.previewTimer.stop()
+		self.dragPos = None
+		self.mainImageClicked(pos)
 
 	def removeAnnotation(self):
-		self.labelingButtons[self.jointIdx].setText(self.cfg.joints[self.jointIdx]+'*')
+		if self.heldElsewhere():
+			return
+		self.jointPanel.setMissing(True, self.jointIdx)
 		self.data_pixel.loc[(self.cfg.views[self.viewIdx], self.images[self.imageIdx]), self.cfg.joints[self.jointIdx]] = [np.nan, np.nan]
+		self.data_source.iloc[self.pixelRows[self.viewIdx, self.imageIdx], self.jointIdx] = np.nan
 		self.mainView.removeAnnotation(self.cfg.joints[self.jointIdx])
-		self.miniViews[self.viewIdx]['view'].removeAnnotation(self.cfg.joints[self.jointIdx])
+		mini = self.miniPanel.view(self.viewIdx)
+		if mini is not None:
+			mini.removeAnnotation(self.cfg.joints[self.jointIdx])
+		if self.keyframeMode:
+			self.updateInterpolation(self.jointIdx, self.imageIdx)
+		self.updateTimeline([self.imageIdx])
+		self.updateEpipolarLines()
 
-	# preds3d is just (x,y,z)
-	def compute2d(self, preds3d):
+	def setPreannotating(self, on):
+		if on and self.preannotator is None:
+			try:
+				done = [(int(v), int(f)) for v, f in np.argwhere(~np.isnan(self.data_predicted.values).all(axis=1)[self.pixelRows])]
+				path = lambda key: os.path.join(self.cfg.imageFolder, self.cfg.views[key[0]], self.images[key[1]])
+				self.preannotator = preannotate.Preannotator(self.cfg, path, done)
+			except Exception as e:
+				Alert('Could not start pre-annotation: %s'%str(e)).exec_()
+				self.preannotateAction.setChecked(False)
+				return
+			self.updatePreannotationFocus()
+			self.suggestionTimer.start()
+		elif not on and self.preannotator is not None:
+			self.suggestionTimer.stop()
+			self.preannotator.stop()
+			self.preannotator = None
+		self.loadAnnotations()
+
+	# predict the main view's frames around the current one first, then the ones missing annotations
+	def updatePreannotationFocus(self):
+		if self.preannotator is not None:
+			missing = self.timeline.fraction[self.timeline.combined + self.viewIdx] < 1
+			frames = preannotate.order(self.imageIdx, len(self.images), missing)
+			self.preannotator.prioritize([(self.viewIdx, f) for f in frames])
+
+	def pollSuggestions(self):
+		results = self.preannotator.poll()
+		if self.preannotator.error() is not None:
+			Alert('Pre-annotation stopped: %s'%str(self.preannotator.error())).exec_()
+			self.preannotateAction.setChecked(False)
+			return
+		if len(results) == 0:
+			return
+		rows = [self.pixelRows[v, f] for (v, f), _ in results]
+		self.data_predicted.iloc[rows] = np.stack([prediction.ravel() for _, prediction in results])
+		if (self.viewIdx, self.imageIdx) in [key for key, _ in results]:
+			self.loadAnnotations()
+
+	# normalized (u, v) of the suggestion for every joint in a view's frame, nan where there's none
+	def suggestions(self, viewIdx, frame):
+		return preannotate.suggestions(self.data_predicted.iloc[self.pixelRows[viewIdx, frame]].values.reshape([-1, 3]), self.suggestionThreshold)
+
+	# turn the suggestions shown in the main view into annotations, each one as if it had been clicked (so it's
+	# triangulated with the other views)
+	def acceptSuggestions(self):
+		joints = np.flatnonzero(self.suggested & self.visibleJoints())
+		if len(joints) == 0 or self.heldElsewhere():
+			return
+		uv = self.toDisplay(self.viewIdx, self.suggestions(self.viewIdx, self.imageIdx)[joints])
+		r = self.mainView.getPixmap().rect()
+		points = geometry.denormalize(uv, r.width(), r.height())
+		current = self.jointIdx
+		for j, p in zip(joints, points):
+			self.setJoint(j)
+			self.mainImageClicked(QPointF(*p))
+			self.data_source.iloc[self.pixelRows[self.viewIdx, self.imageIdx], j] = 'predicted'
+		self.setJoint(current)
+		self.loadAnnotations()
+
+	# track the visible joints that are annotated in the current frame through the next frames, in every view
+	def trackForward(self):
+		if self.tracker is not None and self.tracker.busy():
+			return
+		rows = self.pixelRows[:, self.imageIdx]
+		uv = self.data_pixel.iloc[rows, self.pixelCols].values.astype(np.float64).reshape([len(self.cfg.views), -1, 2])
+		uv[:, ~self.visibleJoints()] = np.nan
+		views = np.flatnonzero(~np.isnan(uv).any(axis=2).all(axis=1))
+		if len(views) == 0 or self.imageIdx == len(self.images)-1:
+			Alert('There are no annotations to track from this frame.').exec_()
+			return
+		n, ok = QInputDialog.getInt(self, 'Track Forward', 'Frames:', self.trackFrames, 1, len(self.images)-1-self.imageIdx)
+		if not ok:
+			return
+		self.trackFrames = n
+		if self.tracker is None:
+			self.tracker = tracking.Tracker(min(len(self.cfg.views), os.cpu_count() or 1))
+		names = self.images[self.imageIdx:self.imageIdx+n+1]
+		self.tracker.start({v: ([os.path.join(self.cfg.imageFolder, self.cfg.views[v], name) for name in names], uv[v]) for v in views})
+		self.trackedFrom = self.imageIdx
+		self.trackAction.setEnabled(False)
+		self.statusBar().showMessage('Tracking %d views through %d frames...'%(len(views), n))
+		self.trackTimer.start()
+
+	def pollTracking(self):
 		try:
-			preds3d_aug = np.concatenate([preds3d, [1]], axis=0)
-			A = np.vstack(self.cfg.projectionMatrices)
-			preds2d = np.matmul(A, preds3d_aug)
-			preds2d = preds2d.reshape([-1, 3])
-			preds2d = preds2d[:, :2] / preds2d[:, 2, None]
-			preds2d[np.isinf(preds2d)] = np.nan
-			return preds2d # num_views x 2
+			results = self.tracker.poll()
 		except Exception as e:
-			Alert('Something went wrong while projecting annotations: %s. Are your projection matrices correct?'%str(e)).exec_()
-			self.close()
-			return None
+			self.trackTimer.stop()
+			self.trackAction.setEnabled(True)
+			self.statusBar().clearMessage()
+			Alert('Tracking failed: %s'%str(e)).exec_()
+			return
+		if results is None:
+			return
+		self.trackTimer.stop()
+		self.trackAction.setEnabled(True)
+		frames = np.arange(self.trackedFrom+1, self.trackedFrom+1+len(next(iter(results.values()))))
+		changed = np.zeros([len(frames), len(self.cfg.joints)], dtype=bool)
+		count = 0
+		for v, tracked in results.items():
+			rows = self.pixelRows[v, frames]
+			values = self.data_pixel.iloc[rows, self.pixelCols].values.astype(np.float64).reshape([len(frames), -1, 2])
+			sources = self.data_source.iloc[rows].values
+			# a joint stops where it was lost, or where it's already been placed some other way
+			replaceable = np.isnan(values).any(axis=2) | np.isin(sources, ['interpolated', 'tracked'])
+			keep = np.cumprod(replaceable & ~np.isnan(tracked).any(axis=2), axis=0).astype(bool)
+			for j in np.flatnonzero(keep.any(axis=0)):
+				self.data_pixel.iloc[rows[keep[:, j]], self.pixelCols[2*j:2*j+2]] = tracked[keep[:, j], j]
+				self.data_source.iloc[rows[keep[:, j]], j] = 'tracked'
+			changed |= keep
+			count += keep.sum()
+		# triangulate the changed joints from every view's annotations, without reprojecting, so the tracked
+		# points stay where they were tracked to
+		rows = self.pixelRows[:, frames].T.ravel()
+		pixels = self.data_pixel.iloc[rows, self.pixelCols].values.astype(np.float64).reshape([len(frames), len(self.cfg.views), -1, 2])
+		sources = self.data_source.iloc[rows].values.reshape([len(frames), len(self.cfg.views), -1])
+		pixels[np.isin(sources, ['projected', 'interpolated'])] = np.nan
+		pixels = pixels.transpose([0, 2, 1, 3]) # frames x joints x views x 2
+		if self.distortion is not None:
+			pixels = distortion.undistort(pixels.reshape([-1, len(self.cfg.views), 2]), self.distortion, self.intrinsics).reshape(pixels.shape)
+		X = geometry.triangulate(self.cfg.projectionMatrices, pixels)
+		for j in np.flatnonzero(changed.any(axis=0)):
+			ok = changed[:, j] & np.isfinite(X[:, j]).all(axis=1)
+			cols3d = self.data_3d.columns.get_indexer([(self.cfg.joints[j], c) for c in ['x', 'y', 'z']])
+			self.data_3d.iloc[frames[ok], cols3d] = X[ok, j]
+			if self.keyframeMode:
+				self.updateInterpolation(j, frames[changed[:, j]][-1])
+		self.statusBar().showMessage('Tracked %d annotations'%count)
+		self.loadAnnotations()
+		self.updateTimeline(frames)
+
+	def setShowEpipolar(self, on):
+		self.showEpipolar = on
+		self.updateEpipolarLines()
+
+	# draw the epipolar lines of the current joint's hand-labeled points in every other view
+	@instrument.timed
+	def updateEpipolarLines(self):
+		views = [v for v, _ in self.imageViews()]
+		joint = self.cfg.joints[self.jointIdx]
+		rows = self.pixelRows[:, self.imageIdx]
+		points = self.data_pixel.iloc[rows, self.data_pixel.columns.get_indexer([(joint, 'u'), (joint, 'v')])].values.astype(np.float64)
+		sources = self.data_source.iloc[rows, self.jointIdx].values
+		labeled = ~np.isnan(points).any(axis=1) & (sources != 'projected') & (sources != 'interpolated')
+		if self.distortion is not None:
+			points = distortion.undistort(points, self.distortion, self.intrinsics)
+		if not self.showEpipolar or not labeled.any() or self.jointIdx not in self.displaying:
+			for v in views:
+				v.clearEpipolarLines()
+			return
+		# views x labeled views x 4; a view's own point gives a degenerate line, which comes back as nan
+		segments = epipolar.clipToImage(epipolar.lines(self.fundamentalMatrices[:, labeled], points[labeled]))
+		# epipolar lines are only straight in undistorted images
+		if self.distortion is not None and not self.displayUndistorted:
+			segments = distortion.distortSegments(segments, self.distortion, self.intrinsics)
+		color = self.colors[self.jointIdx]
+		self.mainView.setEpipolarLines(segments[self.viewIdx], color)
+		for i, v in self.miniPanel.shown():
+			v.setEpipolarLines(segments[i], color)
+
+	def setKeyframeMode(self, on):
+		self.keyframeMode = on
+		if on:
+			for j in range(len(self.cfg.joints)):
+				self.updateInterpolation(j)
+			self.loadAnnotations()
+
+	def setInterpolationMethod(self, method):
+		def f():
+			self.interpolationMethod = method
+			if self.keyframeMode:
+				self.setKeyframeMode(True)
+		return f
+
+	# re-fill the interpolated frames of a joint in 3d, then reproject them into every view. if a frame is given,
+	# only the frames whose interpolation depends on that frame's keyframe are recomputed
+	@instrument.timed
+	def updateInterpolation(self, jointIdx, frame=None):
+		joint = self.cfg.joints[jointIdx]
+		cols2d = self.data_pixel.columns.get_indexer([(joint, 'u'), (joint, 'v')])
+		cols3d = self.data_3d.columns.get_indexer([(joint, 'x'), (joint, 'y'), (joint, 'z')])
+		pixels = self.data_pixel.iloc[self.pixelRows.ravel(), cols2d].values.astype(np.float64).reshape([len(self.cfg.views), -1, 2])
+		sources = self.data_source.iloc[self.pixelRows.ravel(), jointIdx].values.reshape([len(self.cfg.views), -1])
+		# a frame is labeled if any view has a hand-placed (or triangulated) annotation, and it's a keyframe if it was triangulated
+		labeled = (~np.isnan(pixels).any(axis=2) & (sources != 'interpolated')).any(axis=0)
+		values = self.data_3d.iloc[:, cols3d].values.astype(np.float64)
+		isKey = labeled & ~np.isnan(values).any(axis=1)
+		if frame is None:
+			lo, hi = 0, len(self.images)-1
+		else:
+			lo, hi = interpolation.affectedRange(np.flatnonzero(isKey), frame, len(self.images), self.interpolationMethod)
+		frames, filled = interpolation.fillRange(values, isKey, self.interpolationMethod, lo, hi, ~labeled)
+		if len(frames) == 0:
+			return
+		preds2d = geometry.project(self.cfg.projectionMatrices, filled) # frames x views x 2
+		if self.distortion is not None:
+			preds2d = distortion.distort(preds2d, self.distortion, self.intrinsics)
+		rows = self.pixelRows[:, frames].T.ravel()
+		self.data_3d.iloc[frames, cols3d] = filled
+		self.data_pixel.iloc[rows, cols2d] = preds2d.reshape([-1, 2])
+		missing = np.isnan(preds2d).any(axis=2).ravel()
+		self.data_source.iloc[rows, jointIdx] = np.where(missing, None, 'interpolated')
+		self.updateTimeline(frames)
+		if frame is not None and lo <= self.imageIdx <= hi:
+			self.loadAnnotations()
+	# preds3d is just (x,y,z)
+	def compute2d(self, preds3d):
+		preds2d = geometry.project(self.cfg.projectionMatrices, preds3d)
+		if self.distortion is not None:
+			preds2d = distortion.distort(preds2d, self.distortion, self.intrinsics)
+		return preds2d # num_views x 2
 
 	def addAnnotations(self, preds2d):
 		# rescale them to match image dimensions
 		r = self.mainView.getPixmap().rect()
-		p = QPointF(preds2d[self.viewIdx, 0] * r.width(), preds2d[self.viewIdx, 1] * r.height())
+		d = self.toDisplay(self.viewIdx, preds2d[[self.viewIdx]])[0]
+		p = QPointF(d[0] * r.width(), d[1] * r.height())
 		self.mainView.addAnnotation(p, self.colors[self.jointIdx], self.radius, self.cfg.joints[self.jointIdx])
-		for i, view in enumerate(self.miniViews):
-			r = view['view'].getPixmap().rect()
-			p = QPointF(preds2d[i, 0] * r.width(), preds2d[i, 1] * r.height())
-			view['view'].addAnnotation(p, self.colors[self.jointIdx], self.radius, self.cfg.joints[self.jointIdx])
-
-	def hideAnnotations(self, key):
-		self.mainView.hideAnnotation(key)
-		for view in self.miniViews:
-			view['view'].hideAnnotation(key)
-
-	def showAnnotations(self, key):
-		self.mainView.showAnnotation(key)
-		for view in self.miniViews:
-			view['view'].showAnnotation(key)
+		for i, v in self.miniPanel.shown():
+			r = v.getPixmap().rect()
+			d = self.toDisplay(i, preds2d[[i]])[0]
+			p = QPointF(d[0] * r.width(), d[1] * r.height())
+			v.addAnnotation(p, self.colors[self.jointIdx], self.radius, self.cfg.joints[self.jointIdx])
 
 	# get least squares 3d projection, then correct it to be exactly consistent with our current view
+	@instrument.timed
 	def project_3d(self):
-		# kind of want to solve linear system to get 3D coordinates minimizing l2 error
-		# helpful explanation of equation found on pg 5 here: https://hal.inria.fr/inria-00524401/PDF/Sturm-cvpr05.pdf
+		preds2d = self.data_pixel.iloc[self.pixelRows[:, self.imageIdx], self.pixelCols[2*self.jointIdx:2*self.jointIdx+2]].values.astype(np.float64)
+		if (~np.isnan(preds2d).any(axis=1)).sum() <= 1:
+			return None
+		if self.distortion is not None:
+			preds2d = distortion.undistort(preds2d, self.distortion, self.intrinsics)
 		try:
-			preds2d = self.data_pixel.loc[[(view, self.images[self.imageIdx]) for view in self.cfg.views], self.cfg.joints[self.jointIdx]]
-			labeledViews = np.arange(len(self.cfg.views))[preds2d.loc[:, 'u'].notna().values]
+			preds3d = geometry.triangulateConsistent(self.cfg.projectionMatrices, preds2d, self.viewIdx)
+			if not np.isfinite(preds3d).all():
+				raise ValueError('triangulation was degenerate')
+			return preds3d
+		except Exception as e:
+			Alert('Something went wrong while projecting annotations: %s. Are your projection matrices correct?'%str(e)).exec_()
+			self.close()
+			return None
 
-			if len(labeledViews) <= 1:
-				return None
+	# frames x displayed joints of the current view, True where a joint isn't annotated
+	def missingJoints(self):
+		cols = self.pixelCols[2*np.array(sorted(self.displaying))]
+		return np.isnan(self.data_pixel.iloc[self.pixelRows[self.viewIdx], cols].values.astype(np.float64))
 
-			num_views = len(labeledViews)
-			preds2d = preds2d.values[labeledViews, :]
-			preds2d = np.concatenate([preds2d, np.ones([num_views, 1])], axis=1)
-			mats = np.array(self.cfg.projectionMatrices)[labeledViews]
+	def skipMissingAny(self):
+		self.stepFrame(1, self.missingJoints().any(axis=1))
 
-			A1 = np.vstack(mats)
-			A2 = np.zeros([3*num_views, num_views])
-			A = np.concatenate([A1, A2], axis=1).astype(np.float)
+	def skipMissingAll(self):
+		self.stepFrame(1, self.missingJoints().all(axis=1))
 
-			updates_rows = np.arange(3*num_views)
-			updates_cols = np.repeat(np.arange(num_views)+4, 3)
-			A[updates_rows, updates_cols] = -1*preds2d.reshape([3*num_views])
+	# the frames that navigation stops on
+	def navigableFrames(self):
+		frames = np.ones(len(self.images), dtype=bool)
+		if self.skipDuplicates and self.duplicateGroups is not None:
+			frames &= self.duplicateGroups == np.arange(len(self.images))
+		if self.query is not None:
+			frames &= self.query.matches
+		return frames
 
-			u, s, vh = np.linalg.svd(A)
-			preds3d = vh[-1] # bottom row of V^T is eigenvector of smallest singular value
+	# go to the next (step 1) or previous (step -1) navigable frame, of the frames in `among` if it's given,
+	# wrapping around at the ends
+	def stepFrame(self, step, among=None):
+		frames = self.navigableFrames()
+		if among is not None:
+			frames &= among
+		frames = np.flatnonzero(frames)
+		if len(frames) == 0:
+			return
+		if step > 0:
+			idx = np.searchsorted(frames, self.imageIdx, side='right') % len(frames)
+		else:
+			idx = np.searchsorted(frames, self.imageIdx, side='left') - 1
+		self.ui.spinBox.setValue(int(frames[idx]))
 
-			# now make our 3d predictions consistent with the current view, possibly at the expense of the others
-			# we can do this by subtracting the basis row vectors of our current projection matrix
-			for idx, v in enumerate(labeledViews):
-				if v == self.viewIdx:
-					break
-			space = A[3*idx:3*(idx+1), :].T
-			Q, _ = np.linalg.qr(space)
-			components = np.matmul(Q.T, preds3d)[:,None] * Q.T
-			preds3d = preds3d - np.sum(components, axis=0)
+	# pixels, sources and (when asked for) reprojection errors of frames (all of them by default), as util/query.py
+	# reads them
+	def queryArrays(self, frames=None, errors=False):
+		frames = np.arange(len(self.images)) if frames is None else np.asarray(frames)
+		numViews, numJoints = len(self.cfg.views), len(self.cfg.joints)
+		rows = self.pixelRows[:, frames].T.ravel()
+		pixels = self.data_pixel.iloc[rows, self.pixelCols].values.astype(np.float64).reshape([len(frames), numViews, numJoints, 2])
+		sources = self.data_source.iloc[rows].values.reshape([len(frames), numViews, numJoints])
+		if not errors:
+			return pixels, sources, None
+		cols3d = self.data_3d.columns.get_indexer(pd.MultiIndex.from_product([self.cfg.joints, ['x', 'y', 'z']]))
+		X = self.data_3d.iloc[frames, cols3d].values.astype(np.float64).reshape([len(frames), numJoints, 3])
+		projected = geometry.project(self.cfg.projectionMatrices, X) # frames x joints x views x 2
+		if self.distortion is not None:
+			projected = distortion.distort(projected, self.distortion, self.intrinsics)
+		return pixels, sources, np.linalg.norm(projected.transpose([0, 2, 1, 3]) - pixels, axis=-1)
+
+	def filterFrames(self):
+		text, ok = QInputDialog.getText(self, 'Filter Frames', 'Only stop on frames where (empty for every frame):', text='' if self.query is None else self.query.text)
+		if not ok:
+			return
+		if text.strip() == '':
+			self.query = None
+			self.statusBar().clearMessage()
+			return
+		try:
+			q = query.Query(text, self.cfg.joints, self.cfg.views)
+			q.update(None, *self.queryArrays(None, q.usesErrors))
+		except ValueError as e:
+			Alert(str(e)).exec_()
+			return
+		self.query = q
+		self.statusBar().showMessage('%d frames match %s'%(q.matches.sum(), text))
 
+	def setSkipDuplicates(self, on):
+		self.skipDuplicates = on
+		if not on or self.duplicateGroups is not None or self.hashIndex is not None:
+			return
+		try:
+			self.duplicateThreshold = duplicates.threshold(self.cfg)
+			self.hashIndex = duplicates.HashIndex(self.cfg, [os.path.join(str(view), image) for view in self.cfg.views for image in self.images])
+		except Exception as e:
+			Alert('Could not find near-duplicate frames: %s'%str(e)).exec_()
+			self.skipDuplicatesAction.setChecked(False)
+			return
+		self.hashTimer.start()
+		self.pollHashes()
 
-			preds3d = preds3d[:3] / preds3d[3] 
+	def pollHashes(self):
+		try:
+			result = self.hashIndex.poll()
+		except Exception as e:
+			self.hashTimer.stop()
+			self.hashIndex.stop()
+			self.hashIndex = None
+			self.statusBar().clearMessage()
+			Alert('Could not find near-duplicate frames: %s'%str(e)).exec_()
+			self.skipDuplicatesAction.setChecked(False)
+			return
+		if result is None:
+			self.statusBar().showMessage('Hashing images: %d of %d left...'%(self.hashIndex.remaining(), self.hashIndex.total))
+			return
+		self.hashTimer.stop()
+		self.hashIndex = None
+		hashes, valid = [a.reshape([len(self.cfg.views), -1]) for a in result]
+		self.duplicateGroups = duplicates.groups(hashes, valid, self.duplicateThreshold)
+		numDuplicates = (self.duplicateGroups != np.arange(len(self.images))).sum()
+		self.statusBar().showMessage('%d frames are near-duplicates of an earlier frame'%numDuplicates)
 
-			return preds3d
+	# copy the current frame's annotations of the visible joints, in every view, to the other frames of its run of
+	# near-duplicates
+	def copyToDuplicates(self):
+		if self.duplicateGroups is None:
+			Alert('Near-duplicate frames haven\'t been found yet. Turn on Tools > Skip Duplicates first.').exec_()
+			return
+		frames = np.flatnonzero(self.duplicateGroups == self.duplicateGroups[self.imageIdx])
+		frames = frames[frames != self.imageIdx]
+		rows = self.pixelRows[:, self.imageIdx]
+		uv = self.data_pixel.iloc[rows, self.pixelCols].values.astype(np.float64).reshape([len(self.cfg.views), -1, 2])
+		sources = self.data_source.iloc[rows].values
+		# interpolated annotations would just be interpolated again
+		copied = ~np.isnan(uv).any(axis=2) & (sources != 'interpolated') # views x joints
+		joints = np.flatnonzero(self.visibleJoints() & copied.any(axis=0))
+		if len(frames) == 0 or len(joints) == 0:
+			return
+		if not Confirm('Copy the annotations of %d joints to the %d near-duplicates of this frame?'%(len(joints), len(frames))).exec_():
+			return
+		for j in joints:
+			cols3d = self.data_3d.columns.get_indexer([(self.cfg.joints[j], c) for c in ['x', 'y', 'z']])
+			for v in np.flatnonzero(copied[:, j]):
+				self.data_pixel.iloc[self.pixelRows[v, frames], self.pixelCols[2*j:2*j+2]] = uv[v, j]
+				self.data_source.iloc[self.pixelRows[v, frames], j] = sources[v, j]
+			self.data_3d.iloc[frames, cols3d] = self.data_3d.iloc[self.imageIdx, cols3d].values.astype(np.float64)
+			if self.keyframeMode:
+				self.updateInterpolation(j, frames[0])
+				self.updateInterpolation(j, frames[-1])
+		self.updateTimeline(frames)
+
+	# put the frames of annotation server records into the dataframes, returning which frames they are
+	def applyRecords(self, records):
+		frameOf = {str(image): i for i, image in enumerate(self.images)}
+		# images that aren't in every view folder here are left out, as when the project is opened
+		records = [r for r in records if r['image'] in frameOf]
+		frames = np.array([frameOf[r['image']] for r in records], dtype=np.int64)
+		if len(frames) == 0:
+			return frames
+		_, pixels, sources, points = annotationserver.fromRecords(records, len(self.cfg.views), len(self.cfg.joints))
+		rows = self.pixelRows[:, frames].T.ravel()
+		cols3d = self.data_3d.columns.get_indexer(pd.MultiIndex.from_product([self.cfg.joints, ['x', 'y', 'z']]))
+		self.data_pixel.iloc[rows, self.pixelCols] = pixels.reshape([len(rows), -1])
+		self.data_source.iloc[rows] = sources.reshape([len(rows), -1])
+		self.data_3d.iloc[frames, cols3d] = points.reshape([len(frames), -1])
+		return frames
+
+	# annotation server records of frames
+	def frameRecords(self, frames):
+		frames = np.asarray(frames)
+		pixels, sources, _ = self.queryArrays(frames)
+		cols3d = self.data_3d.columns.get_indexer(pd.MultiIndex.from_product([self.cfg.joints, ['x', 'y', 'z']]))
+		X = self.data_3d.iloc[frames, cols3d].values.astype(np.float64).reshape([len(frames), -1, 3])
+		return annotationserver.toRecords(self.images[frames], pixels, sources, X)
+
+	# take the changes to frames received from the annotation server in, as if they had been made here
+	def applyServerChanges(self, records):
+		frames = self.applyRecords(records)
+		if len(frames) == 0:
+			return
+		dirty = set(self.dirtyFrames)
+		self.updateTimeline(frames)
+		self.dirtyFrames = dirty
+		if self.imageIdx in frames:
+			self.loadAnnotations()
+
+	# lease the current frame (releasing the one before it), and tell the user when another annotator holds it.
+	# returns who holds it, or None when it can be changed here
+	def leaseFrame(self):
+		image = str(self.images[self.imageIdx])
+		# changes are sent before the lease on them is given up, so they can't be rejected
+		self.flushServer()
+		if self.server is None:
+			return None
+		try:
+			if self.leased is not None and self.leased != image:
+				self.server.release([self.leased])
+			self.leased = None
+			held = self.server.lease([image])['held']
 		except Exception as e:
-			Alert('Something went wrong while projecting annotations: %s. Are your projection matrices correct?'%str(e)).exec_()
-			self.close()
+			self.serverFailed(e)
 			return None
+		self.leaseTime = time.time()
+		if image in held:
+			self.statusBar().showMessage('%s is being annotated by %s, so it can\'t be changed here'%(image, held[image]))
+			return held[image]
+		self.leased = image
+		return None
 
-	def skipMissingAny(self):
-		cols = [self.cfg.joints[idx] for idx in self.displaying]
-		data = self.data_pixel.loc[self.cfg.views[self.viewIdx], cols]
-		missing = data.isna().any(axis=1)
-		idx = missing[missing].index.get_loc(self.images[self.imageIdx])
-		image = missing[missing].index[idx+1]
-		idx = missing.index.get_loc(image)
-		self.ui.spinBox.setValue(idx)
+	# whether the current frame is held by another annotator (after trying to lease it), so it can't be changed
+	def heldElsewhere(self):
+		if self.server is None or self.leased == str(self.images[self.imageIdx]):
+			return False
+		if self.leaseFrame() is None:
+			return False
+		# undo whatever was moved in the views
+		self.loadAnnotations()
+		return True
 
-	def skipMissingAll(self):
-		cols = [self.cfg.joints[idx] for idx in self.displaying]
-		data = self.data_pixel.loc[self.cfg.views[self.viewIdx], cols]
-		missing = data.isna().all(axis=1)
-		idx = missing[missing].index.get_loc(self.images[self.imageIdx])
-		image = missing[missing].index[idx+1]
-		idx = missing.index.get_loc(image)
-		self.ui.spinBox.setValue(idx)
+	# send the frames changed here to the annotation server, in one batch
+	def flushServer(self):
+		if self.server is None or len(self.dirtyFrames) == 0:
+			return
+		frames, self.dirtyFrames = np.array(sorted(self.dirtyFrames)), set()
+		try:
+			response = self.server.write(self.frameRecords(frames))
+			rejected = response['rejected']
+			current = self.server.read(rejected) if len(rejected) > 0 else None
+		except Exception as e:
+			self.serverFailed(e)
+			return
+		for image in self.images[frames]:
+			self.imageSeq[str(image)] = response['seq']
+		if len(rejected) > 0:
+			# other annotators hold those frames, so their annotations win
+			for image in rejected:
+				self.imageSeq[image] = current['seq']
+			self.applyServerChanges(current['records'])
+			self.statusBar().showMessage('Changes to %d frames were undone, since other annotators are working on them'%len(rejected))
+
+	# runs on a timer: sends this window's changes, renews the lease and takes in the other annotators' changes
+	def syncServer(self):
+		self.flushServer()
+		if self.server is not None and self.leased is not None and time.time() - self.leaseTime > annotationserver.leaseSeconds / 3:
+			self.leaseFrame()
+		if self.server is None:
+			return
+		# the newest change to every image, if it's newer than what's here
+		records = {}
+		for event in self.server.events():
+			for r in event['records']:
+				if event['seq'] > self.imageSeq.get(r['image'], 0):
+					self.imageSeq[r['image']] = event['seq']
+					records[r['image']] = r
+		self.applyServerChanges(list(records.values()))
+
+	# stop using the annotation server. the annotations are still all here, so they're saved to the project's files instead
+	def serverFailed(self, e):
+		self.serverTimer.stop()
+		self.server.close()
+		self.server = None
+		self.leased = None
+		Alert('Lost the connection to the annotation server (%s). Annotations will be saved to the project\'s files instead.'%str(e)).exec_()
+
+	# use every confidently triangulated annotation to refine the projection matrices, then let the user
+	# decide whether to keep the result
+	def refineProjectionMatrices(self):
+		obs = calibration.annotationArray(self.data_pixel, self.cfg.views, self.images, self.cfg.joints)
+		# interpolated points were never observed, so they can't tell us anything about the cameras
+		interpolated = self.data_source.iloc[self.pixelRows.ravel()].values.reshape([len(self.cfg.views), -1]) == 'interpolated'
+		obs[interpolated.T] = np.nan
+		if self.distortion is not None:
+			obs = distortion.undistort(obs, self.distortion, self.intrinsics)
+		try:
+			mats, preds3d, report = calibration.refineProjectionMatrices(self.cfg.projectionMatrices, obs)
+		except Exception as e:
+			Alert('Could not refine projection matrices: %s'%str(e)).exec_()
+			return
+		msg = calibration.formatReport(report, self.cfg.views)
+		if not Confirm(msg + '\n\nWrite the refined projection matrices to cfg.yaml? (A backup of the old file will be kept.)').exec_():
+			return
+		try:
+			backup = calibration.writeProjectionMatrices(self.cfg.projectFolder, mats)
+		except Exception as e:
+			Alert('Could not write projection matrices: %s'%str(e)).exec_()
+			return
+		self.cfg = self.cfg._replace(projectionMatrices=mats.tolist())
+		self.fundamentalMatrices = epipolar.fundamentalMatrices(self.cfg.projectionMatrices)
+		self.intrinsics = distortion.intrinsics(self.cfg.projectionMatrices)
+		self.remapTables = {}
+		self.loadPhotos()
+		self.loadAnnotations()
+		# the refined points are the best 3d estimate we have for those annotations
+		images = self.images[report['pointIndices'] // len(self.cfg.joints)]
+		joints = np.array(self.cfg.joints)[report['pointIndices'] % len(self.cfg.joints)]
+		for image, joint, p in zip(images, joints, preds3d):
+			self.data_3d.loc[image, joint] = p
+		if self.server is not None:
+			self.dirtyFrames.update(int(f) for f in np.unique(report['pointIndices'] // len(self.cfg.joints)))
+		if self.query is not None and self.query.usesErrors:
+			# every reprojection error changed
+			self.query.update(None, *self.queryArrays(None, True))
+		Alert('Projection matrices were updated. The old cfg.yaml was backed up to %s'%backup).exec_()
 
 	def keyPressEvent(self, event):
 		if event.key() == Qt.Key_V:
 			self.ui.comboBox.setCurrentIndex((self.viewIdx + 1) % len(self.cfg.views))
 		elif event.key() == Qt.Key_F:
-			self.ui.spinBox.setValue((self.imageIdx + 1) % len(self.images))
+			self.stepFrame(1)
 		elif event.key() == Qt.Key_B:
-			self.ui.spinBox.setValue((self.imageIdx + len(self.images) - 1) % len(self.images))
+			self.stepFrame(-1)
+		elif event.key() == Qt.Key_P:
+			self.playbackBar.setPlaying(not self.playbackBar.isPlaying())
+		elif event.key() == Qt.Key_O:
+			self.onlyCurrentJointAction.toggle()
+		elif event.key() == Qt.Key_A:
+			self.acceptSuggestions()
+		elif event.key() == Qt.Key_T:
+			self.trackForward()
 		elif event.key() == Qt.Key_J:
 			idx = (self.jointIdx + 1) % len(self.cfg.joints)
 			while True:
 				if idx in self.displaying:
 					break
 				idx = (idx + 1) % len(self.cfg.joints) 
-			self.jointIdx = idx
-			self.labelingButtons[self.jointIdx].setChecked(True)
+			self.setJoint(idx)
 
 	def closeEvent(self, event):
-		self.data_pixel.to_csv(os.path.join(self.cfg.projectFolder, 'pixel-annotation-data.csv'))
-		self.data_3d.to_csv(os.path.join(self.cfg.projectFolder, '3d-annotation-data.csv'))
-		super(MultiviewProjectMainWindow, self).closeEvent(event)
\ No newline at end of file
+		# the decode threads and worker processes shouldn't outlive the window
+		if getattr(self, 'player', None) is not None:
+			self.setPlaying(False)
+		if getattr(self, 'preannotator', None) is not None:
+			self.preannotateAction.setChecked(False)
+		if getattr(self, 'tracker', None) is not None:
+			self.trackTimer.stop()
+			self.tracker.stop()
+		if getattr(self, 'hashIndex', None) is not None:
+			self.hashTimer.stop()
+			self.hashIndex.stop()
+		self.save()
+		if getattr(self, 'server', None) is not None:
+			# the server releases this window's lease when it disconnects
+			self.serverTimer.stop()
+			self.server.close()
+			self.server = None
+		super(MultiviewProjectMainWindow, self).closeEvent(event)
+
+	@instrument.timed
+	def save(self):
+		# with an annotation server, the server keeps the annotations (and writes the files when it stops)
+		if getattr(self, 'server', None) is not None:
+			self.flushServer()
+		if getattr(self, 'server', None) is None:
+			self.data_pixel.to_csv(os.path.join(self.cfg.projectFolder, 'pixel-annotation-data.csv'))
+			self.data_3d.to_csv(os.path.join(self.cfg.projectFolder, '3d-annotation-data.csv'))
+			self.data_source.to_csv(os.path.join(self.cfg.projectFolder, 'annotation-source.csv'))
+		if self.data_predicted.notna().values.any():
+			self.data_predicted.to_csv(os.path.join(self.cfg.projectFolder, preannotate.fileName))
\ No newline at end of file
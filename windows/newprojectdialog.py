@@ -99,6 +99,16 @@ class NewProjectDialog(QDialog):
 			d = EnterProjectionMatrices(viewNames, projectionMatrices)
 			if not d.exec_():
 				return
+		elif projectMode == 'RGB Depth':
+			if not os.path.isdir(os.path.join(imagePath, 'depth')):
+				Alert('Depth mode needs a folder called depth inside the image folder path, with a depth map (.npy) ' + \
+					'named like each image').exec_()
+				return
+			# the depth camera's projection matrix, for back-projecting annotations to 3d
+			projectionMatrices = []
+			d = EnterProjectionMatrices(['depth camera'], projectionMatrices)
+			if not d.exec_():
+				return
 		imageExtension = self.ui.comboBox.currentText()
 		try:
 			os.mkdir(projectPath)
@@ -113,6 +123,8 @@ class NewProjectDialog(QDialog):
 			if projectMode == 'RGB Multi View':
 				cfg['views'] = viewNames
 				cfg['projectionMatrices'] = projectionMatrices 
+			elif projectMode == 'RGB Depth':
+				cfg['projectionMatrix'] = projectionMatrices[0]
 			yaml.dump(cfg, f)
 
 			self.projectPathToOpen.append(projectPath)
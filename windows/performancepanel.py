@@ -0,0 +1,101 @@
+from PySide2.QtWidgets import QDialog, QVBoxLayout, QHBoxLayout, QCheckBox, QPushButton, QTableWidget, QTableWidgetItem, QHeaderView, QFileDialog
+from PySide2.QtCore import Qt, QTimer
+from PySide2.QtGui import QFont
+from util import instrument
+from util.alert import Alert
+
+# latency of the instrumented hot paths (see util/instrument.py), refreshed while the panel is open
+class PerformancePanel(QDialog):
+	columns = ['Operation', 'Calls', 'Mean', 'p50', 'p90', 'p99', 'Max', 'Histogram']
+	bars = ' ▁▂▃▄▅▆▇█'
+
+	def __init__(self, parent):
+		super(PerformancePanel, self).__init__(parent)
+		self.setWindowTitle('Performance')
+		self.resize(900, 400)
+		layout = QVBoxLayout(self)
+
+		buttons = QHBoxLayout()
+		self.recordBox = QCheckBox('Record', self)
+		self.recordBox.setChecked(instrument.enabled)
+		self.recordBox.toggled.connect(instrument.setEnabled)
+		buttons.addWidget(self.recordBox)
+		buttons.addStretch(1)
+		reset = QPushButton('Reset', self)
+		reset.clicked.connect(self.reset)
+		buttons.addWidget(reset)
+		save = QPushButton('Save Trace...', self)
+		save.clicked.connect(self.saveTrace)
+		buttons.addWidget(save)
+		layout.addLayout(buttons)
+
+		self.table = QTableWidget(0, len(self.columns), self)
+		self.table.setHorizontalHeaderLabels(self.columns)
+		self.table.verticalHeader().hide()
+		self.table.setEditTriggers(QTableWidget.NoEditTriggers)
+		self.table.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeToContents)
+		self.table.horizontalHeader().setStretchLastSection(True)
+		layout.addWidget(self.table)
+
+		self.timer = QTimer(self)
+		self.timer.setInterval(500)
+		self.timer.timeout.connect(self.refresh)
+
+	def showEvent(self, event):
+		self.recordBox.setChecked(instrument.enabled)
+		self.refresh()
+		self.timer.start()
+		super(PerformancePanel, self).showEvent(event)
+
+	def hideEvent(self, event):
+		self.timer.stop()
+		super(PerformancePanel, self).hideEvent(event)
+
+	def reset(self):
+		instrument.reset()
+		self.refresh()
+
+	def saveTrace(self):
+		path, _ = QFileDialog.getSaveFileName(self, 'Save Trace', 'trace.json', 'Trace (*.json)')
+		if not path:
+			return
+		try:
+			instrument.writeTrace(path)
+		except Exception as e:
+			Alert('Could not save the trace: %s'%str(e)).exec_()
+
+	# histogram of the occupied buckets, as a row of block characters
+	def sparkline(self, counts):
+		occupied = [i for i, c in enumerate(counts) if c > 0]
+		if len(occupied) == 0:
+			return ''
+		counts = counts[occupied[0]:occupied[-1]+1]
+		top = max(counts)
+		lo = instrument.edges[occupied[0]-1] if occupied[0] > 0 else 0
+		hi = instrument.edges[min(occupied[-1], len(instrument.edges)-1)]
+		line = ''.join(self.bars[0 if c == 0 else 1 + (len(self.bars)-2)*c//top] for c in counts)
+		return '%s %s %s'%(formatTime(lo), line, formatTime(hi))
+
+	def refresh(self):
+		rows = instrument.summary()
+		self.table.setRowCount(len(rows))
+		for r, row in enumerate(rows):
+			values = [row['name'], str(row['count'])] + [formatTime(row[k]) for k in ['mean', 'p50', 'p90', 'p99', 'max']]
+			values.append(self.sparkline(row['counts']))
+			for c, value in enumerate(values):
+				item = self.table.item(r, c)
+				if item is None:
+					item = QTableWidgetItem()
+					if c > 0:
+						item.setTextAlignment(Qt.AlignRight | Qt.AlignVCenter)
+					if c == len(values)-1:
+						item.setFont(QFont('monospace'))
+					self.table.setItem(r, c, item)
+				item.setText(value)
+
+def formatTime(seconds):
+	if seconds < 1e-3:
+		return '%.0f us'%(seconds*1e6)
+	if seconds < 1:
+		return '%.1f ms'%(seconds*1e3)
+	return '%.2f s'%seconds
@@ -0,0 +1,62 @@
+from PySide2.QtWidgets import QWidget, QHBoxLayout, QPushButton, QSlider, QDoubleSpinBox, QLabel
+from PySide2.QtCore import Qt, Signal
+
+# play/pause button, scrubber, target rate and achieved rate, shown under the main view
+class PlaybackBar(QWidget):
+	playToggled = Signal(bool)
+	scrubbed = Signal(int)
+	fpsChanged = Signal(float)
+
+	def __init__(self, parent, numFrames, fps=30):
+		super(PlaybackBar, self).__init__(parent)
+		layout = QHBoxLayout(self)
+		layout.setContentsMargins(0, 0, 0, 0)
+
+		self.playButton = QPushButton('Play', self)
+		self.playButton.setCheckable(True)
+		self.playButton.setFocusPolicy(Qt.NoFocus)
+		self.playButton.toggled.connect(self.playButtonToggled)
+		layout.addWidget(self.playButton)
+
+		self.slider = QSlider(Qt.Horizontal, self)
+		self.slider.setRange(0, numFrames-1)
+		self.slider.setFocusPolicy(Qt.NoFocus)
+		self.slider.valueChanged.connect(self.scrubbed)
+		layout.addWidget(self.slider, 1)
+
+		self.fpsBox = QDoubleSpinBox(self)
+		self.fpsBox.setRange(1, 240)
+		self.fpsBox.setDecimals(0)
+		self.fpsBox.setSuffix(' fps')
+		self.fpsBox.setValue(fps)
+		self.fpsBox.valueChanged.connect(self.fpsChanged)
+		layout.addWidget(self.fpsBox)
+
+		self.fpsLabel = QLabel(self)
+		self.fpsLabel.setMinimumWidth(150)
+		layout.addWidget(self.fpsLabel)
+
+	def playButtonToggled(self, on):
+		self.playButton.setText('Pause' if on else 'Play')
+		self.playToggled.emit(on)
+
+	def fps(self):
+		return self.fpsBox.value()
+
+	def isPlaying(self):
+		return self.playButton.isChecked()
+
+	def setPlaying(self, on):
+		self.playButton.setChecked(on)
+
+	# move the scrubber without emitting scrubbed
+	def setFrame(self, index):
+		self.slider.blockSignals(True)
+		self.slider.setValue(index)
+		self.slider.blockSignals(False)
+
+	def setAchievedFps(self, fps, dropped):
+		if fps is None:
+			self.fpsLabel.setText('')
+		else:
+			self.fpsLabel.setText('%.1f fps, %d dropped'%(fps, dropped))
@@ -1,31 +1,29 @@
 import os
-from glob import iglob
 import numpy as np 
 import pandas as pd
-from PySide2.QtWidgets import QMainWindow, QRadioButton, QCheckBox, QWidget, QVBoxLayout, QLabel, QGraphicsView
-from PySide2.QtGui import QPixmap, QColor
-from PySide2.QtCore import Qt, QPointF
+from PySide2.QtWidgets import QMainWindow, QRadioButton, QCheckBox, QWidget, QVBoxLayout, QLabel, QGraphicsView, QActionGroup, QInputDialog
+from PySide2.QtGui import QPixmap, QColor, QImage
+from PySide2.QtCore import Qt, QPointF, QTimer
 from ui_py.ui_singleviewproject import Ui_MainWindow as Ui_SingleviewProjectMainWindow
 from util.alert import Alert
 from util.confirm import Confirm
+from util import interpolation, geometry, skeleton, colors, playback, completeness, jointgroups, projectdata, images, adjust, instrument, preannotate, tracking, duplicates, query
 from .imageviews import MainImageView, ImageView
+from .playbackbar import PlaybackBar
+from .timeline import Timeline
+from .jointlist import JointPanel
+from .adjustdialog import AdjustDialog
+from .performancepanel import PerformancePanel
 
 class SingleviewProjectMainWindow(QMainWindow):
-	def __init__(self, cfg):
+	# data is what util.projectdata.readSingleview returns. it's usually read on a background thread while the
+	# window is opening (see windows/mainwindow.py), and is read here otherwise
+	def __init__(self, cfg, data=None):
 		super(SingleviewProjectMainWindow, self).__init__()
 		self.cfg = cfg
-		# we will only use images that exist for all views
-		imageNames = iglob(os.path.join(cfg.imageFolder, '*'+cfg.imageExtension))
-		imageNames = set(map(lambda s: os.path.basename(s), imageNames))
-
-		# read the data; if there is none, then create a new frame for the data
-		try:
-			data_pixel = pd.read_csv(os.path.join(cfg.projectFolder, 'pixel-annotation-data.csv'), index_col=0, header=[0,1])
-		except FileNotFoundError:
-			data_pixel = pd.DataFrame(
-				columns=pd.MultiIndex.from_product([cfg.joints, ['u', 'v']], names=['joint', 'coordinate']),
-				index=pd.Index([], name='image')
-			)
+		if data is None:
+			data = projectdata.readSingleview(cfg)
+		imageNames, data_pixel = data['imageNames'], data['data_pixel']
 
 		# in case the user has deleted images
 		removed = set.difference(set(data_pixel.index.values), imageNames)
@@ -55,6 +53,25 @@ class SingleviewProjectMainWindow(QMainWindow):
 		])
 		self.data_pixel.sort_index(inplace=True)
 
+		# where each annotation came from ('labeled' by hand, 'interpolated' between keyframes, 'predicted' and accepted,
+		# or 'tracked' from an earlier frame)
+		self.data_source = data['data_source'].reindex(index=self.data_pixel.index, columns=cfg.joints).astype(object)
+
+		# predicted (u, v, confidence) of every joint, from pre-annotation
+		self.data_predicted = preannotate.frame(data.get('data_predicted'), self.data_pixel.index, cfg.joints)
+
+		# columns of data_pixel holding (u, v) for every joint, in the order of cfg.joints
+		self.pixelCols = self.data_pixel.columns.get_indexer(pd.MultiIndex.from_product([cfg.joints, ['u', 'v']]))
+
+		# optional skeleton, drawn as bones between joints
+		try:
+			self.bones = skeleton.bones(cfg)
+			self.jointGroups = jointgroups.groups(cfg)
+		except ValueError as e:
+			Alert(str(e)).exec_()
+			self.close()
+			return
+
 		# the project needs to have at least one image
 		self.images = self.data_pixel.index.values
 		if len(self.images) == 0:
@@ -76,10 +93,12 @@ class SingleviewProjectMainWindow(QMainWindow):
 		# initialize radius for annotations
 		self.radius = 5
 
-		# initialize joint colors (I guess these aren't necessarily visually distinct, maybe there's a better way)
-		inc = 256**3 // len(self.cfg.joints)
-		color = 256**3-1
-		self.colors = [QColor(*tuple((color-inc*i).to_bytes(3, 'big'))) for i in range(len(self.cfg.joints))]
+		# initialize joint colors
+		self.colorScheme = colors.schemes[0]
+		self.colors = colors.jointColors(len(self.cfg.joints), self.colorScheme)
+
+		# when set, only the joint being labeled is shown
+		self.onlyCurrentJoint = False
 
 		# set headers above main view
 		self.ui.label_4.setText('Image: %s'%self.images[self.imageIdx])
@@ -90,60 +109,192 @@ class SingleviewProjectMainWindow(QMainWindow):
 		self.ui.spinBox.valueChanged.connect(self.setFrame)
 
 		# set up the double spinbox for changing the annotation radius
-		self.ui.doubleSpinBox.valueChanged.connect(self.setRadius)
 		self.ui.doubleSpinBox.setValue(self.radius)
+		self.ui.doubleSpinBox.valueChanged.connect(self.setRadius)
 
 		# set up skip to next frame missing any/all displayed annotations
 		self.ui.pushButton.clicked.connect(self.skipMissingAny)
 		self.ui.pushButton_2.clicked.connect(self.skipMissingAll)
 
-		# add buttons for labeling and displaying annotations
-		self.labelingButtons = []
-		self.displayingButtons = []
-		for row, jointName in enumerate(cfg.joints):
-			r = QRadioButton(jointName+'*', self.ui.scrollAreaWidgetContents_3)
-			r.clicked.connect(self.setJoint(row))
-			# r.setStyleSheet('color: red'
-			self.ui.gridLayout.addWidget(r, row, 0, 1, 1)
-			self.labelingButtons.append(r)
-			c = QCheckBox(jointName, self.ui.scrollAreaWidgetContents_2)
-			c.clicked.connect(self.setDisplaying(row))
-			c.setChecked(True)
-			self.ui.gridLayout_2.addWidget(c, row, 0, 1, 1)
-			self.displayingButtons.append(c)
-		self.labelingButtons[self.jointIdx].setChecked(True)
-		self.ui.gridLayout.setRowStretch(len(cfg.joints), 1)
-		self.ui.gridLayout_2.setRowStretch(len(cfg.joints), 1)
+		# lists of joints for labeling and displaying annotations, which replace the designer's scroll areas
+		self.jointPanel = JointPanel(self.ui.centralwidget, cfg.joints, self.jointGroups, self.colors)
+		for w in [self.ui.label_2, self.ui.scrollArea_3, self.ui.label_3, self.ui.scrollArea_2]:
+			w.hide()
+		self.ui.verticalLayout.insertWidget(0, self.jointPanel, 1)
+		self.jointPanel.jointSelected.connect(self.setJoint)
+		self.jointPanel.displayingChanged.connect(self.setDisplaying)
+		self.jointPanel.setCurrent(self.jointIdx)
 
 		# initialize the main view
 		self.mainView = MainImageView(self.ui.centralwidget)
 		self.ui.verticalLayout_2.addWidget(self.mainView)
 		self.mainView.photoClicked.connect(self.mainImageClicked)
 		self.mainView.photoRightClicked.connect(self.removeAnnotation)
+		self.mainView.annotationDragged.connect(self.annotationDragged)
+		self.mainView.annotationDropped.connect(self.annotationDropped)
+
+		# completeness of every frame, under the main view
+		self.timeline = Timeline(self.ui.centralwidget, len(self.images), 1)
+		self.ui.verticalLayout_2.addWidget(self.timeline)
+		self.timeline.frameClicked.connect(self.ui.spinBox.setValue)
+
+		# playback, where frames are decoded ahead on worker threads and shown at a target rate
+		self.player = None
+		self.playbackBar = PlaybackBar(self.ui.centralwidget, len(self.images))
+		self.ui.verticalLayout_2.addWidget(self.playbackBar)
+		self.playbackBar.playToggled.connect(self.setPlaying)
+		self.playbackBar.scrubbed.connect(self.ui.spinBox.setValue)
+		self.playbackBar.fpsChanged.connect(self.setPlaybackFps)
+		self.playTimer = QTimer(self)
+		self.playTimer.setTimerType(Qt.PreciseTimer)
+		# tick faster than the frame rate, so frames are shown close to when they are due
+		self.playTimer.setInterval(max(1, int(500 / self.playbackBar.fps())))
+		self.playTimer.timeout.connect(self.playbackTick)
+
+		# brightness/contrast/gamma of the image, applied to the decoded image through a lookup table
+		self.adjustments = [dict(adjust.defaults)]
+		self.adjustTable = None
+		self.adjustDialog = None
+		self.rawImage = QImage()
+
+		# set up keyframe mode, where frames between labeled keyframes are filled in automatically
+		self.keyframeMode = False
+		self.interpolationMethod = interpolation.methods[0]
+		self.toolsMenu = self.ui.menubar.addMenu('Tools')
+		self.toolsMenu.addAction('Image Adjustments...', self.showAdjustDialog)
+		self.performancePanel = None
+		self.toolsMenu.addAction('Performance...', self.showPerformancePanel)
+
+		# pre-annotation, where a predictor runs on worker processes and its predictions are shown as suggestions
+		self.preannotator = None
+		self.suggested = np.zeros(len(cfg.joints), dtype=bool)
+		self.suggestionThreshold = getattr(cfg, 'predictorThreshold', None)
+		self.suggestionTimer = QTimer(self)
+		self.suggestionTimer.setInterval(100)
+		self.suggestionTimer.timeout.connect(self.pollSuggestions)
+		self.preannotateAction = self.toolsMenu.addAction('Pre-annotate')
+		self.preannotateAction.setCheckable(True)
+		self.preannotateAction.toggled.connect(self.setPreannotating)
+
+		# tracking of the current frame's annotations into the next frames, on worker processes
+		self.tracker = None
+		self.trackFrames = 10
+		self.trackTimer = QTimer(self)
+		self.trackTimer.setInterval(100)
+		self.trackTimer.timeout.connect(self.pollTracking)
+		self.trackAction = self.toolsMenu.addAction('Track Forward...', self.trackForward)
+
+		# runs of near-duplicate frames (see util/duplicates.py), which navigation can skip
+		self.duplicateGroups = None
+		self.hashIndex = None
+		self.skipDuplicates = False
+		self.hashTimer = QTimer(self)
+		self.hashTimer.setInterval(200)
+		self.hashTimer.timeout.connect(self.pollHashes)
+		self.skipDuplicatesAction = self.toolsMenu.addAction('Skip Duplicates')
+		self.skipDuplicatesAction.setCheckable(True)
+		self.skipDuplicatesAction.toggled.connect(self.setSkipDuplicates)
+		self.toolsMenu.addAction('Copy to Duplicates', self.copyToDuplicates)
+
+		# frames picked by a query (see util/query.py), which navigation then stops on
+		self.query = None
+		self.toolsMenu.addAction('Filter Frames...', self.filterFrames)
+		a = self.toolsMenu.addAction('Keyframe Mode')
+		a.setCheckable(True)
+		a.toggled.connect(self.setKeyframeMode)
+		a = self.toolsMenu.addAction('Show Skeleton')
+		a.setCheckable(True)
+		a.setChecked(True)
+		a.setEnabled(len(self.bones) > 0)
+		a.toggled.connect(self.mainView.setSkeletonVisible)
+		self.onlyCurrentJointAction = self.toolsMenu.addAction('Show Only Current Joint')
+		self.onlyCurrentJointAction.setCheckable(True)
+		self.onlyCurrentJointAction.toggled.connect(self.setOnlyCurrentJoint)
+		colorMenu = self.toolsMenu.addMenu('Colors')
+		colorGroup = QActionGroup(self)
+		for scheme in colors.schemes:
+			a = colorMenu.addAction(scheme)
+			a.setCheckable(True)
+			a.setChecked(scheme == self.colorScheme)
+			a.triggered.connect(self.setColorScheme(scheme))
+			colorGroup.addAction(a)
+		methodMenu = self.toolsMenu.addMenu('Interpolation')
+		methodGroup = QActionGroup(self)
+		for method in interpolation.methods:
+			a = methodMenu.addAction(method.capitalize())
+			a.setCheckable(True)
+			a.setChecked(method == self.interpolationMethod)
+			a.triggered.connect(self.setInterpolationMethod(method))
+			methodGroup.addAction(a)
+
+		self.mainView.setSkeleton(self.bones)
 
 		self.loadPhotos()
 		self.loadAnnotations()
+		self.updateTimeline()
 
 		# helps register keypress events
 		self.setFocusPolicy(Qt.ClickFocus)
 
+	@instrument.timed
 	def loadPhotos(self):
-		self.mainView.setPhoto(QPixmap(os.path.join(self.cfg.imageFolder, self.images[self.imageIdx])))
-
+		self.setPhoto(self.loadImage(self.imageIdx))
+
+	# the decoded image is kept, so changing the image adjustments doesn't need to decode it again
+	@instrument.timed
+	def setPhoto(self, img):
+		self.rawImage = img
+		self.mainView.setPhoto(QPixmap.fromImage(self.adjusted(img)))
+
+	# the image with the brightness/contrast/gamma lookup table applied
+	def adjusted(self, img):
+		if self.adjustTable is None or img.isNull():
+			return img
+		return images.arrayToImage(adjust.apply(images.imageToArray(img), self.adjustTable, self.adjustments[0]))
+
+	def setAdjustment(self, viewIdxs, settings):
+		self.adjustments[0] = dict(settings)
+		# the table is only rebuilt when the settings change
+		self.adjustTable = None if adjust.isIdentity(settings) else adjust.table(settings)
+		self.setPhoto(self.rawImage)
+
+	def showAdjustDialog(self):
+		if self.adjustDialog is None:
+			self.adjustDialog = AdjustDialog(self, ['image'], self.adjustments)
+			self.adjustDialog.adjustmentChanged.connect(self.setAdjustment)
+		self.adjustDialog.show()
+		self.adjustDialog.raise_()
+
+	def showPerformancePanel(self):
+		if self.performancePanel is None:
+			self.performancePanel = PerformancePanel(self)
+		self.performancePanel.show()
+		self.performancePanel.raise_()
+
+	# this also runs on the playback threads, so it only makes QImages
+	@instrument.timed
+	def loadImage(self, imageIdx):
+		return QImage(os.path.join(self.cfg.imageFolder, self.images[imageIdx]))
+
+	@instrument.timed
 	def loadAnnotations(self):
-		self.mainView.clearAnnotations()
 		r = self.mainView.getPixmap().rect()
-		data2d = self.data_pixel.loc[self.images[self.imageIdx], :]
-		for j, joint in enumerate(self.cfg.joints):
-			d = data2d[joint]
-			if d.isna().any():
-				self.labelingButtons[j].setText(joint+'*')
-				continue
-			self.mainView.addAnnotation(QPointF(d['u'] * r.width(), d['v'] * r.height()), self.colors[j], self.radius, joint)
-			self.labelingButtons[j].setText(joint)
-			if not j in self.displaying:
-				self.mainView.hideAnnotation(joint)
-
+		data2d = self.data_pixel.iloc[self.imageIdx, self.pixelCols].values.astype(np.float64).reshape([-1, 2])
+		missing = np.isnan(data2d).any(axis=1)
+		# suggestions fill in the joints that aren't labeled, drawn hollow like interpolated ones
+		hollow = np.isin(self.data_source.iloc[self.imageIdx].values, ['interpolated', 'tracked'])
+		self.suggested[:] = False
+		if self.preannotator is not None:
+			suggestion = self.suggestions(self.imageIdx)
+			self.suggested = missing & ~np.isnan(suggestion).any(axis=1)
+			data2d[self.suggested] = suggestion[self.suggested]
+			hollow |= self.suggested
+		data2d = geometry.denormalize(data2d, r.width(), r.height())
+		displaying = self.visibleJoints()
+		self.mainView.setAnnotationArray(self.cfg.joints, data2d, self.colors, self.radius, hollow, displaying)
+		self.jointPanel.setMissing(missing)
+
+	@instrument.timed
 	def setFrame(self, index):
 		if index >= len(self.images):
 			self.ui.spinBox.setValue(0)
@@ -152,87 +303,446 @@ class SingleviewProjectMainWindow(QMainWindow):
 			self.ui.spinBox.setValue(len(self.images)-1)
 		self.imageIdx = index
 		self.ui.label_4.setText('Image: %s'%self.images[self.imageIdx])
+		self.playbackBar.setFrame(self.imageIdx)
+		self.timeline.setCurrentFrame(self.imageIdx)
+		if self.player is not None:
+			# keep playing from the new frame
+			self.player.start(self.imageIdx)
 		self.loadPhotos()
 		self.loadAnnotations()
+		self.updatePreannotationFocus()
+
+	# fraction of the displayed joints that are labeled, for frames (all of them by default)
+	def labeledFractions(self, frames=None):
+		frames = np.arange(len(self.images)) if frames is None else np.asarray(frames)
+		cols = self.pixelCols[2*np.array(sorted(self.displaying))]
+		return completeness.fractions(self.data_pixel, frames[None], cols)
+
+	# the timeline and the query's results follow every change to the annotations
+	@instrument.timed
+	def updateTimeline(self, frames=None):
+		if frames is None:
+			self.timeline.setFractions(self.labeledFractions())
+		else:
+			self.timeline.updateFrames(frames, self.labeledFractions(frames))
+		if self.query is not None:
+			self.query.update(frames, *self.queryArrays(frames))
+
+	def setPlaying(self, on):
+		if on and self.player is None:
+			self.player = playback.Player(self.loadImage, len(self.images), self.playbackBar.fps())
+			self.player.start(self.imageIdx)
+			self.playTimer.start()
+		elif not on and self.player is not None:
+			self.playTimer.stop()
+			self.player.stop()
+			self.player = None
+			self.playbackBar.setAchievedFps(None, 0)
+
+	def setPlaybackFps(self, fps):
+		self.playTimer.setInterval(max(1, int(500 / fps)))
+		if self.player is not None:
+			self.player.setFps(fps)
+
+	# shows the frame the playback scheduler says is due, if it has been decoded, without going through the spin box
+	@instrument.timed
+	def playbackTick(self):
+		shown = self.player.tick()
+		if shown is not None:
+			self.imageIdx, img = shown
+			self.ui.spinBox.blockSignals(True)
+			self.ui.spinBox.setValue(self.imageIdx)
+			self.ui.spinBox.blockSignals(False)
+			self.ui.label_4.setText('Image: %s'%self.images[self.imageIdx])
+			self.playbackBar.setFrame(self.imageIdx)
+			self.timeline.setCurrentFrame(self.imageIdx)
+			self.setPhoto(img)
+			self.loadAnnotations()
+		self.playbackBar.setAchievedFps(self.player.achievedFps(), self.player.dropped)
 
 	def setRadius(self, r):
 		self.radius = r
+		self.updateDisplay()
 
-	def setJoint(self, index):
-		def f():
-			if self.labelingButtons[index].isChecked():
-				self.jointIdx = index
-		return f
-	def setDisplaying(self, index):
+	def visibleJoints(self):
+		visible = np.isin(np.arange(len(self.cfg.joints)), list(self.displaying))
+		if self.onlyCurrentJoint:
+			visible &= np.arange(len(self.cfg.joints)) == self.jointIdx
+		return visible
+
+	# apply the radius, visible joints and colors to the view with a single update
+	def updateDisplay(self):
+		self.mainView.setAnnotationDisplay(self.cfg.joints, self.visibleJoints(), self.radius, self.colors)
+
+	def setOnlyCurrentJoint(self, on):
+		self.onlyCurrentJoint = on
+		self.updateDisplay()
+
+	def setColorScheme(self, scheme):
 		def f():
-			if self.displayingButtons[index].isChecked():
-				self.showAnnotations(self.cfg.joints[index])
-				self.displaying.add(index)
-				self.labelingButtons[index].setEnabled(True)
-			else:
-				# ensure that at least one box will stay checked
-				if len(self.displaying) == 1:
-					self.displayingButtons[index].setChecked(True)
-				else:
-					self.hideAnnotations(self.cfg.joints[index])
-					self.displaying.remove(index)
-					self.labelingButtons[index].setEnabled(False)
-					if self.jointIdx == index:
-						self.labelingButtons[self.jointIdx].setChecked(False)
-						self.jointIdx = next(iter(self.displaying))
-						self.labelingButtons[self.jointIdx].setChecked(True)
+			self.colorScheme = scheme
+			self.colors = colors.jointColors(len(self.cfg.joints), scheme)
+			self.jointPanel.setColors(self.colors)
+			self.updateDisplay()
 		return f
 
+	def setJoint(self, index):
+		self.jointIdx = index
+		self.jointPanel.setCurrent(index)
+		if self.onlyCurrentJoint:
+			self.updateDisplay()
+
+	def setDisplaying(self, rows, on):
+		if on:
+			self.displaying.update(rows)
+		else:
+			# ensure that at least one joint will stay displayed
+			self.displaying = self.displaying.difference(rows) or {self.jointIdx}
+		self.jointPanel.setDisplaying(np.isin(np.arange(len(self.cfg.joints)), list(self.displaying)))
+		if self.jointIdx not in self.displaying:
+			self.setJoint(min(self.displaying))
+		self.updateDisplay()
+		self.updateTimeline()
+
+	@instrument.timed
 	def mainImageClicked(self, pos):
-		self.labelingButtons[self.jointIdx].setText(self.cfg.joints[self.jointIdx])
+		self.jointPanel.setMissing(False, self.jointIdx)
 		r = self.mainView.getPixmap().rect()
 		pos_normalized = (pos.x() / r.width(), pos.y() / r.height())
 		self.data_pixel.loc[self.images[self.imageIdx], self.cfg.joints[self.jointIdx]] = pos_normalized
+		self.data_source.iloc[self.imageIdx, self.jointIdx] = 'labeled'
 		self.mainView.addAnnotation(pos, self.colors[self.jointIdx], self.radius, self.cfg.joints[self.jointIdx])
+		self.annotationsChanged([self.imageIdx], self.jointIdx)
+		if self.keyframeMode:
+			self.updateInterpolation(self.jointIdx, self.imageIdx)
+		self.updateTimeline([self.imageIdx])
+
+	def annotationDragged(self, key, pos):
+		j = self.cfg.joints.index(key)
+		if j != self.jointIdx:
+			self.setJoint(j)
+
+	def annotationDropped(self, key, pos):
+		self.mainImageClicked(pos)
 
 	def removeAnnotation(self):
-		self.labelingButtons[self.jointIdx].setText(self.cfg.joints[self.jointIdx]+'*')
+		self.jointPanel.setMissing(True, self.jointIdx)
 		self.data_pixel.loc[self.images[self.imageIdx], self.cfg.joints[self.jointIdx]] = [np.nan, np.nan]
+		self.data_source.iloc[self.imageIdx, self.jointIdx] = np.nan
 		self.mainView.removeAnnotation(self.cfg.joints[self.jointIdx])
+		self.annotationsChanged([self.imageIdx], self.jointIdx)
+		if self.keyframeMode:
+			self.updateInterpolation(self.jointIdx, self.imageIdx)
+		self.updateTimeline([self.imageIdx])
+
+	def setPreannotating(self, on):
+		if on and self.preannotator is None:
+			try:
+				done = np.flatnonzero(~np.isnan(self.data_predicted.values).all(axis=1))
+				self.preannotator = preannotate.Preannotator(self.cfg, lambda frame: os.path.join(self.cfg.imageFolder, self.images[frame]), done)
+			except Exception as e:
+				Alert('Could not start pre-annotation: %s'%str(e)).exec_()
+				self.preannotateAction.setChecked(False)
+				return
+			self.updatePreannotationFocus()
+			self.suggestionTimer.start()
+		elif not on and self.preannotator is not None:
+			self.suggestionTimer.stop()
+			self.preannotator.stop()
+			self.preannotator = None
+		self.loadAnnotations()
 
-	def hideAnnotations(self, key):
-		self.mainView.hideAnnotation(key)
+	# predict the frames around the current one first, then the ones missing annotations
+	def updatePreannotationFocus(self):
+		if self.preannotator is not None:
+			self.preannotator.prioritize(preannotate.order(self.imageIdx, len(self.images), self.timeline.fraction[0] < 1))
 
-	def showAnnotations(self, key):
-		self.mainView.showAnnotation(key)
+	def pollSuggestions(self):
+		results = self.preannotator.poll()
+		if self.preannotator.error() is not None:
+			Alert('Pre-annotation stopped: %s'%str(self.preannotator.error())).exec_()
+			self.preannotateAction.setChecked(False)
+			return
+		if len(results) == 0:
+			return
+		frames = [frame for frame, _ in results]
+		self.data_predicted.iloc[frames] = np.stack([prediction.ravel() for _, prediction in results])
+		if self.imageIdx in frames:
+			self.loadAnnotations()
+
+	# normalized (u, v) of the suggestion for every joint in a frame, nan where there's none
+	def suggestions(self, frame):
+		return preannotate.suggestions(self.data_predicted.iloc[frame].values.reshape([-1, 3]), self.suggestionThreshold)
+
+	# turn the suggestions shown in the current frame into annotations
+	def acceptSuggestions(self):
+		joints = np.flatnonzero(self.suggested & self.visibleJoints())
+		if len(joints) == 0:
+			return
+		uv = self.suggestions(self.imageIdx)[joints]
+		self.data_pixel.iloc[self.imageIdx, self.pixelCols[np.stack([2*joints, 2*joints+1], axis=1).ravel()]] = uv.ravel()
+		self.data_source.iloc[self.imageIdx, joints] = 'predicted'
+		for j in joints:
+			self.annotationsChanged([self.imageIdx], j)
+			if self.keyframeMode:
+				self.updateInterpolation(j, self.imageIdx)
+		self.loadAnnotations()
+		self.updateTimeline([self.imageIdx])
+
+	# track the visible joints that are annotated in the current frame through the next frames
+	def trackForward(self):
+		if self.tracker is not None and self.tracker.busy():
+			return
+		uv = self.data_pixel.iloc[self.imageIdx, self.pixelCols].values.astype(np.float64).reshape([-1, 2])
+		joints = np.flatnonzero(self.visibleJoints() & ~np.isnan(uv).any(axis=1))
+		if len(joints) == 0 or self.imageIdx == len(self.images)-1:
+			Alert('There are no annotations to track from this frame.').exec_()
+			return
+		n, ok = QInputDialog.getInt(self, 'Track Forward', 'Frames:', self.trackFrames, 1, len(self.images)-1-self.imageIdx)
+		if not ok:
+			return
+		self.trackFrames = n
+		if self.tracker is None:
+			self.tracker = tracking.Tracker()
+		paths = [os.path.join(self.cfg.imageFolder, image) for image in self.images[self.imageIdx:self.imageIdx+n+1]]
+		self.tracker.start({0: (paths, uv[joints])})
+		self.trackedFrom = (self.imageIdx, joints)
+		self.trackAction.setEnabled(False)
+		self.statusBar().showMessage('Tracking %d joints through %d frames...'%(len(joints), n))
+		self.trackTimer.start()
+
+	def pollTracking(self):
+		try:
+			results = self.tracker.poll()
+		except Exception as e:
+			self.trackTimer.stop()
+			self.trackAction.setEnabled(True)
+			self.statusBar().clearMessage()
+			Alert('Tracking failed: %s'%str(e)).exec_()
+			return
+		if results is None:
+			return
+		self.trackTimer.stop()
+		self.trackAction.setEnabled(True)
+		start, joints = self.trackedFrom
+		tracked = results[0]
+		frames = np.arange(start+1, start+1+len(tracked))
+		count = 0
+		for j, uv in zip(joints, tracked.transpose([1, 0, 2])):
+			cols = self.pixelCols[2*j:2*j+2]
+			values = self.data_pixel.iloc[frames, cols].values.astype(np.float64)
+			sources = self.data_source.iloc[frames, j].values
+			# a joint stops where it was lost, or where it's already been placed some other way
+			replaceable = np.isnan(values).any(axis=1) | np.isin(sources, ['interpolated', 'tracked'])
+			keep = np.cumprod(replaceable & ~np.isnan(uv).any(axis=1)).astype(bool)
+			if not keep.any():
+				continue
+			self.data_pixel.iloc[frames[keep], cols] = uv[keep]
+			self.data_source.iloc[frames[keep], j] = 'tracked'
+			count += keep.sum()
+			self.annotationsChanged(frames[keep], j)
+			if self.keyframeMode:
+				self.updateInterpolation(j, frames[keep][-1])
+		self.statusBar().showMessage('Tracked %d annotations'%count)
+		self.loadAnnotations()
+		self.updateTimeline(frames)
+
+	# called with the frames where a joint's annotation was placed, moved, removed or interpolated, for windows
+	# that keep something derived from the annotations (see windows/depthprojectmainwindow.py)
+	def annotationsChanged(self, frames, jointIdx):
+		pass
+
+	def setKeyframeMode(self, on):
+		self.keyframeMode = on
+		if on:
+			for j in range(len(self.cfg.joints)):
+				self.updateInterpolation(j)
+			self.loadAnnotations()
+
+	def setInterpolationMethod(self, method):
+		def f():
+			self.interpolationMethod = method
+			if self.keyframeMode:
+				self.setKeyframeMode(True)
+		return f
+
+	# re-fill the interpolated frames of a joint. if a frame is given, only the frames whose interpolation
+	# depends on that frame's keyframe are recomputed
+	@instrument.timed
+	def updateInterpolation(self, jointIdx, frame=None):
+		joint = self.cfg.joints[jointIdx]
+		cols = self.data_pixel.columns.get_indexer([(joint, 'u'), (joint, 'v')])
+		values = self.data_pixel.iloc[:, cols].values.astype(np.float64)
+		isKey = ~np.isnan(values).any(axis=1) & (self.data_source.iloc[:, jointIdx].values != 'interpolated')
+		if frame is None:
+			lo, hi = 0, len(self.images)-1
+		else:
+			lo, hi = interpolation.affectedRange(np.flatnonzero(isKey), frame, len(self.images), self.interpolationMethod)
+		# anything previously interpolated in the range is recomputed (or cleared if it is no longer between keyframes)
+		frames, filled = interpolation.fillRange(values, isKey, self.interpolationMethod, lo, hi)
+		self.data_pixel.iloc[frames, cols] = filled
+		self.data_source.iloc[frames, jointIdx] = np.where(np.isnan(filled).any(axis=1), None, 'interpolated')
+		self.annotationsChanged(frames, jointIdx)
+		self.updateTimeline(frames)
+		if frame is not None and lo <= self.imageIdx <= hi:
+			self.loadAnnotations()
+
+	# frames x displayed joints, True where a joint isn't annotated
+	def missingJoints(self):
+		cols = self.pixelCols[2*np.array(sorted(self.displaying))]
+		return np.isnan(self.data_pixel.iloc[:, cols].values.astype(np.float64))
 
 	def skipMissingAny(self):
-		cols = [self.cfg.joints[idx] for idx in self.displaying]
-		data = self.data_pixel.loc[:, cols]
-		missing = data.isna().any(axis=1)
-		idx = missing[missing].index.get_loc(self.images[self.imageIdx])
-		image = missing[missing].index[idx+1]
-		idx = missing.index.get_loc(image)
-		self.ui.spinBox.setValue(idx)
+		self.stepFrame(1, self.missingJoints().any(axis=1))
 
 	def skipMissingAll(self):
-		cols = [self.cfg.joints[idx] for idx in self.displaying]
-		data = self.data_pixel.loc[:, cols]
-		missing = data.isna().all(axis=1)
-		idx = missing[missing].index.get_loc(self.images[self.imageIdx])
-		image = missing[missing].index[idx+1]
-		idx = missing.index.get_loc(image)
-		self.ui.spinBox.setValue(idx)
+		self.stepFrame(1, self.missingJoints().all(axis=1))
+
+	# the frames that navigation stops on
+	def navigableFrames(self):
+		frames = np.ones(len(self.images), dtype=bool)
+		if self.skipDuplicates and self.duplicateGroups is not None:
+			frames &= self.duplicateGroups == np.arange(len(self.images))
+		if self.query is not None:
+			frames &= self.query.matches
+		return frames
+
+	# go to the next (step 1) or previous (step -1) navigable frame, of the frames in `among` if it's given,
+	# wrapping around at the ends
+	def stepFrame(self, step, among=None):
+		frames = self.navigableFrames()
+		if among is not None:
+			frames &= among
+		frames = np.flatnonzero(frames)
+		if len(frames) == 0:
+			return
+		if step > 0:
+			idx = np.searchsorted(frames, self.imageIdx, side='right') % len(frames)
+		else:
+			idx = np.searchsorted(frames, self.imageIdx, side='left') - 1
+		self.ui.spinBox.setValue(int(frames[idx]))
+
+	# pixels, sources and (no) reprojection errors of frames (all of them by default), as util/query.py reads them
+	def queryArrays(self, frames=None):
+		frames = np.arange(len(self.images)) if frames is None else np.asarray(frames)
+		pixels = self.data_pixel.iloc[frames, self.pixelCols].values.astype(np.float64).reshape([len(frames), 1, -1, 2])
+		sources = self.data_source.iloc[frames].values.reshape([len(frames), 1, -1])
+		return pixels, sources, None
+
+	def filterFrames(self):
+		text, ok = QInputDialog.getText(self, 'Filter Frames', 'Only stop on frames where (empty for every frame):', text='' if self.query is None else self.query.text)
+		if not ok:
+			return
+		if text.strip() == '':
+			self.query = None
+			self.statusBar().clearMessage()
+			return
+		try:
+			q = query.Query(text, self.cfg.joints)
+			q.update(None, *self.queryArrays())
+		except ValueError as e:
+			Alert(str(e)).exec_()
+			return
+		self.query = q
+		self.statusBar().showMessage('%d frames match %s'%(q.matches.sum(), text))
+
+	def setSkipDuplicates(self, on):
+		self.skipDuplicates = on
+		if not on or self.duplicateGroups is not None or self.hashIndex is not None:
+			return
+		try:
+			self.duplicateThreshold = duplicates.threshold(self.cfg)
+			self.hashIndex = duplicates.HashIndex(self.cfg, self.images)
+		except Exception as e:
+			Alert('Could not find near-duplicate frames: %s'%str(e)).exec_()
+			self.skipDuplicatesAction.setChecked(False)
+			return
+		self.hashTimer.start()
+		self.pollHashes()
+
+	def pollHashes(self):
+		try:
+			result = self.hashIndex.poll()
+		except Exception as e:
+			self.hashTimer.stop()
+			self.hashIndex.stop()
+			self.hashIndex = None
+			self.statusBar().clearMessage()
+			Alert('Could not find near-duplicate frames: %s'%str(e)).exec_()
+			self.skipDuplicatesAction.setChecked(False)
+			return
+		if result is None:
+			self.statusBar().showMessage('Hashing images: %d of %d left...'%(self.hashIndex.remaining(), self.hashIndex.total))
+			return
+		self.hashTimer.stop()
+		self.hashIndex = None
+		self.duplicateGroups = duplicates.groups(*result, self.duplicateThreshold)
+		numDuplicates = (self.duplicateGroups != np.arange(len(self.images))).sum()
+		self.statusBar().showMessage('%d frames are near-duplicates of an earlier frame'%numDuplicates)
+
+	# copy the current frame's annotations of the visible joints to the other frames of its run of near-duplicates
+	def copyToDuplicates(self):
+		if self.duplicateGroups is None:
+			Alert('Near-duplicate frames haven\'t been found yet. Turn on Tools > Skip Duplicates first.').exec_()
+			return
+		frames = np.flatnonzero(self.duplicateGroups == self.duplicateGroups[self.imageIdx])
+		frames = frames[frames != self.imageIdx]
+		uv = self.data_pixel.iloc[self.imageIdx, self.pixelCols].values.astype(np.float64).reshape([-1, 2])
+		sources = self.data_source.iloc[self.imageIdx].values
+		# interpolated annotations would just be interpolated again
+		joints = np.flatnonzero(self.visibleJoints() & ~np.isnan(uv).any(axis=1) & (sources != 'interpolated'))
+		if len(frames) == 0 or len(joints) == 0:
+			return
+		if not Confirm('Copy the annotations of %d joints to the %d near-duplicates of this frame?'%(len(joints), len(frames))).exec_():
+			return
+		for j in joints:
+			self.data_pixel.iloc[frames, self.pixelCols[2*j:2*j+2]] = uv[j]
+			self.data_source.iloc[frames, j] = sources[j]
+			self.annotationsChanged(frames, j)
+			if self.keyframeMode:
+				self.updateInterpolation(j, frames[0])
+				self.updateInterpolation(j, frames[-1])
+		self.updateTimeline(frames)
 
 	def keyPressEvent(self, event):
 		if event.key() == Qt.Key_F:
-			self.ui.spinBox.setValue((self.imageIdx + 1) % len(self.images))
+			self.stepFrame(1)
 		elif event.key() == Qt.Key_B:
-			self.ui.spinBox.setValue((self.imageIdx + len(self.images) - 1) % len(self.images))
+			self.stepFrame(-1)
+		elif event.key() == Qt.Key_P:
+			self.playbackBar.setPlaying(not self.playbackBar.isPlaying())
+		elif event.key() == Qt.Key_O:
+			self.onlyCurrentJointAction.toggle()
+		elif event.key() == Qt.Key_A:
+			self.acceptSuggestions()
+		elif event.key() == Qt.Key_T:
+			self.trackForward()
 		elif event.key() == Qt.Key_J:
 			idx = (self.jointIdx + 1) % len(self.cfg.joints)
 			while True:
 				if idx in self.displaying:
 					break
 				idx = (idx + 1) % len(self.cfg.joints) 
-			self.jointIdx = idx
-			self.labelingButtons[self.jointIdx].setChecked(True)
+			self.setJoint(idx)
 
 	def closeEvent(self, event):
+		# the decode threads and worker processes shouldn't outlive the window
+		if getattr(self, 'player', None) is not None:
+			self.setPlaying(False)
+		if getattr(self, 'preannotator', None) is not None:
+			self.preannotateAction.setChecked(False)
+		if getattr(self, 'tracker', None) is not None:
+			self.trackTimer.stop()
+			self.tracker.stop()
+		if getattr(self, 'hashIndex', None) is not None:
+			self.hashTimer.stop()
+			self.hashIndex.stop()
+		self.save()
+		super(SingleviewProjectMainWindow, self).closeEvent(event)
+
+	@instrument.timed
+	def save(self):
 		self.data_pixel.to_csv(os.path.join(self.cfg.projectFolder, 'pixel-annotation-data.csv'))
-		super(SingleviewProjectMainWindow, self).closeEvent(event)
\ No newline at end of file
+		self.data_source.to_csv(os.path.join(self.cfg.projectFolder, 'annotation-source.csv'))
+		if self.data_predicted.notna().values.any():
+			self.data_predicted.to_csv(os.path.join(self.cfg.projectFolder, preannotate.fileName))
\ No newline at end of file
@@ -0,0 +1,75 @@
+import numpy as np
+from PySide2.QtWidgets import QWidget
+from PySide2.QtCore import Qt, Signal
+from PySide2.QtGui import QPainter, QImage, QColor, QPen
+from util import completeness
+
+# strip under the main view showing how much of every frame is labeled, one row per view (plus a row for all views
+# combined when there's more than one). frames are binned down to the width of the widget, and edits only
+# recompute the bins they touch. clicking or dragging jumps to that frame.
+class Timeline(QWidget):
+	frameClicked = Signal(int)
+
+	rowHeight = 6
+
+	def __init__(self, parent, numFrames, numRows):
+		super(Timeline, self).__init__(parent)
+		self.numFrames = numFrames
+		self.combined = numRows > 1
+		self.fraction = np.zeros([numRows + self.combined, numFrames], dtype=np.float32)
+		self.current = 0
+		self.edges = completeness.binEdges(numFrames, 1)
+		self.image = completeness.colorize(completeness.binned(self.fraction, self.edges))
+		self.setFixedHeight(self.rowHeight * len(self.fraction))
+		self.setCursor(Qt.PointingHandCursor)
+
+	# fraction is rows x frames
+	def setFractions(self, fraction):
+		self.fraction[self.combined:] = fraction
+		if self.combined:
+			self.fraction[0] = fraction.min(axis=0)
+		self.rebin()
+
+	# fraction is rows x len(frames)
+	def updateFrames(self, frames, fraction):
+		frames = np.asarray(frames)
+		self.fraction[self.combined:, frames] = fraction
+		if self.combined:
+			self.fraction[0, frames] = fraction.min(axis=0)
+		for b in np.unique(np.searchsorted(self.edges, frames, side='right') - 1):
+			lo, hi = self.edges[b], self.edges[b+1]
+			self.image[:, b] = completeness.colorize(self.fraction[:, lo:hi].mean(axis=1))
+		self.update()
+
+	def setCurrentFrame(self, index):
+		self.current = index
+		self.update()
+
+	def rebin(self):
+		self.edges = completeness.binEdges(self.numFrames, self.width())
+		self.image = completeness.colorize(completeness.binned(self.fraction, self.edges))
+		self.update()
+
+	def resizeEvent(self, event):
+		self.rebin()
+
+	def paintEvent(self, event):
+		rows, bins = self.image.shape[:2]
+		img = QImage(self.image.data, bins, rows, 4*bins, QImage.Format_RGB32)
+		p = QPainter(self)
+		p.drawImage(self.rect(), img)
+		x = int((self.current + 0.5) / self.numFrames * self.width())
+		p.setPen(QPen(QColor(255, 255, 255), 1))
+		p.drawLine(x, 0, x, self.height())
+		p.end()
+
+	def frameAt(self, x):
+		return int(np.clip(x / max(self.width(), 1) * self.numFrames, 0, self.numFrames-1))
+
+	def mousePressEvent(self, event):
+		if event.button() == Qt.LeftButton:
+			self.frameClicked.emit(self.frameAt(event.pos().x()))
+
+	def mouseMoveEvent(self, event):
+		if event.buttons() & Qt.LeftButton:
+			self.frameClicked.emit(self.frameAt(event.pos().x()))